@@ -1,11 +1,14 @@
 from fastapi import APIRouter, HTTPException, Query
-from typing import List, Dict, Union, Optional
+from typing import List, Dict, Union, Optional, Any
 import ccxt
 import numpy as np
+import redis
 from app.services.quotes.timeframe import Timeframe
 from app.services.quotes.client import QuotesClient
-from app.services.quotes.exceptions import R2D2QuotesExceptionDataNotReceived
+from app.services.quotes.exceptions import R2D2QuotesException, R2D2QuotesExceptionDataNotReceived
+from app.services.quotes.backfill import create_backfill_job, get_backfill_job, start_backfill_process
 from app.core.datetime_utils import parse_utc_datetime, datetime64_to_iso
+from app.core.config import redis_params, clickhouse_params
 
 router = APIRouter(prefix="/api/v1/common", tags=["common"])
 
@@ -120,7 +123,22 @@ async def get_quotes(
         if start_dt >= end_dt:
             raise HTTPException(status_code=400, detail="date_start must be before date_end")
         
-        # Get quotes data using Client (already initialized in startup)
+        # Parse requested fields
+        requested_fields = None
+        if fields:
+            # Split by comma and strip whitespace
+            requested_fields = [f.strip().lower() for f in fields.split(',') if f.strip()]
+            # Validate fields
+            valid_fields = {'time', 'open', 'high', 'low', 'close', 'volume'}
+            invalid_fields = [f for f in requested_fields if f not in valid_fields]
+            if invalid_fields:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Invalid fields: {', '.join(invalid_fields)}. Valid fields are: {', '.join(sorted(valid_fields))}"
+                )
+        
+        # Get quotes data using Client (already initialized in startup),
+        # only the requested fields are read and transferred
         try:
             client = QuotesClient()
             quotes_data = client.get_quotes(
@@ -129,7 +147,8 @@ async def get_quotes(
                 timeframe=tf,
                 history_start=start_dt,
                 history_end=end_dt,
-                timeout=30
+                timeout=30,
+                columns=requested_fields or None
             )
         except R2D2QuotesExceptionDataNotReceived as e:
             error_msg = e.error if e.error else f"Failed to get quotes data for {source}/{symbol}/{timeframe}"
@@ -139,29 +158,15 @@ async def get_quotes(
         
         # Convert numpy arrays to list of objects for charting
         time_array = quotes_data['time']
-        open_array = quotes_data['open']
-        high_array = quotes_data['high']
-        low_array = quotes_data['low']
-        close_array = quotes_data['close']
-        volume_array = quotes_data['volume']
+        open_array = quotes_data.get('open')
+        high_array = quotes_data.get('high')
+        low_array = quotes_data.get('low')
+        close_array = quotes_data.get('close')
+        volume_array = quotes_data.get('volume')
         
         # Get length (all arrays should have same length)
         length = len(time_array)
         
-        # Parse requested fields
-        requested_fields = None
-        if fields:
-            # Split by comma and strip whitespace
-            requested_fields = [f.strip().lower() for f in fields.split(',') if f.strip()]
-            # Validate fields
-            valid_fields = {'time', 'open', 'high', 'low', 'close', 'volume'}
-            invalid_fields = [f for f in requested_fields if f not in valid_fields]
-            if invalid_fields:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Invalid fields: {', '.join(invalid_fields)}. Valid fields are: {', '.join(sorted(valid_fields))}"
-                )
-        
         # Convert to list of dictionaries
         # Format optimized for lightweight-charts: time as Unix timestamp in seconds
         result = []
@@ -205,3 +210,59 @@ async def get_quotes(
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
+
+
+@router.post("/backfill", response_model=Dict[str, Any])
+async def start_backfill(job_data: Dict[str, Any]):
+    """
+    Start a job preloading historical quotes into the database.
+    
+    Request body: {"items": [{"source": "binance", "symbol": "BTC/USDT", "timeframe": "1m",
+    "start": "2020-01-01T00:00:00Z", "end": "2024-01-01T00:00:00Z"}, ...]}
+    
+    The job runs in a separate process; its progress is returned by GET /backfill/{job_id}.
+    """
+    items = job_data.get('items')
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="items must be a list")
+    try:
+        with redis.Redis(**redis_params()) as redis_client:
+            job_id = create_backfill_job(redis_client, items)
+    except R2D2QuotesException as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    start_backfill_process(redis_params(), clickhouse_params(), job_id)
+    return {"success": True, "job_id": job_id}
+
+
+@router.post("/backfill/{job_id}/resume", response_model=Dict[str, Any])
+async def resume_backfill(job_id: str):
+    """
+    Resume an interrupted backfill job: finished items are skipped, the rest is planned again.
+    
+    A job that is running (in any process) is not resumed.
+    """
+    with redis.Redis(**redis_params()) as redis_client:
+        job = get_backfill_job(redis_client, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Backfill job not found")
+    if job['status'] == 'done':
+        raise HTTPException(status_code=409, detail="Backfill job is already done")
+    if job['status'] == 'running':
+        raise HTTPException(status_code=409, detail="Backfill job is already running")
+    try:
+        start_backfill_process(redis_params(), clickhouse_params(), job_id)
+    except R2D2QuotesException as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"success": True, "job_id": job_id}
+
+
+@router.get("/backfill/{job_id}", response_model=Dict[str, Any])
+async def get_backfill(job_id: str):
+    """
+    Get progress of a backfill job: status, items and chunks done, bars fetched and bars/sec.
+    """
+    with redis.Redis(**redis_params()) as redis_client:
+        job = get_backfill_job(redis_client, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Backfill job not found")
+    return job
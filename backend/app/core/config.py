@@ -61,6 +61,73 @@ REDIS_QUOTE_RESPONSE_PREFIX=quotes:responses
 # Quotes fetch retry configuration
 QUOTES_FETCH_RETRY_ATTEMPTS=3
 QUOTES_FETCH_RETRY_DELAY=1
+
+# Quotes fetch concurrency: requests in flight and burst size per exchange
+QUOTES_FETCH_CONCURRENCY=4
+QUOTES_FETCH_RATE_BURST=4
+
+# Quotes exchange connections: idle timeout and health check interval (seconds)
+QUOTES_EXCHANGE_IDLE_TIMEOUT=300
+QUOTES_EXCHANGE_HEALTH_CHECK_INTERVAL=600
+
+# Quotes ingest batching: bars per insert, max delay (seconds) and queued pages limit
+QUOTES_INGEST_BATCH_BARS=50000
+QUOTES_INGEST_FLUSH_INTERVAL=0.2
+QUOTES_INGEST_MAX_PENDING=64
+
+# Quotes shared response cache in Redis for closed historical ranges: TTL (seconds), total and entry size (megabytes)
+QUOTES_RESPONSE_CACHE=true
+QUOTES_RESPONSE_CACHE_TTL=3600
+QUOTES_RESPONSE_CACHE_MAX_MB=512
+QUOTES_RESPONSE_CACHE_MAX_ENTRY_MB=64
+
+# Quotes ranges the exchange returned no bars for are fetched again after this interval (seconds),
+# unless the exchange returned later bars (e.g. ranges before the listing are never fetched again)
+QUOTES_UNAVAILABLE_RECHECK_INTERVAL=86400
+
+# Quotes tail of a range (up to the last closed bar) is fetched again at most once per interval (seconds)
+# while the exchange hasn't published the bar; otherwise only when a new bar closes
+QUOTES_MIN_REFETCH_INTERVAL=10
+
+# Quotes timeframes derived from stored bars of a lower timeframe instead of fetched from the exchange,
+# comma-separated timeframe:base pairs (e.g. 10m:5m,4h:1h,1w:1d); empty to fetch all timeframes
+QUOTES_DERIVED_TIMEFRAMES=
+
+# Quotes backfill jobs: chunks filled concurrently and bars per chunk (progress is saved per chunk)
+QUOTES_BACKFILL_CONCURRENCY=4
+QUOTES_BACKFILL_CHUNK_BARS=50000
+
+# Quotes coverage rows (stored intervals) of a key in ClickHouse: rows subsumed by merged intervals are
+# deleted every QUOTES_COVERAGE_COMPACT_ROWS inserted rows, and on first access to a key with more rows
+QUOTES_COVERAGE_COMPACT_ROWS=100
+
+# Quotes storage: clickhouse or memmap (local column files in QUOTES_STORAGE_DIR, default DATA_DIR/quotes, no database server);
+# memmap appends to a log per month and merges it into the column files at QUOTES_STORAGE_COMPACT_ROWS bars
+QUOTES_STORAGE=clickhouse
+QUOTES_STORAGE_COMPACT_ROWS=100000
+
+# Quotes service ClickHouse clients: concurrent database calls and wait for a free client (seconds);
+# streamed ranges hold clients of their own, at most QUOTES_CLICKHOUSE_STREAM_SLOTS at a time
+QUOTES_CLICKHOUSE_POOL_SIZE=8
+QUOTES_CLICKHOUSE_POOL_TIMEOUT=60
+QUOTES_CLICKHOUSE_STREAM_SLOTS=2
+
+# Quotes service in-memory bar cache size (megabytes)
+QUOTES_CACHE_MAX_MB=256
+
+# Quotes service worker processes (requests are sharded by source/symbol/timeframe)
+QUOTES_SERVICE_WORKERS=1
+
+# Quotes shared memory transport for clients on the service host (directory should be on tmpfs)
+QUOTES_SHM_TRANSPORT=true
+QUOTES_SHM_DIR=/dev/shm/r2d2
+
+# Quotes streaming of large ranges: bars per chunk and unread chunks limit per request
+QUOTES_STREAM_CHUNK_BARS=100000
+QUOTES_STREAM_MAX_CHUNKS=8
+
+# Quotes responses compression (zstd or lz4 if installed, otherwise zlib)
+QUOTES_RESPONSE_COMPRESSION=true
 """
     
     # Generate .env content by commenting all parameter lines but keeping default values visible
@@ -152,6 +219,68 @@ REDIS_QUOTE_RESPONSE_PREFIX = os.getenv("REDIS_QUOTE_RESPONSE_PREFIX", "quotes:r
 QUOTES_FETCH_RETRY_ATTEMPTS = int(os.getenv("QUOTES_FETCH_RETRY_ATTEMPTS", "3"))
 QUOTES_FETCH_RETRY_DELAY = float(os.getenv("QUOTES_FETCH_RETRY_DELAY", "1.0"))
 
+# Quotes fetch concurrency configuration (per exchange, request rate follows ccxt rateLimit)
+QUOTES_FETCH_CONCURRENCY = int(os.getenv("QUOTES_FETCH_CONCURRENCY", "4"))
+QUOTES_FETCH_RATE_BURST = int(os.getenv("QUOTES_FETCH_RATE_BURST", "4"))
+
+# Quotes exchange connections pool configuration
+QUOTES_EXCHANGE_IDLE_TIMEOUT = float(os.getenv("QUOTES_EXCHANGE_IDLE_TIMEOUT", "300"))
+QUOTES_EXCHANGE_HEALTH_CHECK_INTERVAL = float(os.getenv("QUOTES_EXCHANGE_HEALTH_CHECK_INTERVAL", "600"))
+
+# Quotes ingest batching configuration
+QUOTES_INGEST_BATCH_BARS = int(os.getenv("QUOTES_INGEST_BATCH_BARS", "50000"))
+QUOTES_INGEST_FLUSH_INTERVAL = float(os.getenv("QUOTES_INGEST_FLUSH_INTERVAL", "0.2"))
+QUOTES_INGEST_MAX_PENDING = int(os.getenv("QUOTES_INGEST_MAX_PENDING", "64"))
+
+# Quotes shared response cache configuration
+QUOTES_RESPONSE_CACHE = os.getenv("QUOTES_RESPONSE_CACHE", "true").lower() in ("1", "true", "yes")
+QUOTES_RESPONSE_CACHE_TTL = int(os.getenv("QUOTES_RESPONSE_CACHE_TTL", "3600"))
+QUOTES_RESPONSE_CACHE_MAX_BYTES = int(float(os.getenv("QUOTES_RESPONSE_CACHE_MAX_MB", "512")) * 1024 * 1024)
+QUOTES_RESPONSE_CACHE_MAX_ENTRY_BYTES = int(float(os.getenv("QUOTES_RESPONSE_CACHE_MAX_ENTRY_MB", "64")) * 1024 * 1024)
+
+# Quotes unavailable ranges configuration
+QUOTES_UNAVAILABLE_RECHECK_INTERVAL = int(os.getenv("QUOTES_UNAVAILABLE_RECHECK_INTERVAL", "86400"))
+
+# Quotes freshness policy configuration
+QUOTES_MIN_REFETCH_INTERVAL = float(os.getenv("QUOTES_MIN_REFETCH_INTERVAL", "10"))
+
+# Quotes derived timeframes configuration
+QUOTES_DERIVED_TIMEFRAMES = os.getenv("QUOTES_DERIVED_TIMEFRAMES", "")
+
+# Quotes backfill jobs configuration
+QUOTES_BACKFILL_CONCURRENCY = int(os.getenv("QUOTES_BACKFILL_CONCURRENCY", "4"))
+QUOTES_BACKFILL_CHUNK_BARS = int(os.getenv("QUOTES_BACKFILL_CHUNK_BARS", "50000"))
+
+# Quotes coverage compaction configuration
+QUOTES_COVERAGE_COMPACT_ROWS = int(os.getenv("QUOTES_COVERAGE_COMPACT_ROWS", "100"))
+
+# Quotes storage configuration
+QUOTES_STORAGE = os.getenv("QUOTES_STORAGE", "clickhouse").lower()
+QUOTES_STORAGE_DIR = Path(os.getenv("QUOTES_STORAGE_DIR", str(DATA_DIR / 'quotes')))
+QUOTES_STORAGE_COMPACT_ROWS = int(os.getenv("QUOTES_STORAGE_COMPACT_ROWS", "100000"))
+
+# Quotes service ClickHouse clients pool configuration
+QUOTES_CLICKHOUSE_POOL_SIZE = int(os.getenv("QUOTES_CLICKHOUSE_POOL_SIZE", "8"))
+QUOTES_CLICKHOUSE_POOL_TIMEOUT = float(os.getenv("QUOTES_CLICKHOUSE_POOL_TIMEOUT", "60"))
+QUOTES_CLICKHOUSE_STREAM_SLOTS = int(os.getenv("QUOTES_CLICKHOUSE_STREAM_SLOTS", "2"))
+
+# Quotes service in-memory bar cache size
+QUOTES_CACHE_MAX_BYTES = int(float(os.getenv("QUOTES_CACHE_MAX_MB", "256")) * 1024 * 1024)
+
+# Quotes service worker processes
+QUOTES_SERVICE_WORKERS = int(os.getenv("QUOTES_SERVICE_WORKERS", "1"))
+
+# Quotes shared memory transport configuration
+QUOTES_SHM_TRANSPORT = os.getenv("QUOTES_SHM_TRANSPORT", "true").lower() in ("1", "true", "yes")
+QUOTES_SHM_DIR = os.getenv("QUOTES_SHM_DIR", "/dev/shm/r2d2")
+
+# Quotes streaming configuration
+QUOTES_STREAM_CHUNK_BARS = int(os.getenv("QUOTES_STREAM_CHUNK_BARS", "100000"))
+QUOTES_STREAM_MAX_CHUNKS = int(os.getenv("QUOTES_STREAM_MAX_CHUNKS", "8"))
+
+# Quotes responses compression configuration
+QUOTES_RESPONSE_COMPRESSION = os.getenv("QUOTES_RESPONSE_COMPRESSION", "true").lower() in ("1", "true", "yes")
+
 
 def redis_params() -> dict:
     """
@@ -167,3 +296,19 @@ def redis_params() -> dict:
         "password": REDIS_PASSWORD,
     }
 
+
+def clickhouse_params() -> dict:
+    """
+    Returns dictionary with ClickHouse connection parameters.
+    
+    Returns:
+        dict: Dictionary with keys: host, port, username, password, database
+    """
+    return {
+        "host": CLICKHOUSE_HOST,
+        "port": CLICKHOUSE_PORT,
+        "username": CLICKHOUSE_USERNAME,
+        "password": CLICKHOUSE_PASSWORD,
+        "database": CLICKHOUSE_DATABASE,
+    }
+
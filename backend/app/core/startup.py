@@ -7,11 +7,11 @@ from app.core.logger import setup_logging, get_logger
 from app.services.tasks.tasks import TaskList, BacktestingTaskList
 from app.core.config import (
     REDIS_QUOTE_REQUEST_LIST, REDIS_QUOTE_RESPONSE_PREFIX,
-    CLICKHOUSE_HOST, CLICKHOUSE_PORT, CLICKHOUSE_USERNAME,
-    CLICKHOUSE_PASSWORD, CLICKHOUSE_DATABASE,
-    redis_params
+    QUOTES_SERVICE_WORKERS,
+    redis_params, clickhouse_params
 )
 from app.services.quotes.server import start_quotes_service, stop_quotes_service
+from app.services.quotes.backfill import stop_backfill_processes
 from app.services.quotes.client import QuotesClient
 
 logger = get_logger(__name__)
@@ -49,18 +49,12 @@ def startup_quote_service():
     """
     Start quotes service with configuration from environment.
     """
-    clickhouse_params = {
-        'host': CLICKHOUSE_HOST,
-        'port': CLICKHOUSE_PORT,
-        'username': CLICKHOUSE_USERNAME,
-        'password': CLICKHOUSE_PASSWORD,
-        'database': CLICKHOUSE_DATABASE
-    }
     if start_quotes_service(
         redis_params=redis_params(),
-        clickhouse_params=clickhouse_params,
+        clickhouse_params=clickhouse_params(),
         request_list=REDIS_QUOTE_REQUEST_LIST,
-        response_prefix=REDIS_QUOTE_RESPONSE_PREFIX
+        response_prefix=REDIS_QUOTE_RESPONSE_PREFIX,
+        workers=QUOTES_SERVICE_WORKERS
     ):
         logger.info("Quotes service started successfully")
     else:
@@ -115,6 +109,9 @@ def shutdown():
     else:
         logger.warning("Quotes service was not running or failed to stop")
     
+    # Stop backfill jobs started by the API (they can be resumed)
+    stop_backfill_processes(timeout=2.0)
+    
     # Shutdown TaskList
     task_list = TaskList()
     task_list.shutdown()
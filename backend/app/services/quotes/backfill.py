@@ -0,0 +1,422 @@
+"""
+Bulk historical backfill of quotes.
+
+A backfill job preloads ranges of many (source, symbol, timeframe) keys into
+the database, so later requests are served from storage. A job runs in its
+own process with its own QuotesServer (CLI or API-started, see
+start_backfill_process): missing intervals of every item are found with the
+gap logic of the quotes service and filled in chunks of
+QUOTES_BACKFILL_CHUNK_BARS bars, QUOTES_BACKFILL_CONCURRENCY chunks at a time.
+
+Job state is kept in Redis and updated after every chunk, so a job can be
+resumed after a crash; a resumed job skips finished items and plans the rest
+again, stored chunks are no longer gaps. A running job holds a lock renewed
+while it runs, so a job doesn't run twice at the same time:
+
+    quotes:backfill:{job_id}       hash: items, status, chunks_total, chunks_done, bars, bars_per_sec, ...
+    quotes:backfill:{job_id}:done  set of indexes of finished items
+    quotes:backfill:{job_id}:lock  lock of the running job
+
+Exchange requests of a job share the rate limit of each exchange with the
+quotes service through Redis (see rate_limiter.py).
+
+Usage:
+    python -m app.services.quotes.backfill binance,BTC/USDT,1m,2020-01-01,2024-01-01 [item ...]
+    python -m app.services.quotes.backfill --resume JOB_ID
+"""
+from datetime import datetime, UTC
+from multiprocessing import Process
+from typing import Dict, List, Optional, Sequence, Tuple
+import argparse
+import asyncio
+import json
+import logging
+import time
+import uuid
+import redis
+from redis.exceptions import LockError
+from .bars import to_datetime64, from_datetime64
+from .exceptions import R2D2QuotesException
+from .timeframe import Timeframe
+from .server import QuotesServer, gather_or_cancel, prepare_storage
+from app.core.config import QUOTES_BACKFILL_CONCURRENCY, QUOTES_BACKFILL_CHUNK_BARS, redis_params, clickhouse_params
+from app.core.logger import setup_logging
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_PREFIX = 'quotes:backfill'
+
+ITEM_FIELDS = ('source', 'symbol', 'timeframe', 'start', 'end')
+
+# TTL of the lock of a running job in seconds, renewed every third of it
+BACKFILL_LOCK_TIMEOUT = 30
+
+# Backfill processes started by this process, by job id (see start_backfill_process)
+_backfill_processes: Dict[str, Process] = {}
+
+
+def job_key(job_id: str) -> str:
+    """Return Redis key of the state of a job."""
+    return f"{BACKFILL_PREFIX}:{job_id}"
+
+
+def done_key(job_id: str) -> str:
+    """Return Redis key of the finished items of a job."""
+    return f"{BACKFILL_PREFIX}:{job_id}:done"
+
+
+def lock_key(job_id: str) -> str:
+    """Return Redis key of the lock of a running job."""
+    return f"{BACKFILL_PREFIX}:{job_id}:lock"
+
+
+def is_backfill_running(redis_client, job_id: str) -> bool:
+    """Check whether a job is running in some process (synchronous Redis client)."""
+    return bool(redis_client.exists(lock_key(job_id)))
+
+
+def parse_item(item: Dict) -> Dict:
+    """
+    Validate a backfill item.
+
+    Args:
+        item: dict with source, symbol, timeframe (e.g. '1m'), start and end (ISO dates, UTC)
+
+    Returns:
+        Normalized item with ISO start and end
+
+    Raises:
+        R2D2QuotesException: If a field is missing or invalid
+    """
+    missing = [name for name in ITEM_FIELDS if not item.get(name)]
+    if missing:
+        raise R2D2QuotesException(f"Backfill item {item} misses {', '.join(missing)}")
+    try:
+        timeframe = Timeframe.cast(item['timeframe'])
+        start = datetime.fromisoformat(str(item['start']).replace('Z', '+00:00'))
+        end = datetime.fromisoformat(str(item['end']).replace('Z', '+00:00'))
+    except Exception as e:
+        raise R2D2QuotesException(f"Invalid backfill item {item}: {e}") from e
+    start = from_datetime64(to_datetime64(start))
+    end = from_datetime64(to_datetime64(end))
+    if end < start:
+        raise R2D2QuotesException(f"Backfill item {item} ends before it starts")
+    return {
+        'source': item['source'],
+        'symbol': item['symbol'],
+        'timeframe': str(timeframe),
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+    }
+
+
+def plan_chunks(gaps: Sequence[Tuple[datetime, datetime]], timeframe: Timeframe, chunk_bars: int) -> List[Tuple[datetime, datetime]]:
+    """
+    Split gaps into chunks of at most chunk_bars bars.
+
+    Args:
+        gaps: Gaps (first bar, last bar) as returned by QuotesServer.find_gaps
+        timeframe: Timeframe object
+        chunk_bars: Maximum number of bars in a chunk
+
+    Returns:
+        List of chunks (first bar, last bar) as UTC datetimes
+    """
+    step = timeframe.timedelta64()
+    chunks = []
+    for gap_start, gap_end in gaps:
+        start, end = to_datetime64(gap_start), to_datetime64(gap_end)
+        while start <= end:
+            chunk_end = min(start + step * (chunk_bars - 1), end)
+            chunks.append((from_datetime64(start), from_datetime64(chunk_end)))
+            start = chunk_end + step
+    return chunks
+
+
+def create_backfill_job(redis_client, items: Sequence[Dict]) -> str:
+    """
+    Create a backfill job.
+
+    Args:
+        redis_client: Synchronous Redis client
+        items: Items to backfill (see parse_item)
+
+    Returns:
+        Job id
+
+    Raises:
+        R2D2QuotesException: If an item is invalid
+    """
+    items = [parse_item(item) for item in items]
+    if not items:
+        raise R2D2QuotesException("Backfill job has no items")
+    job_id = str(uuid.uuid4())
+    redis_client.hset(job_key(job_id), mapping={
+        'items': json.dumps(items),
+        'status': 'pending',
+        'created': datetime.now(UTC).isoformat(),
+    })
+    return job_id
+
+
+def get_backfill_job(redis_client, job_id: str) -> Optional[Dict]:
+    """
+    Get state of a backfill job.
+
+    Args:
+        redis_client: Synchronous Redis client
+        job_id: Job id
+
+    Returns:
+        dict with job_id, items, status (pending, running, done, failed or
+        interrupted), items_done, chunks_total, chunks_done, bars, bars_per_sec,
+        error and times of changes; None if the job doesn't exist
+    """
+    state = redis_client.hgetall(job_key(job_id))
+    if not state:
+        return None
+    state = {
+        (name.decode() if isinstance(name, bytes) else name): (value.decode() if isinstance(value, bytes) else value)
+        for name, value in state.items()
+    }
+    job = {'job_id': job_id, 'items': json.loads(state.pop('items'))}
+    for name in ('chunks_total', 'chunks_done', 'bars'):
+        job[name] = int(state.pop(name, 0))
+    job['bars_per_sec'] = float(state.pop('bars_per_sec', 0.0))
+    job['items_done'] = int(redis_client.scard(done_key(job_id)))
+    job.update(state)
+    if job.get('status') == 'running' and not is_backfill_running(redis_client, job_id):
+        # The process stopped without recording the result (e.g. killed)
+        job['status'] = 'interrupted'
+    return job
+
+
+async def run_backfill(server: QuotesServer, job_id: str, concurrency: int, chunk_bars: int) -> Dict:
+    """
+    Run or resume a backfill job.
+
+    Args:
+        server: QuotesServer object
+        job_id: Job id (see create_backfill_job)
+        concurrency: Maximum number of chunks filled at the same time
+        chunk_bars: Maximum number of bars in a chunk
+
+    Returns:
+        dict with bars fetched by this run, elapsed seconds and bars_per_sec
+
+    Raises:
+        R2D2QuotesException: If the job doesn't exist or is already running
+    """
+    redis_client = server.redis_client
+    items_json = await redis_client.hget(job_key(job_id), 'items')
+    if items_json is None:
+        raise R2D2QuotesException(f"Backfill job {job_id} not found")
+
+    lock = redis_client.lock(lock_key(job_id), timeout=BACKFILL_LOCK_TIMEOUT)
+    if not await lock.acquire(blocking=False):
+        raise R2D2QuotesException(f"Backfill job {job_id} is already running")
+    keeper = asyncio.create_task(_keep_lock(lock, job_id))
+    try:
+        return await _fill_job(server, job_id, json.loads(items_json), concurrency, chunk_bars)
+    finally:
+        keeper.cancel()
+        try:
+            await lock.release()
+        except LockError:
+            logger.warning(f"Backfill {job_id}: lock expired before the job finished")
+
+
+async def _keep_lock(lock, job_id: str) -> None:
+    """Renew the lock of a running job."""
+    while True:
+        await asyncio.sleep(BACKFILL_LOCK_TIMEOUT / 3)
+        try:
+            await lock.reacquire()
+        except LockError as e:
+            logger.warning(f"Backfill {job_id}: lock is lost: {e}")
+            return
+
+
+async def _fill_job(server: QuotesServer, job_id: str, items: List[Dict], concurrency: int, chunk_bars: int) -> Dict:
+    redis_client = server.redis_client
+    key = job_key(job_id)
+    done = {int(index) for index in await redis_client.smembers(done_key(job_id))}
+    started = time.monotonic()
+    progress = {'bars': 0, 'chunks': 0}
+    await redis_client.hset(key, mapping={'status': 'running', 'started': datetime.now(UTC).isoformat(), 'error': ''})
+
+    try:
+        # Plan: missing intervals of unfinished items, split into chunks
+        loop = asyncio.get_running_loop()
+        plan = []
+        for index, item in enumerate(items):
+            if index in done:
+                continue
+            timeframe = Timeframe.cast(item['timeframe'])
+            gaps = await loop.run_in_executor(
+                server.db_executor,
+                server.find_gaps,
+                item['source'],
+                item['symbol'],
+                timeframe,
+                datetime.fromisoformat(item['start']),
+                datetime.fromisoformat(item['end']),
+            )
+            plan.append((index, item, timeframe, plan_chunks(gaps, timeframe, chunk_bars)))
+        chunks_total = sum(len(chunks) for _, _, _, chunks in plan)
+        await redis_client.hset(key, mapping={'chunks_total': chunks_total, 'chunks_done': 0})
+        logger.info(f"Backfill {job_id}: {chunks_total} chunks of {len(plan)} items to fill")
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fill_chunk(item: Dict, timeframe: Timeframe, chunk_start: datetime, chunk_end: datetime) -> None:
+            async with semaphore:
+                bars = await server.fill_quotes(item['source'], item['symbol'], timeframe, chunk_start, chunk_end)
+            progress['bars'] += bars
+            progress['chunks'] += 1
+            bars_per_sec = progress['bars'] / max(time.monotonic() - started, 1e-9)
+            async with redis_client.pipeline(transaction=True) as pipe:
+                pipe.hincrby(key, 'chunks_done', 1)
+                pipe.hincrby(key, 'bars', bars)
+                pipe.hset(key, mapping={'bars_per_sec': round(bars_per_sec, 1), 'updated': datetime.now(UTC).isoformat()})
+                await pipe.execute()
+            logger.info(f"Backfill {job_id}: {progress['chunks']}/{chunks_total} chunks, {progress['bars']} bars, {bars_per_sec:.0f} bars/sec")
+
+        async def fill_item(index: int, item: Dict, timeframe: Timeframe, chunks: List[Tuple[datetime, datetime]]) -> None:
+            await asyncio.gather(*(fill_chunk(item, timeframe, chunk_start, chunk_end) for chunk_start, chunk_end in chunks))
+            await redis_client.sadd(done_key(job_id), index)
+
+        await gather_or_cancel(*(fill_item(*planned) for planned in plan))
+    except BaseException as e:
+        await redis_client.hset(key, mapping={'status': 'failed', 'error': str(e) or type(e).__name__, 'updated': datetime.now(UTC).isoformat()})
+        raise
+
+    elapsed = time.monotonic() - started
+    bars_per_sec = progress['bars'] / elapsed if elapsed > 0 else 0.0
+    await redis_client.hset(key, mapping={'status': 'done', 'bars_per_sec': round(bars_per_sec, 1), 'updated': datetime.now(UTC).isoformat()})
+    logger.info(f"Backfill {job_id} finished: {progress['bars']} bars in {elapsed:.1f}s ({bars_per_sec:.0f} bars/sec)")
+    return {'bars': progress['bars'], 'elapsed': elapsed, 'bars_per_sec': bars_per_sec}
+
+
+async def _run_backfill_job(redis_params: Dict, clickhouse_params: Dict, job_id: str, concurrency: int, chunk_bars: int) -> Dict:
+    server = QuotesServer(redis_params=redis_params, clickhouse_params=clickhouse_params)
+    try:
+        return await run_backfill(server, job_id, concurrency, chunk_bars)
+    finally:
+        await server.ingest.close()
+        await server.exchange_pool.close_all()
+        server.storage.close()
+
+
+def run_backfill_job(redis_params: Dict, clickhouse_params: Dict, job_id: str, concurrency: Optional[int] = None, chunk_bars: Optional[int] = None) -> Dict:
+    """
+    Run or resume a backfill job in the current process.
+
+    Args:
+        redis_params: Dictionary with Redis connection parameters (host, port, db, password)
+        clickhouse_params: Dictionary with ClickHouse connection parameters (host, port, username, password, database)
+        job_id: Job id (see create_backfill_job)
+        concurrency: Chunks filled at the same time (default: QUOTES_BACKFILL_CONCURRENCY)
+        chunk_bars: Bars per chunk (default: QUOTES_BACKFILL_CHUNK_BARS)
+
+    Returns:
+        dict with bars fetched by this run, elapsed seconds and bars_per_sec
+    """
+    # A no-op when the service has migrated the schema already
+    prepare_storage(redis_params, clickhouse_params)
+    return asyncio.run(_run_backfill_job(
+        redis_params,
+        clickhouse_params,
+        job_id,
+        concurrency or QUOTES_BACKFILL_CONCURRENCY,
+        chunk_bars or QUOTES_BACKFILL_CHUNK_BARS,
+    ))
+
+
+def _backfill_worker(redis_params: Dict, clickhouse_params: Dict, job_id: str) -> None:
+    setup_logging()
+    try:
+        run_backfill_job(redis_params, clickhouse_params, job_id)
+    except Exception as e:
+        logger.error(f"Backfill {job_id} failed: {e}", exc_info=True)
+
+
+def reap_backfill_processes() -> None:
+    """Join finished backfill processes started by this process."""
+    for job_id, process in list(_backfill_processes.items()):
+        if not process.is_alive():
+            process.join()
+            del _backfill_processes[job_id]
+
+
+def start_backfill_process(redis_params: Dict, clickhouse_params: Dict, job_id: str) -> Process:
+    """
+    Run or resume a backfill job in a separate process.
+
+    Returns:
+        Started process
+
+    Raises:
+        R2D2QuotesException: If a process of this process runs the job already
+    """
+    reap_backfill_processes()
+    if job_id in _backfill_processes:
+        raise R2D2QuotesException(f"Backfill job {job_id} is already running")
+    process = Process(target=_backfill_worker, args=(redis_params, clickhouse_params, job_id), daemon=False)
+    process.start()
+    _backfill_processes[job_id] = process
+    logger.info(f"Started backfill process for job {job_id} (PID: {process.pid})")
+    return process
+
+
+def stop_backfill_processes(timeout: float = 5.0) -> None:
+    """
+    Stop backfill processes started by this process and wait for them.
+
+    Stopped jobs keep their progress and can be resumed.
+
+    Args:
+        timeout: Maximum time to wait for each process in seconds
+    """
+    for job_id, process in list(_backfill_processes.items()):
+        if process.is_alive():
+            logger.info(f"Stopping backfill process of job {job_id} (PID: {process.pid})")
+            process.terminate()
+        process.join(timeout)
+        if process.is_alive():
+            logger.warning(f"Backfill process of job {job_id} didn't stop, killing it")
+            process.kill()
+            process.join()
+        del _backfill_processes[job_id]
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Preload historical quotes into the database")
+    parser.add_argument('items', nargs='*', help="source,symbol,timeframe,start,end (e.g. binance,BTC/USDT,1m,2020-01-01,2024-01-01)")
+    parser.add_argument('--resume', metavar='JOB_ID', help="resume a job")
+    parser.add_argument('--concurrency', type=int, help="chunks filled at the same time")
+    parser.add_argument('--chunk-bars', type=int, help="bars per chunk")
+    args = parser.parse_args(argv)
+    if bool(args.items) == bool(args.resume):
+        parser.error("give either items or --resume")
+
+    setup_logging()
+
+    job_id = args.resume
+    if job_id is None:
+        items = []
+        for text in args.items:
+            values = text.split(',')
+            if len(values) != len(ITEM_FIELDS):
+                parser.error(f"invalid item '{text}'")
+            items.append(dict(zip(ITEM_FIELDS, values)))
+        with redis.Redis(**redis_params()) as redis_client:
+            job_id = create_backfill_job(redis_client, items)
+        print(f"Backfill job {job_id}")
+
+    result = run_backfill_job(redis_params(), clickhouse_params(), job_id, args.concurrency, args.chunk_bars)
+    print(f"Backfill job {job_id} finished: {result['bars']} bars in {result['elapsed']:.1f}s ({result['bars_per_sec']:.0f} bars/sec)")
+
+
+if __name__ == '__main__':
+    main()
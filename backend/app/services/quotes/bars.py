@@ -0,0 +1,159 @@
+"""
+Helpers for columnar bar data.
+
+Bars are passed around the quotes service as a dict of numpy arrays with keys
+'time', 'open', 'high', 'low', 'close', 'volume'. Time values are
+np.datetime64 (TIME_TYPE), prices and volume are float64.
+"""
+from datetime import datetime, UTC
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from .constants import TIME_TYPE, TIME_TYPE_UNIT
+
+BAR_COLUMNS = ('time', 'open', 'high', 'low', 'close', 'volume')
+PRICE_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+
+def empty_bars() -> Dict[str, np.ndarray]:
+    """Return a dict of empty bar columns."""
+    bars = {'time': np.array([], dtype=TIME_TYPE)}
+    for name in PRICE_COLUMNS:
+        bars[name] = np.array([], dtype=np.float64)
+    return bars
+
+
+def to_datetime64(value: datetime) -> np.datetime64:
+    """
+    Convert datetime to np.datetime64 in TIME_TYPE units.
+
+    Naive datetimes are treated as UTC, aware datetimes are converted to UTC.
+    """
+    if value.tzinfo is not None:
+        value = value.astimezone(UTC).replace(tzinfo=None)
+    return np.datetime64(value, TIME_TYPE_UNIT)
+
+
+def from_datetime64(value: np.datetime64) -> datetime:
+    """Convert np.datetime64 to timezone-aware UTC datetime."""
+    return datetime.fromtimestamp(value.astype('datetime64[ms]').astype('int64') / 1000, UTC)
+
+
+def ohlcv_to_bars(ohlcv: List[list]) -> Dict[str, np.ndarray]:
+    """
+    Convert ccxt OHLCV list to bar columns.
+
+    Exchanges may return bars out of order or repeat a bar (e.g. at a page
+    boundary), so bars are sorted by time and of bars with the same time the
+    last one is kept.
+
+    Args:
+        ohlcv: List of bars, each bar is [timestamp_ms, open, high, low, close, volume]
+
+    Returns:
+        dict of bar columns, sorted by time without duplicate times
+    """
+    if not ohlcv:
+        return empty_bars()
+    # Missing values (None) become nan
+    array = np.array(ohlcv, dtype=np.float64).reshape(-1, 6)
+    time_ms = array[:, 0].astype(np.int64)
+    if not np.all(time_ms[1:] > time_ms[:-1]):
+        order = np.argsort(time_ms, kind='stable')
+        sorted_ms = time_ms[order]
+        # Keep the last bar of every run of equal times
+        keep = np.append(sorted_ms[1:] != sorted_ms[:-1], True)
+        array = array[order[keep]]
+        time_ms = time_ms[order[keep]]
+    bars = {'time': time_ms.astype(TIME_TYPE)}
+    for index, name in enumerate(PRICE_COLUMNS, start=1):
+        bars[name] = np.ascontiguousarray(array[:, index])
+    return bars
+
+
+def select_columns(bars: Dict[str, np.ndarray], columns: Optional[Sequence[str]] = None, price_dtype: Optional[str] = None) -> Dict[str, np.ndarray]:
+    """
+    Select bar columns and convert price columns.
+
+    Args:
+        bars: dict of bar columns
+        columns: Names of columns to keep in this order, None for all columns
+        price_dtype: dtype of price and volume columns (e.g., 'float32'), None to keep float64
+
+    Returns:
+        dict of bar columns
+    """
+    if columns is None:
+        columns = [name for name in BAR_COLUMNS if name in bars]
+    selected = {}
+    for name in columns:
+        column = bars[name]
+        if price_dtype is not None and name in PRICE_COLUMNS:
+            column = column.astype(price_dtype, copy=False)
+        selected[name] = column
+    return selected
+
+
+def bars_nbytes(bars: Dict[str, np.ndarray]) -> int:
+    """Return total memory size of bar columns in bytes."""
+    return sum(column.nbytes for column in bars.values())
+
+
+def slice_bars(bars: Dict[str, np.ndarray], start: np.datetime64, end: np.datetime64) -> Dict[str, np.ndarray]:
+    """
+    Select bars with start <= time <= end.
+
+    Bars must be sorted by time. Returned arrays are views, not copies.
+    """
+    time_array = bars['time']
+    left = np.searchsorted(time_array, start, side='left')
+    right = np.searchsorted(time_array, end, side='right')
+    return {name: column[left:right] for name, column in bars.items()}
+
+
+def concat_bars(pages: List[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    """
+    Concatenate non-overlapping sorted bar sets into one sorted set.
+
+    Args:
+        pages: Bar sets in any order, each sorted by time
+
+    Returns:
+        dict of bar columns
+    """
+    pages = sorted((page for page in pages if len(page['time'])), key=lambda page: page['time'][0])
+    if not pages:
+        return empty_bars()
+    if len(pages) == 1:
+        return pages[0]
+    return {name: np.concatenate([page[name] for page in pages]) for name in pages[0]}
+
+
+def merge_bars(first: Dict[str, np.ndarray], second: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    Merge two sorted bar sets into one sorted set without duplicate times.
+
+    If both sets contain a bar with the same time, the bar from second wins.
+    Only columns present in both sets are kept.
+    """
+    if len(first['time']) == 0:
+        return second
+    if len(second['time']) == 0:
+        return first
+
+    columns = [name for name in first if name in second]
+
+    # Fast path: ranges don't overlap, plain concatenation keeps order
+    if first['time'][-1] < second['time'][0]:
+        return {name: np.concatenate((first[name], second[name])) for name in columns}
+    if second['time'][-1] < first['time'][0]:
+        return {name: np.concatenate((second[name], first[name])) for name in columns}
+
+    time_array = np.concatenate((first['time'], second['time']))
+    # Stable sort keeps bars of first before bars of second for equal times
+    order = np.argsort(time_array, kind='stable')
+    sorted_time = time_array[order]
+    # Keep the last bar of every run of equal times (bar from second)
+    keep = np.ones(len(sorted_time), dtype=bool)
+    keep[:-1] = sorted_time[1:] != sorted_time[:-1]
+    order = order[keep]
+    return {name: np.concatenate((first[name], second[name]))[order] for name in columns}
@@ -0,0 +1,132 @@
+"""
+In-process columnar cache of bars for the quotes service.
+"""
+from typing import Optional, Dict, List, Tuple
+import logging
+import numpy as np
+from .timeframe import Timeframe
+from .bars import bars_nbytes, slice_bars, merge_bars
+
+logger = logging.getLogger(__name__)
+
+CacheKey = Tuple[str, str, Timeframe]
+
+
+class CachedRange:
+    """
+    Contiguous covered interval with its bars.
+
+    start and end are inclusive bounds of the interval for which the cache
+    knows the complete stored data. Bars inside can be sparse if the exchange
+    has no data for some periods.
+    """
+
+    def __init__(self, start: np.datetime64, end: np.datetime64, bars: Dict[str, np.ndarray], stamp: int):
+        self.start = start
+        self.end = end
+        self.bars = bars
+        self.nbytes = bars_nbytes(bars)
+        self.stamp = stamp
+
+
+class QuotesCache:
+    """
+    Memory cache of contiguous bar ranges per (source, symbol, timeframe).
+
+    Ranges of one key never overlap: a new range is merged with all existing
+    ranges it overlaps or touches. When total size exceeds max_bytes, least
+    recently used ranges are evicted.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._ranges: Dict[CacheKey, List[CachedRange]] = {}
+        self._stamp = 0
+
+    def _next_stamp(self) -> int:
+        self._stamp += 1
+        return self._stamp
+
+    def get(self, key: CacheKey, start: np.datetime64, end: np.datetime64) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Get bars for [start, end] if the whole interval is covered.
+
+        Args:
+            key: (source, symbol, timeframe)
+            start: Start of requested interval (inclusive)
+            end: End of requested interval (inclusive)
+
+        Returns:
+            dict of bar columns (views into cached arrays) or None if not covered
+        """
+        for cached in self._ranges.get(key, ()):
+            if cached.start <= start and end <= cached.end:
+                cached.stamp = self._next_stamp()
+                self.hits += 1
+                return slice_bars(cached.bars, start, end)
+        self.misses += 1
+        return None
+
+    def put(self, key: CacheKey, start: np.datetime64, end: np.datetime64, bars: Dict[str, np.ndarray]) -> None:
+        """
+        Add covered interval [start, end] with its bars to the cache.
+
+        Args:
+            key: (source, symbol, timeframe)
+            start: Start of covered interval (inclusive)
+            end: End of covered interval (inclusive)
+            bars: Sorted bars inside [start, end]
+        """
+        if end < start:
+            return
+
+        step = key[2].timedelta64()
+        ranges = self._ranges.setdefault(key, [])
+        merged_start, merged_end, merged_bars = start, end, bars
+        kept = []
+        for cached in ranges:
+            if cached.start <= end + step and start <= cached.end + step:
+                merged_start = min(merged_start, cached.start)
+                merged_end = max(merged_end, cached.end)
+                merged_bars = merge_bars(cached.bars, merged_bars)
+                self.total_bytes -= cached.nbytes
+            else:
+                kept.append(cached)
+
+        merged = CachedRange(merged_start, merged_end, merged_bars, self._next_stamp())
+        if merged.nbytes > self.max_bytes:
+            # Doesn't fit at all, merged ranges are dropped too
+            self._ranges[key] = kept
+            if not kept:
+                del self._ranges[key]
+            return
+
+        kept.append(merged)
+        kept.sort(key=lambda cached: cached.start)
+        self._ranges[key] = kept
+        self.total_bytes += merged.nbytes
+        self._evict()
+
+    def invalidate(self, key: CacheKey) -> None:
+        """Remove all cached ranges for key."""
+        for cached in self._ranges.pop(key, ()):
+            self.total_bytes -= cached.nbytes
+
+    def _evict(self) -> None:
+        """Evict least recently used ranges until total size fits max_bytes."""
+        while self.total_bytes > self.max_bytes:
+            lru_key, lru_range = None, None
+            for key, ranges in self._ranges.items():
+                for cached in ranges:
+                    if lru_range is None or cached.stamp < lru_range.stamp:
+                        lru_key, lru_range = key, cached
+            if lru_range is None:
+                break
+            self._ranges[lru_key].remove(lru_range)
+            if not self._ranges[lru_key]:
+                del self._ranges[lru_key]
+            self.total_bytes -= lru_range.nbytes
+            logger.debug(f"Evicted cached range {lru_key} {lru_range.start}..{lru_range.end} ({lru_range.nbytes} bytes)")
@@ -0,0 +1,108 @@
+"""
+Bounded pool of ClickHouse clients for the quotes service.
+
+A clickhouse_connect client must not run concurrent queries, so queries of
+concurrent requests need separate clients. A thread holds a client for the
+duration of a database call (see with_connection); nested calls of the same
+thread reuse it, so one call never holds more than one client.
+"""
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, List, Optional
+import functools
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class ClickHousePool:
+    """
+    Pool of at most size ClickHouse clients, created on demand.
+
+    A caller waits up to timeout seconds for a free client.
+    """
+
+    def __init__(self, factory: Callable[[], Any], size: int, timeout: Optional[float] = None):
+        """
+        Args:
+            factory: Function creating a new client
+            size: Maximum number of clients
+            timeout: Maximum time to wait for a free client in seconds (None = wait forever)
+        """
+        if size < 1:
+            raise ValueError("ClickHouse pool size must be at least 1")
+        self._factory = factory
+        self.size = size
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle: List[Any] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _acquire(self) -> Any:
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError(f"No free ClickHouse client within {self.timeout} seconds")
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        try:
+            return self._factory()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _release(self, client: Any) -> None:
+        with self._lock:
+            self._idle.append(client)
+        self._slots.release()
+
+    @contextmanager
+    def borrow(self) -> Iterator[Any]:
+        """
+        Borrow a client not bound to the current thread.
+
+        For work that continues on other threads, e.g. a result stream read by
+        a generator resumed from a thread pool.
+        """
+        client = self._acquire()
+        try:
+            yield client
+        finally:
+            self._release(client)
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        """Hold a client in the current thread; nested calls get the same client."""
+        client = getattr(self._local, 'client', None)
+        if client is not None:
+            yield client
+            return
+        with self.borrow() as client:
+            self._local.client = client
+            try:
+                yield client
+            finally:
+                self._local.client = None
+
+    def current(self) -> Optional[Any]:
+        """Return the client held by the current thread, or None."""
+        return getattr(self._local, 'client', None)
+
+    def close(self) -> None:
+        """Close idle clients. Clients in use are returned to the pool as usual."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for client in idle:
+            try:
+                client.close()
+            except Exception as e:
+                logger.warning(f"Error closing ClickHouse client: {e}")
+
+
+def with_connection(method: Callable) -> Callable:
+    """Decorate a method of an object with clickhouse_pool to hold a client during the call."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.clickhouse_pool.connection():
+            return method(self, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,486 @@
+"""
+ClickHouse storage of the quotes service.
+
+Bars are kept in the quotes table, stored ranges in quotes_coverage and ranges
+the exchange has no bars for in quotes_unavailable; the schema is created and
+migrated by migrate (see schema.py). Queries run on clients of a bounded pool
+(see clickhouse_pool.py), so concurrent calls query ClickHouse in parallel.
+"""
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+import logging
+import numpy as np
+import clickhouse_connect
+from .bars import PRICE_COLUMNS
+from .clickhouse_pool import ClickHousePool, with_connection
+from .constants import TIME_TYPE, TIME_TYPE_UNIT
+from .coverage import Interval, merge_intervals
+from .exceptions import R2D2QuotesException
+from .native import read_native, write_native
+from .schema import load_migrations, pending_migrations, split_statements
+from .storage import QuotesStorage
+from .timeframe import Timeframe
+from app.core.config import QUOTES_CLICKHOUSE_POOL_SIZE, QUOTES_CLICKHOUSE_POOL_TIMEOUT, QUOTES_CLICKHOUSE_STREAM_SLOTS, QUOTES_COVERAGE_COMPACT_ROWS
+
+logger = logging.getLogger(__name__)
+
+
+class ClickHouseStorage(QuotesStorage):
+    """Storage of bars and stored ranges in a ClickHouse database."""
+
+    def __init__(self, clickhouse_params: Dict):
+        """
+        Args:
+            clickhouse_params: Dictionary with ClickHouse connection parameters (host, port, username, password, database)
+        """
+        self.clickhouse_host = clickhouse_params['host']
+        self.clickhouse_port = clickhouse_params['port']
+        self.clickhouse_username = clickhouse_params['username']
+        self.clickhouse_password = clickhouse_params.get('password', '')
+        self.clickhouse_database = clickhouse_params['database']
+
+        # Each concurrent database call holds its own client from a bounded pool
+        self.clickhouse_pool = ClickHousePool(
+            factory=lambda: self.connect_database(database=self.clickhouse_database),
+            size=QUOTES_CLICKHOUSE_POOL_SIZE,
+            timeout=QUOTES_CLICKHOUSE_POOL_TIMEOUT
+        )
+
+        # Streams hold a client until the client reads the whole range, so they
+        # take clients from a separate pool and never starve ordinary calls
+        self.stream_pool = ClickHousePool(
+            factory=lambda: self.connect_database(database=self.clickhouse_database),
+            size=QUOTES_CLICKHOUSE_STREAM_SLOTS,
+            timeout=QUOTES_CLICKHOUSE_POOL_TIMEOUT
+        )
+
+        # Keys checked for coverage rows (see ensure_coverage)
+        self._coverage_checked = set()
+
+        # Coverage rows inserted by key since its last compaction (see compact_coverage)
+        self._coverage_inserts: Dict[Tuple[str, str, Timeframe], int] = {}
+
+    def connect_database(self, database: Optional[str] = None):
+        """
+        Create ClickHouse client connection.
+
+        Args:
+            database: Database name (optional). If None, connects without specifying database.
+
+        Returns:
+            ClickHouse client instance
+        """
+        params = {
+            'host': self.clickhouse_host,
+            'port': self.clickhouse_port,
+            'username': self.clickhouse_username,
+            'password': self.clickhouse_password
+        }
+
+        if database is not None:
+            params['database'] = database
+
+        return clickhouse_connect.get_client(**params, compression=True)
+
+    @property
+    def clickhouse_client(self):
+        """ClickHouse client held by the current thread (see with_connection)."""
+        client = self.clickhouse_pool.current()
+        if client is None:
+            raise R2D2QuotesException("ClickHouse client is used outside of a pooled call")
+        return client
+
+    def _connect_or_create(self):
+        """Connect to the database, creating it if it doesn't exist."""
+        try:
+            return self.connect_database(database=self.clickhouse_database)
+        except Exception as e:
+            # Database doesn't exist, connect to default and create it
+            logger.info(f"Database '{self.clickhouse_database}' doesn't exist, creating it: {e}")
+
+            # Connect to default database
+            default_client = self.connect_database()
+
+            # Create database
+            default_client.command(f"CREATE DATABASE IF NOT EXISTS {self.clickhouse_database}")
+            default_client.close()
+            logger.info(f"Database '{self.clickhouse_database}' created")
+
+            # Now connect to the created database
+            return self.connect_database(database=self.clickhouse_database)
+
+    @staticmethod
+    def _schema_version(client) -> int:
+        """Read the applied schema version (0 for an empty database)."""
+        try:
+            result = client.query("SELECT max(version) FROM db_quotes_version")
+        except Exception as e:
+            logger.info(f"Database schema is not initialized: {e}")
+            return 0
+        if result.result_rows and result.result_rows[0][0]:
+            return int(result.result_rows[0][0])
+        return 0
+
+    def migrate(self, heartbeat: Optional[Callable[[], None]] = None) -> None:
+        """
+        Create the database and apply pending schema migrations (see schema.py).
+
+        The applied version is read here, so under the lock of migrate_storage
+        a migration applied by another process is not applied again.
+
+        Args:
+            heartbeat: Called before each statement of a migration
+        """
+        logger.info(f"Connecting to ClickHouse: {self.clickhouse_host}:{self.clickhouse_port}, database: {self.clickhouse_database}")
+        client = self._connect_or_create()
+        try:
+            version = self._schema_version(client)
+            logger.info(f"Database schema version: {version}")
+
+            # Apply migrations above the applied version in order, recording each
+            # version once its script has run
+            for migration_version, path in pending_migrations(load_migrations(), version):
+                logger.info(f"Applying database migration {path.name}")
+                for statement in split_statements(path.read_text(encoding='utf-8')):
+                    if heartbeat is not None:
+                        heartbeat()
+                    client.command(statement)
+                client.command(f"INSERT INTO db_quotes_version (version) VALUES ({migration_version})")
+        finally:
+            client.close()
+        logger.info("Database schema initialized successfully")
+
+    def init(self) -> None:
+        """
+        Check that the database schema is migrated (see migrate).
+
+        Raises:
+            R2D2QuotesException: If the database has pending migrations
+        """
+        client = self.connect_database(database=self.clickhouse_database)
+        try:
+            version = self._schema_version(client)
+        finally:
+            client.close()
+        pending = pending_migrations(load_migrations(), version)
+        if pending:
+            raise R2D2QuotesException(
+                f"Database schema version {version} is behind {pending[-1][0]}, "
+                f"migrations are applied on service start (see migrate_storage)"
+            )
+
+    def close(self) -> None:
+        """Close idle clients of the pools."""
+        self.clickhouse_pool.close()
+        self.stream_pool.close()
+
+    @with_connection
+    def read_bars(self, source: str, symbol: str, timeframe: Timeframe, date_start: datetime, date_end: datetime, columns: Optional[Sequence[str]] = None) -> Dict[str, np.ndarray]:
+        price_columns = PRICE_COLUMNS if columns is None else [name for name in PRICE_COLUMNS if name in columns]
+        query = self._quotes_query(source, symbol, timeframe, date_start, date_end, price_columns)
+
+        # Read the result in columnar Native format: columns are contiguous arrays
+        # (views of the response bytes), without building a structured array
+        result = read_native(self.clickhouse_client.raw_query(query, fmt='Native'))
+        if not result:
+            # Return empty arrays if no data
+            bars = {'time': np.array([], dtype=TIME_TYPE)}
+            for name in price_columns:
+                bars[name] = np.array([], dtype=np.float64)
+            return bars
+
+        # Conversions are no-ops for the stored types (DateTime64(3) and Float64)
+        bars = {'time': result['time'].astype(TIME_TYPE, copy=False)}
+        for name in price_columns:
+            bars[name] = result[name].astype(np.float64, copy=False)
+        return bars
+
+    @staticmethod
+    def _quotes_query(source: str, symbol: str, timeframe: Timeframe, date_start: datetime, date_end: datetime, price_columns: Sequence[str] = PRICE_COLUMNS) -> str:
+        """
+        Build query of time and price columns of bars of a range ordered by time.
+
+        FINAL collapses bars inserted more than once that are not merged yet.
+        """
+        date_start_str = date_start.strftime('%Y-%m-%d %H:%M:%S')
+        date_end_str = date_end.strftime('%Y-%m-%d %H:%M:%S')
+
+        return f"""
+        SELECT
+            {', '.join(('time',) + tuple(price_columns))}
+        FROM quotes FINAL
+        WHERE source = '{source}'
+          AND symbol = '{symbol}'
+          AND timeframe = '{str(timeframe)}'
+          AND time >= '{date_start_str}'
+          AND time <= '{date_end_str}'
+        ORDER BY time
+        """
+
+    def iter_bars(self, source: str, symbol: str, timeframe: Timeframe, date_start: datetime, date_end: datetime, block_bars: int, columns: Optional[Sequence[str]] = None) -> Iterator[Dict[str, np.ndarray]]:
+        """Stream bars of a range from ClickHouse, the range is never held in memory as a whole."""
+        price_columns = PRICE_COLUMNS if columns is None else [name for name in PRICE_COLUMNS if name in columns]
+        query = self._quotes_query(source, symbol, timeframe, date_start, date_end, price_columns)
+        # The generator may be resumed from different threads, so the client is not bound to a thread
+        with self.stream_pool.borrow() as client, client.query_np_stream(query, settings={'max_block_size': block_bars}) as stream:
+            for block in stream:
+                if len(block) == 0:
+                    continue
+                bars = {'time': np.asarray(block['time'], dtype=TIME_TYPE)}
+                for name in price_columns:
+                    bars[name] = np.asarray(block[name], dtype=np.float64)
+                yield bars
+
+    @with_connection
+    def count_bars(self, source: str, symbol: str, timeframe: Timeframe, date_start: datetime, date_end: datetime) -> int:
+        query = f"""
+        SELECT count()
+        FROM quotes FINAL
+        WHERE source = '{source}'
+          AND symbol = '{symbol}'
+          AND timeframe = '{str(timeframe)}'
+          AND time >= '{date_start.strftime('%Y-%m-%d %H:%M:%S')}'
+          AND time <= '{date_end.strftime('%Y-%m-%d %H:%M:%S')}'
+        """
+        return int(self.clickhouse_client.query(query).result_rows[0][0])
+
+    @with_connection
+    def write_bars(self, source: str, symbol: str, timeframe: Timeframe, bars: Dict[str, np.ndarray]) -> None:
+        """
+        Insert bars in a single Native format block.
+
+        Columns are written from the bytes of their arrays and the key is a
+        constant column, so no Python objects are built per bar.
+        """
+        count = len(bars['time'])
+        if not count:
+            return
+        columns = [
+            ('source', 'LowCardinality(String)', source),
+            ('symbol', 'LowCardinality(String)', symbol),
+            ('timeframe', 'LowCardinality(String)', str(timeframe)),
+            ('time', "DateTime64(3, 'UTC')", bars['time']),
+        ] + [(name, 'Float64', bars[name]) for name in PRICE_COLUMNS]
+        self.clickhouse_client.raw_insert(
+            'quotes',
+            [name for name, _, _ in columns],
+            insert_block=write_native(columns, count),
+            fmt='Native'
+        )
+
+    @staticmethod
+    def _format_time(value: np.datetime64) -> str:
+        """Format np.datetime64 as ClickHouse DateTime64 literal."""
+        return str(value.astype('datetime64[ms]')).replace('T', ' ')
+
+    @with_connection
+    def get_coverage(self, source: str, symbol: str, timeframe: Timeframe, date_start: np.datetime64, date_end: np.datetime64, include_unavailable: bool = False) -> List[Interval]:
+        """
+        Get coverage rows intersecting or touching [date_start, date_end].
+
+        Keys that have bars but no coverage rows (stored before the coverage
+        table existed) get their coverage rebuilt from bars on first access.
+        """
+        key = (source, symbol, timeframe)
+        if key not in self._coverage_checked:
+            self.ensure_coverage(source, symbol, timeframe)
+            self._coverage_checked.add(key)
+
+        step = timeframe.timedelta64()
+        range_filter = f"""source = '{source}'
+          AND symbol = '{symbol}'
+          AND timeframe = '{str(timeframe)}'
+          AND time_end >= '{self._format_time(date_start - step)}'
+          AND time_start <= '{self._format_time(date_end + step)}'"""
+        query = f"""
+        SELECT
+            toUnixTimestamp64Milli(time_start),
+            toUnixTimestamp64Milli(time_end)
+        FROM quotes_coverage FINAL
+        WHERE {range_filter}
+        """
+        if include_unavailable:
+            # Same round trip: coverage and unavailable ranges are subtracted together
+            query += f"""
+        UNION ALL
+        SELECT
+            toUnixTimestamp64Milli(time_start),
+            toUnixTimestamp64Milli(time_end)
+        FROM quotes_unavailable FINAL
+        WHERE {range_filter}
+          AND (recheck_interval = 0 OR checked_at + toIntervalSecond(recheck_interval) > now64(3))
+        """
+        result = self.clickhouse_client.query(query)
+        return [
+            (np.datetime64(row[0], TIME_TYPE_UNIT), np.datetime64(row[1], TIME_TYPE_UNIT))
+            for row in result.result_rows
+        ]
+
+    @with_connection
+    def add_coverage(self, source: str, symbol: str, timeframe: Timeframe, time_start: np.datetime64, time_end: np.datetime64) -> None:
+        """
+        Insert a coverage row.
+
+        Rows are keyed by time_start and versioned by time_end, so a row with the
+        same start is replaced on merge (reads use FINAL). Rows starting later that
+        the interval contains (it grew at its start or joined intervals) stay until
+        the key is compacted every QUOTES_COVERAGE_COMPACT_ROWS inserts (see
+        compact_coverage); readers merge intervals, so they are harmless.
+        """
+        self.clickhouse_client.insert(
+            'quotes_coverage',
+            [[
+                source,
+                symbol,
+                str(timeframe),
+                int(time_start.astype('datetime64[ms]').astype(np.int64)),
+                int(time_end.astype('datetime64[ms]').astype(np.int64)),
+            ]],
+            column_names=['source', 'symbol', 'timeframe', 'time_start', 'time_end']
+        )
+        key = (source, symbol, timeframe)
+        self._coverage_inserts[key] = self._coverage_inserts.get(key, 0) + 1
+        if self._coverage_inserts[key] >= QUOTES_COVERAGE_COMPACT_ROWS:
+            self.compact_coverage(source, symbol, timeframe)
+
+    @with_connection
+    def compact_coverage(self, source: str, symbol: str, timeframe: Timeframe) -> None:
+        """
+        Rewrite coverage rows of a key as one row per merged interval.
+
+        Merged intervals are inserted first, so readers never see a range
+        uncovered, then the rows they subsume are deleted by a mutation. Only
+        the rows read here are deleted: rows inserted meanwhile are kept.
+
+        Args:
+            source: Exchange name (e.g., 'binance')
+            symbol: Trading pair symbol (e.g., 'BTC/USDT')
+            timeframe: Timeframe object
+        """
+        self._coverage_inserts[(source, symbol, timeframe)] = 0
+        key_filter = f"source = '{source}' AND symbol = '{symbol}' AND timeframe = '{str(timeframe)}'"
+        result = self.clickhouse_client.query(f"""
+        SELECT DISTINCT
+            toUnixTimestamp64Milli(time_start),
+            toUnixTimestamp64Milli(time_end)
+        FROM quotes_coverage
+        WHERE {key_filter}
+        """)
+        rows = {(int(row[0]), int(row[1])) for row in result.result_rows}
+        intervals = merge_intervals(
+            [(np.datetime64(start, TIME_TYPE_UNIT), np.datetime64(end, TIME_TYPE_UNIT)) for start, end in rows],
+            timeframe.timedelta64()
+        )
+        merged = {(int(start.astype('datetime64[ms]').astype(np.int64)), int(end.astype('datetime64[ms]').astype(np.int64))) for start, end in intervals}
+        subsumed = sorted(rows - merged)
+        if not subsumed:
+            return
+
+        logger.info(f"Compacting coverage of {source}/{symbol}/{timeframe}: {len(rows)} rows, {len(merged)} intervals")
+        added = sorted(merged - rows)
+        if added:
+            self.clickhouse_client.insert(
+                'quotes_coverage',
+                [[source, symbol, str(timeframe), start, end] for start, end in added],
+                column_names=['source', 'symbol', 'timeframe', 'time_start', 'time_end']
+            )
+        self.clickhouse_client.command(f"""
+        ALTER TABLE quotes_coverage
+        DELETE WHERE {key_filter}
+          AND (toUnixTimestamp64Milli(time_start), toUnixTimestamp64Milli(time_end)) IN ({', '.join(f'({start}, {end})' for start, end in subsumed)})
+        """)
+
+    @with_connection
+    def ensure_coverage(self, source: str, symbol: str, timeframe: Timeframe) -> None:
+        """
+        Rebuild coverage rows from stored bars if the key has bars but no coverage.
+
+        Coverage of a key with more than QUOTES_COVERAGE_COMPACT_ROWS rows is compacted.
+
+        Args:
+            source: Exchange name (e.g., 'binance')
+            symbol: Trading pair symbol (e.g., 'BTC/USDT')
+            timeframe: Timeframe object
+        """
+        key_filter = f"source = '{source}' AND symbol = '{symbol}' AND timeframe = '{str(timeframe)}'"
+        result = self.clickhouse_client.query(f"""
+        SELECT
+            (SELECT count() FROM quotes_coverage WHERE {key_filter}),
+            (SELECT count() FROM quotes WHERE {key_filter})
+        """)
+        coverage_rows, bar_rows = result.result_rows[0]
+        if coverage_rows > QUOTES_COVERAGE_COMPACT_ROWS:
+            self.compact_coverage(source, symbol, timeframe)
+        if coverage_rows or not bar_rows:
+            return
+
+        logger.info(f"Rebuilding coverage for {source}/{symbol}/{timeframe} from {bar_rows} stored bars")
+        intervals = self.stored_intervals(source, symbol, timeframe)
+        self.clickhouse_client.insert(
+            'quotes_coverage',
+            [
+                [source, symbol, str(timeframe), int(start.astype(np.int64)), int(end.astype(np.int64))]
+                for start, end in intervals
+            ],
+            column_names=['source', 'symbol', 'timeframe', 'time_start', 'time_end']
+        )
+
+    @with_connection
+    def stored_intervals(self, source: str, symbol: str, timeframe: Timeframe) -> List[Interval]:
+        """
+        Find contiguous intervals of stored bars.
+
+        Intervals are computed in ClickHouse (gaps and islands over time):
+        a bar more than one step after the previous bar starts a new interval.
+        Only one row per interval is transferred, not the bar times. Same
+        result as intervals_from_times over all stored bar times.
+        """
+        step_ms = int(timeframe.timedelta64().astype('timedelta64[ms]').astype(np.int64))
+        result = self.clickhouse_client.query(f"""
+        SELECT
+            min(time_ms),
+            max(time_ms)
+        FROM (
+            SELECT
+                time_ms,
+                sum(is_break) OVER (ORDER BY time_ms ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW) AS island
+            FROM (
+                SELECT
+                    time_ms,
+                    time_ms - lagInFrame(time_ms, 1, time_ms) OVER (ORDER BY time_ms ROWS BETWEEN 1 PRECEDING AND CURRENT ROW) > {step_ms} AS is_break
+                FROM (
+                    SELECT toUnixTimestamp64Milli(time) AS time_ms
+                    FROM quotes
+                    WHERE source = '{source}'
+                      AND symbol = '{symbol}'
+                      AND timeframe = '{str(timeframe)}'
+                )
+            )
+        )
+        GROUP BY island
+        ORDER BY island
+        """)
+        return [
+            (np.datetime64(row[0], TIME_TYPE_UNIT), np.datetime64(row[1], TIME_TYPE_UNIT))
+            for row in result.result_rows
+        ]
+
+    @with_connection
+    def add_unavailable(self, source: str, symbol: str, timeframe: Timeframe, ranges: Sequence[Tuple[np.datetime64, np.datetime64, int]], checked_at: np.datetime64) -> None:
+        checked_at_ms = int(checked_at.astype('datetime64[ms]').astype(np.int64))
+        self.clickhouse_client.insert(
+            'quotes_unavailable',
+            [
+                [
+                    source,
+                    symbol,
+                    str(timeframe),
+                    int(start.astype('datetime64[ms]').astype(np.int64)),
+                    int(end.astype('datetime64[ms]').astype(np.int64)),
+                    checked_at_ms,
+                    recheck_interval
+                ]
+                for start, end, recheck_interval in ranges
+            ],
+            column_names=['source', 'symbol', 'timeframe', 'time_start', 'time_end', 'checked_at', 'recheck_interval']
+        )
@@ -1,13 +1,21 @@
 from abc import ABC, abstractmethod
 from datetime import datetime, date
-from typing import Optional, Dict, Union
+from typing import Optional, Dict, Union, Iterator, Sequence, List
 import redis
 import numpy as np
 import msgpack
+import socket
 import uuid
 from .timeframe import Timeframe
 from .exceptions import R2D2QuotesExceptionDataNotReceived
 from .constants import TIME_TYPE
+from .bars import BAR_COLUMNS, select_columns
+from .response_cache import cache_range, cache_key, get_response
+from .shm import open_segment
+from .stream import read_stream
+from .frame import is_frame, read_frame
+from .compression import available_codecs
+from app.core.config import QUOTES_SHM_TRANSPORT, QUOTES_RESPONSE_COMPRESSION, QUOTES_RESPONSE_CACHE
 from app.core.logger import get_logger
 
 logger = get_logger(__name__)
@@ -48,7 +56,7 @@ class QuotesClient:
             cls._instance = super(QuotesClient, cls).__new__(cls)
         return cls._instance
 
-    def __init__(self, redis_params: Optional[Dict] = None, request_list: str = 'quotes:requests', response_prefix: str = 'quotes:responses', timeout: int = 30):
+    def __init__(self, redis_params: Optional[Dict] = None, request_list: str = 'quotes:requests', response_prefix: str = 'quotes:responses', timeout: int = 30, shm_transport: bool = QUOTES_SHM_TRANSPORT, compression: bool = QUOTES_RESPONSE_COMPRESSION, response_cache: bool = QUOTES_RESPONSE_CACHE):
         if not QuotesClient._initialized:
             if redis_params is None:
                 raise RuntimeError("Quotes Client must be initialized with redis_params on first call")
@@ -74,37 +82,57 @@ class QuotesClient:
             self.request_list = request_list
             self.response_prefix = response_prefix
             self.timeout = timeout
+            # Receive data through shared memory when the service runs on the same host
+            self.shm_transport = shm_transport
+            self.hostname = socket.gethostname()
+            # Accept compressed frames (smaller in Redis and on the network)
+            self.compression = compression
+            # Read closed historical ranges from the shared response cache before requesting the service
+            self.response_cache = response_cache
             QuotesClient._initialized = True
             logger.debug(f"Quotes client initialized with Redis connection parameters: host {self.redis_host}, port {self.redis_port}, db {self.redis_db}")
 
-    def get_redis_key(self, source: str, symbol: str, timeframe: Timeframe, history_start: datetime, history_end: Optional[datetime] = None) -> str:
-        """Generate Redis key for quotes data with human-readable dates."""
-        # Format dates in human-readable format (ISO 8601)
-        start_str = history_start.strftime('%Y-%m-%dT%H:%M:%S')
-        if history_end is not None:
-            end_str = history_end.strftime('%Y-%m-%dT%H:%M:%S')
-            return f"quotes:{source}:{symbol}:{timeframe}:{start_str}:{end_str}"
-        else:
-            return f"quotes:{source}:{symbol}:{timeframe}:{start_str}"
-
-    def get_quotes(self, source: str, symbol: str, timeframe: Timeframe, history_start: datetime, history_end: Optional[datetime] = None, timeout: int = 30) -> Dict[str, np.ndarray]:
+    def get_redis_key(self, source: str, symbol: str, timeframe: Timeframe, history_start: datetime, history_end: Optional[datetime] = None) -> Optional[str]:
         """
-        Get quotes data from Redis via service.
+        Generate key of the shared response cache with human-readable dates (see response_cache.py).
         
-        Sends request to quotes service and receives response with 6 numpy arrays:
-        - time: np.datetime64
-        - open, high, low, close, volume: float64
+        The range is snapped to its first and last bar, so requests for the same bars get the same key.
         
-        Args:
-            source: Data source (e.g., 'binance')
-            symbol: Trading symbol (e.g., 'btc/usdt')
-            timeframe: Timeframe object
-            history_start: Start time for historical data
-            history_end: End time for historical data (optional)
+        Returns:
+            Redis key, or None if the range is not cacheable (open-ended or not closed yet)
+        """
+        snapped = cache_range(timeframe, history_start, history_end)
+        if snapped is None:
+            return None
+        return cache_key(source, symbol, timeframe, *snapped)
+
+    def _get_cached(self, source: str, symbol: str, timeframe: Timeframe, history_start: datetime, history_end: Optional[datetime], columns: Optional[Sequence[str]], dtype: Optional[str]) -> Optional[Dict[str, np.ndarray]]:
+        key = self.get_redis_key(source, symbol, timeframe, history_start, history_end)
+        if key is None:
+            return None
+        data = get_response(self.redis_client, key)
+        if data is None:
+            return None
+        try:
+            bars = read_frame(data)
+        except ValueError as e:
+            # E.g. compressed with a codec not installed here
+            logger.debug(f"Cached response {key} is not readable: {e}")
+            return None
+        logger.debug(f"Quotes served from shared cache: {key}")
+        names = None if columns is None else ['time'] + [name for name in columns if name != 'time']
+        return select_columns(bars, names, dtype)
+
+    def _send_request(self, source: str, symbol: str, timeframe: Timeframe, history_start: datetime, history_end: Optional[datetime], timeout: int, stream: bool = False, columns: Optional[Sequence[str]] = None, dtype: Optional[str] = None) -> Dict:
+        """
+        Send request to quotes service and wait for the response.
         
         Returns:
-            dict with keys: 'time', 'open', 'high', 'low', 'close', 'volume'
-            Each value is a numpy array
+            Deserialized response; a binary frame response is returned as
+            {'metadata': {...}, 'frame': bytes}
+        
+        Raises:
+            R2D2QuotesExceptionDataNotReceived: If no response or the service reports an error
         """
         # Generate unique request ID
         request_id = str(uuid.uuid4())
@@ -116,8 +144,21 @@ class QuotesClient:
             'symbol': symbol,
             'timeframe': str(timeframe),
             'history_start': history_start.isoformat(),
-            'history_end': history_end.isoformat() if history_end is not None else None
+            'history_end': history_end.isoformat() if history_end is not None else None,
+            # Binary frame response instead of MessagePack (errors are still MessagePack)
+            'format': 'frame'
         }
+        if columns is not None:
+            request['columns'] = list(columns)
+        if dtype is not None:
+            request['dtype'] = dtype
+        if self.compression:
+            request['compression'] = available_codecs()
+        if stream:
+            request['stream'] = True
+        elif self.shm_transport:
+            request['transport'] = 'shm'
+            request['host'] = self.hostname
         
         # Send request to service using MessagePack
         request_bytes = msgpack.packb(request, use_bin_type=True)
@@ -136,6 +177,10 @@ class QuotesClient:
 
         _, response_bytes = result
         
+        # Bar columns in a binary frame, returned as views of the response
+        if is_frame(response_bytes):
+            return {'metadata': {'status': 'success', 'transport': 'frame'}, 'frame': response_bytes}
+        
         # Deserialize MessagePack response
         response_data = msgpack.unpackb(response_bytes, raw=False)
         
@@ -144,26 +189,119 @@ class QuotesClient:
         if metadata.get('status') == 'error':
             raise R2D2QuotesExceptionDataNotReceived(symbol, history_start, history_end, metadata.get('error'))
         
+        return response_data
+
+    def get_quotes(self, source: str, symbol: str, timeframe: Timeframe, history_start: datetime, history_end: Optional[datetime] = None, timeout: int = 30, stream: bool = False, columns: Optional[Sequence[str]] = None, dtype: Optional[str] = None) -> Dict[str, np.ndarray]:
+        """
+        Get quotes data from Redis via service.
+        
+        Sends request to quotes service and receives response with numpy arrays
+        (all 6 columns by default):
+        - time: np.datetime64
+        - open, high, low, close, volume: float64 (or float32 with dtype='float32')
+        
+        Closed historical ranges are read from the shared response cache in
+        Redis if present, without a request to the service (see response_cache.py).
+        
+        Args:
+            source: Data source (e.g., 'binance')
+            symbol: Trading symbol (e.g., 'btc/usdt')
+            timeframe: Timeframe object
+            history_start: Start time for historical data
+            history_end: End time for historical data (optional)
+            stream: If True, receive data in chunks (see iter_quotes) and assemble
+                them into preallocated arrays; use for very large ranges
+            columns: Columns to receive (e.g., ['close']), None for all; time is always received
+            dtype: dtype of price columns, 'float64' (default) or 'float32'
+        
+        Returns:
+            dict with keys: 'time' and the requested columns ('open', 'high', 'low', 'close', 'volume' by default)
+            Each value is a numpy array
+        """
+        if self.response_cache and not stream:
+            quotes_data = self._get_cached(source, symbol, timeframe, history_start, history_end, columns, dtype)
+            if quotes_data is not None:
+                return quotes_data
+        
+        response_data = self._send_request(source, symbol, timeframe, history_start, history_end, timeout, stream=stream, columns=columns, dtype=dtype)
+        metadata = response_data['metadata']
+        
+        # Data in chunks: copy each chunk into arrays allocated once
+        if metadata.get('transport') == 'stream':
+            return self._assemble_stream(
+                metadata['count'],
+                self._read_stream(metadata['stream'], symbol, history_start, history_end, timeout),
+                columns=columns,
+                dtype=dtype
+            )
+        
+        if metadata.get('transport') == 'frame':
+            return read_frame(response_data['frame'])
+        
+        # Data in shared memory: map it without copying
+        if metadata.get('transport') == 'shm':
+            try:
+                return open_segment(response_data['segment'])
+            except FileNotFoundError:
+                # Same hostname but another filesystem (e.g. a container), use inline transport
+                logger.warning("Shared memory segment of the quotes service is not accessible, switching to inline transport")
+                self.shm_transport = False
+                return self.get_quotes(source, symbol, timeframe, history_start, history_end, timeout, columns=columns, dtype=dtype)
+        
         # Extract binary data
         binary_data = response_data.get('binary_data', {})
         
-        # Convert binary data to numpy arrays
-        time_array = np.frombuffer(binary_data['time'], dtype=TIME_TYPE)
-        open_array = np.frombuffer(binary_data['open'], dtype=np.float64)
-        high_array = np.frombuffer(binary_data['high'], dtype=np.float64)
-        low_array = np.frombuffer(binary_data['low'], dtype=np.float64)
-        close_array = np.frombuffer(binary_data['close'], dtype=np.float64)
-        volume_array = np.frombuffer(binary_data['volume'], dtype=np.float64)
-        
+        # Convert binary data to numpy arrays (dtypes are sent by the service, defaults for older services)
+        dtypes = metadata.get('dtypes', {})
         return {
-            'time': time_array,
-            'open': open_array,
-            'high': high_array,
-            'low': low_array,
-            'close': close_array,
-            'volume': volume_array
+            name: np.frombuffer(data, dtype=dtypes.get(name, TIME_TYPE if name == 'time' else np.float64))
+            for name, data in binary_data.items()
         }
 
+    def iter_quotes(self, source: str, symbol: str, timeframe: Timeframe, history_start: datetime, history_end: Optional[datetime] = None, timeout: int = 30, columns: Optional[Sequence[str]] = None, dtype: Optional[str] = None) -> Iterator[Dict[str, np.ndarray]]:
+        """
+        Get quotes data in chunks via service.
+        
+        The service streams the range in chunks of limited size, so memory use of
+        both sides doesn't depend on the range size and the first chunk arrives
+        before the whole range is read.
+        
+        Args:
+            source: Data source (e.g., 'binance')
+            symbol: Trading symbol (e.g., 'btc/usdt')
+            timeframe: Timeframe object
+            history_start: Start time for historical data
+            history_end: End time for historical data (optional)
+            columns: Columns to receive, None for all; time is always received
+            dtype: dtype of price columns, 'float64' (default) or 'float32'
+        
+        Yields:
+            dict with keys: 'time' and the requested columns, chunks in time order
+        """
+        response_data = self._send_request(source, symbol, timeframe, history_start, history_end, timeout, stream=True, columns=columns, dtype=dtype)
+        yield from self._read_stream(response_data['metadata']['stream'], symbol, history_start, history_end, timeout)
+
+    def _read_stream(self, key: str, symbol: str, history_start: datetime, history_end: Optional[datetime], timeout: int) -> Iterator[Dict[str, np.ndarray]]:
+        try:
+            yield from read_stream(self.redis_client, key, timeout if timeout > 0 else self.timeout)
+        except (TimeoutError, RuntimeError) as e:
+            raise R2D2QuotesExceptionDataNotReceived(symbol, history_start, history_end, str(e)) from e
+
+    @staticmethod
+    def _assemble_stream(count: int, chunks: Iterator[Dict[str, np.ndarray]], columns: Optional[Sequence[str]] = None, dtype: Optional[str] = None) -> Dict[str, np.ndarray]:
+        names: List[str] = ['time'] + [name for name in (columns or BAR_COLUMNS) if name != 'time']
+        bars = {name: np.empty(count, dtype=TIME_TYPE if name == 'time' else (dtype or np.float64)) for name in names}
+        filled = 0
+        for chunk in chunks:
+            size = len(chunk['time'])
+            if filled + size > len(bars['time']):
+                # More bars than announced (stored meanwhile), grow arrays
+                bars = {name: np.concatenate((column[:filled], np.empty(size, dtype=column.dtype))) for name, column in bars.items()}
+            for name, column in bars.items():
+                column[filled:filled + size] = chunk[name]
+            filled += size
+        return {name: column[:filled] for name, column in bars.items()}
+
 
 class PriceSeries:
     def __init__(self, parent: 'Quotes', values: np.ndarray):
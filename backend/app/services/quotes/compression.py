@@ -0,0 +1,209 @@
+"""
+Column encodings of compressed quote frames.
+
+Encoding of a column is one byte: codec in the low bits and transform flags:
+    TIME_DELTA: int64/datetime64 column stored as first value, regular step and
+        a list of (index, delta) for deltas that differ from the step
+    DECIMAL: float column with at most MAX_DECIMALS decimal places (prices and
+        volumes on a tick grid) stored as zigzag-encoded deltas of integers
+        value * 10 ** decimals, so that most high-order bytes are zero
+    SHUFFLE: bytes of values regrouped by byte position before compression,
+        so that similar high-order bytes compress well
+
+Codecs zstd and lz4 are installed with requirements.txt. Their imports are optional,
+so a client or service without them negotiates zlib, which is always available.
+"""
+from typing import Dict, List, Optional, Sequence
+import struct
+import zlib
+import numpy as np
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+CODEC_NONE = 0
+CODEC_ZLIB = 1
+CODEC_LZ4 = 2
+CODEC_ZSTD = 3
+CODEC_MASK = 0x0F
+
+SHUFFLE = 0x10
+TIME_DELTA = 0x20
+DECIMAL = 0x40
+
+MAX_DECIMALS = 8
+# Integers up to 2 ** 53 are exact in float64
+_MAX_EXACT = float(2 ** 53)
+
+CODECS: Dict[str, int] = {'zlib': CODEC_ZLIB}
+if lz4 is not None:
+    CODECS['lz4'] = CODEC_LZ4
+if zstandard is not None:
+    CODECS['zstd'] = CODEC_ZSTD
+
+_TIME_HEADER = struct.Struct('<qqq')
+_DECIMAL_HEADER = struct.Struct('<b7x')
+
+
+def available_codecs() -> List[str]:
+    """Return names of available codecs, best first."""
+    return [name for name in ('zstd', 'lz4', 'zlib') if name in CODECS]
+
+
+def choose_codec(accepted: Optional[Sequence[str]]) -> Optional[str]:
+    """
+    Choose codec for a response.
+
+    Args:
+        accepted: Codec names accepted by the client in order of preference
+
+    Returns:
+        First accepted codec available here, or None
+    """
+    for name in accepted or ():
+        if name in CODECS:
+            return name
+    return None
+
+
+def _compress(data: bytes, codec: int) -> bytes:
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    if codec == CODEC_LZ4:
+        return lz4.frame.compress(data)
+    if codec == CODEC_ZLIB:
+        return zlib.compress(data, 1)
+    return data
+
+
+def _decompress(data: bytes, codec: int) -> bytes:
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise ValueError("zstd codec is not available")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == CODEC_LZ4:
+        if lz4 is None:
+            raise ValueError("lz4 codec is not available")
+        return lz4.frame.decompress(data)
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(data)
+    return data
+
+
+def _encode_time(values: np.ndarray) -> bytes:
+    if len(values) < 2:
+        return _TIME_HEADER.pack(int(values[0]) if len(values) else 0, 0, 0)
+    deltas = np.diff(values)
+    step = int(np.median(deltas))
+    indexes = np.flatnonzero(deltas != step)
+    return (
+        _TIME_HEADER.pack(int(values[0]), step, len(indexes))
+        + indexes.astype('<i8').tobytes()
+        + deltas[indexes].astype('<i8').tobytes()
+    )
+
+
+def _decode_time(data: bytes, count: int) -> np.ndarray:
+    start, step, exceptions = _TIME_HEADER.unpack_from(data, 0)
+    if count == 0:
+        return np.empty(0, dtype=np.int64)
+    offset = _TIME_HEADER.size
+    indexes = np.frombuffer(data, dtype='<i8', count=exceptions, offset=offset)
+    exception_deltas = np.frombuffer(data, dtype='<i8', count=exceptions, offset=offset + 8 * exceptions)
+    values = np.full(count, step, dtype=np.int64)
+    values[0] = start
+    values[indexes + 1] = exception_deltas
+    return np.cumsum(values)
+
+
+def _shuffle(values: np.ndarray) -> bytes:
+    # Row i of the shuffled matrix holds byte i of every value
+    return np.ascontiguousarray(values).view(np.uint8).reshape(len(values), values.dtype.itemsize).T.tobytes()
+
+
+def _unshuffle(data: bytes, dtype: np.dtype, count: int, offset: int = 0) -> np.ndarray:
+    shuffled = np.frombuffer(data, dtype=np.uint8, count=dtype.itemsize * count, offset=offset).reshape(dtype.itemsize, count)
+    return np.ascontiguousarray(shuffled.T).view(dtype).reshape(count)
+
+
+def _find_decimals(values: np.ndarray) -> Optional[int]:
+    if values.dtype != np.float64 or not np.all(np.isfinite(values)):
+        return None
+    limit = float(np.max(np.abs(values))) if len(values) else 0.0
+    for decimals in range(MAX_DECIMALS + 1):
+        scale = 10.0 ** decimals
+        if limit * scale >= _MAX_EXACT:
+            return None
+        if np.array_equal(np.round(values * scale) / scale, values):
+            return decimals
+    return None
+
+
+def _encode_decimal(values: np.ndarray, decimals: int) -> bytes:
+    scale = 10.0 ** decimals
+    deltas = np.diff(np.round(values * scale).astype(np.int64), prepend=0)
+    zigzag = (deltas << 1) ^ (deltas >> 63)
+    return _DECIMAL_HEADER.pack(decimals) + _shuffle(zigzag)
+
+
+def _decode_decimal(data: bytes, count: int) -> np.ndarray:
+    decimals, = _DECIMAL_HEADER.unpack_from(data, 0)
+    zigzag = _unshuffle(data, np.dtype(np.uint64), count, offset=_DECIMAL_HEADER.size)
+    deltas = (zigzag >> np.uint64(1)).astype(np.int64) ^ -(zigzag & np.uint64(1)).astype(np.int64)
+    return np.cumsum(deltas) / 10.0 ** decimals
+
+
+def encode_column(column: np.ndarray, codec: str) -> tuple:
+    """
+    Encode a column.
+
+    Args:
+        column: 1-D array
+        codec: Codec name (see CODECS)
+
+    Returns:
+        Tuple (encoding, payload bytes)
+    """
+    codec_id = CODECS[codec]
+    if column.dtype.kind in 'iM' and column.dtype.itemsize == 8:
+        encoding = codec_id | TIME_DELTA
+        data = _encode_time(column.view(np.int64))
+    else:
+        decimals = _find_decimals(column)
+        if decimals is not None:
+            encoding = codec_id | DECIMAL | SHUFFLE
+            data = _encode_decimal(column, decimals)
+        else:
+            encoding = codec_id | SHUFFLE
+            data = _shuffle(column)
+    return encoding, _compress(data, codec_id)
+
+
+def decode_column(payload: bytes, encoding: int, dtype: np.dtype, count: int) -> np.ndarray:
+    """
+    Decode a column encoded with encode_column.
+
+    Args:
+        payload: Encoded bytes
+        encoding: Encoding byte
+        dtype: Column dtype
+        count: Number of values
+
+    Returns:
+        1-D array
+    """
+    data = _decompress(bytes(payload), encoding & CODEC_MASK)
+    if encoding & TIME_DELTA:
+        return _decode_time(data, count).view(dtype)
+    if encoding & DECIMAL:
+        return _decode_decimal(data, count).astype(dtype, copy=False)
+    if encoding & SHUFFLE:
+        return _unshuffle(data, dtype, count)
+    return np.frombuffer(data, dtype=dtype, count=count)
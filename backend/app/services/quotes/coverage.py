@@ -0,0 +1,125 @@
+"""
+Interval arithmetic for stored bar coverage.
+
+An interval (start, end) is inclusive on both ends and is expressed in
+np.datetime64 (TIME_TYPE). Intervals are bar-aligned: start is the time of the
+first bar and end is the time of the last bar of the interval, so two intervals
+whose bars follow each other with one timeframe step are contiguous.
+"""
+from typing import List, Tuple, Iterable, Sequence
+import numpy as np
+
+Interval = Tuple[np.datetime64, np.datetime64]
+
+
+def merge_intervals(intervals: Iterable[Interval], step: np.timedelta64) -> List[Interval]:
+    """
+    Merge overlapping and contiguous intervals.
+
+    Args:
+        intervals: Intervals in any order
+        step: Timeframe step, intervals closer than one step are merged
+
+    Returns:
+        Sorted list of disjoint intervals
+    """
+    merged: List[Interval] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + step:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def subtract_intervals(start: np.datetime64, end: np.datetime64, intervals: Iterable[Interval], step: np.timedelta64) -> List[Interval]:
+    """
+    Find parts of [start, end] not covered by intervals.
+
+    Args:
+        start: Start of requested range (inclusive)
+        end: End of requested range (inclusive)
+        intervals: Covered intervals
+        step: Timeframe step
+
+    Returns:
+        Sorted list of missing intervals. Boundaries adjacent to covered
+        intervals are moved by one step so covered bars are not included.
+    """
+    gaps: List[Interval] = []
+    current = start
+    for covered_start, covered_end in merge_intervals(intervals, step):
+        if covered_end < current:
+            continue
+        if covered_start > end:
+            break
+        # Unaligned range start can be less than one step before the first covered bar
+        if covered_start - step >= current:
+            gaps.append((current, covered_start - step))
+        current = covered_end + step
+        if current > end:
+            break
+    if current <= end:
+        gaps.append((current, end))
+    return gaps
+
+
+def intersect_intervals(intervals: Iterable[Interval], bounds: Sequence[Interval]) -> List[Interval]:
+    """
+    Clip intervals to bounds.
+
+    Args:
+        intervals: Intervals to clip
+        bounds: Disjoint intervals the result must lie in
+
+    Returns:
+        Sorted list of parts of intervals inside bounds
+    """
+    parts: List[Interval] = []
+    for start, end in intervals:
+        for bound_start, bound_end in bounds:
+            part_start, part_end = max(start, bound_start), min(end, bound_end)
+            if part_start <= part_end:
+                parts.append((part_start, part_end))
+    return sorted(parts)
+
+
+def intervals_from_times(time_array: np.ndarray, step: np.timedelta64) -> List[Interval]:
+    """
+    Build contiguous intervals from sorted bar times.
+
+    Args:
+        time_array: Sorted array of bar times
+        step: Timeframe step
+
+    Returns:
+        List of intervals, one per run of bars without missing bars
+    """
+    if len(time_array) == 0:
+        return []
+    breaks = np.where(np.diff(time_array) > step)[0]
+    starts = np.concatenate(([0], breaks + 1))
+    ends = np.concatenate((breaks, [len(time_array) - 1]))
+    return [(time_array[s], time_array[e]) for s, e in zip(starts, ends)]
+
+
+def find_empty_intervals(start: np.datetime64, end: np.datetime64, time_array: np.ndarray, step: np.timedelta64) -> List[Tuple[Interval, bool]]:
+    """
+    Find parts of a fetched range [start, end] where the source returned no bars.
+
+    Args:
+        start: First bar time of the fetched range
+        end: Last bar time of the fetched range
+        time_array: Sorted times of the fetched bars
+        step: Timeframe step
+
+    Returns:
+        List of (interval, final): final is True if the source returned bars
+        after the interval, so the interval will stay empty (e.g. before the
+        listing or a maintenance window); otherwise the source may still
+        publish its bars (e.g. after a delay)
+    """
+    holes = subtract_intervals(start, end, intervals_from_times(time_array, step), step)
+    last_time = time_array[-1] if len(time_array) else None
+    return [((hole_start, hole_end), last_time is not None and hole_end < last_time) for hole_start, hole_end in holes]
@@ -0,0 +1,134 @@
+"""
+Pool of long-lived ccxt exchange instances for the quotes service.
+"""
+from contextlib import asynccontextmanager
+from typing import Dict, AsyncIterator
+import asyncio
+import logging
+import time
+import ccxt.async_support as ccxt
+
+logger = logging.getLogger(__name__)
+
+
+class PooledExchange:
+    """Exchange instance with its usage bookkeeping."""
+
+    def __init__(self, exchange: ccxt.Exchange):
+        self.exchange = exchange
+        self.in_use = 0
+        self.last_used = time.monotonic()
+        self.last_check = time.monotonic()
+        self.healthy = True
+
+
+class ExchangePool:
+    """
+    Shared ccxt exchange instances, one per source.
+
+    One async ccxt instance serves concurrent requests over its own HTTP
+    session, so keeping it alive reuses warm connections and loaded markets.
+    Instances idle for longer than idle_timeout are closed. Markets are
+    reloaded every health_check_interval seconds, which also checks the
+    connection; an instance that fails the check or a request with a network
+    error is replaced.
+    """
+
+    def __init__(self, idle_timeout: float, health_check_interval: float):
+        """
+        Args:
+            idle_timeout: Seconds without use after which an instance is closed
+            health_check_interval: Seconds between health checks of an instance
+        """
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self._entries: Dict[str, PooledExchange] = {}
+        self._source_locks: Dict[str, asyncio.Lock] = {}
+
+    @asynccontextmanager
+    async def exchange(self, source: str) -> AsyncIterator[ccxt.Exchange]:
+        """
+        Borrow the exchange instance for a source.
+
+        Usage:
+            async with pool.exchange('binance') as exchange:
+                await exchange.fetch_ohlcv(...)
+
+        Args:
+            source: Exchange name (e.g., 'binance')
+
+        Yields:
+            CCXT exchange instance with loaded markets
+        """
+        entry = await self._acquire(source.lower())
+        try:
+            yield entry.exchange
+        except ccxt.NetworkError:
+            entry.healthy = False
+            raise
+        finally:
+            entry.in_use -= 1
+            entry.last_used = time.monotonic()
+            if not entry.healthy and entry.in_use == 0:
+                await self._discard(source.lower(), entry)
+
+    async def _acquire(self, source: str) -> PooledExchange:
+        lock = self._source_locks.setdefault(source, asyncio.Lock())
+        async with lock:
+            entry = self._entries.get(source)
+            if entry is not None and entry.healthy and time.monotonic() - entry.last_check > self.health_check_interval:
+                await self._health_check(source, entry)
+            if entry is None or not entry.healthy:
+                entry = await self._create(source)
+            entry.in_use += 1
+            return entry
+
+    async def _create(self, source: str) -> PooledExchange:
+        # Requests are throttled by the quotes server rate limiter,
+        # so the ccxt built-in throttling is disabled
+        exchange_class = getattr(ccxt, source)
+        exchange = exchange_class({'enableRateLimit': False})
+        try:
+            await exchange.load_markets()
+        except Exception:
+            await self._close(source, exchange)
+            raise
+        entry = PooledExchange(exchange)
+        self._entries[source] = entry
+        logger.info(f"Exchange {source} connected, {len(exchange.markets or {})} markets loaded")
+        return entry
+
+    async def _health_check(self, source: str, entry: PooledExchange) -> None:
+        entry.last_check = time.monotonic()
+        try:
+            await entry.exchange.load_markets(reload=True)
+        except Exception as e:
+            logger.warning(f"Health check of exchange {source} failed, reconnecting: {e}")
+            entry.healthy = False
+            if entry.in_use == 0:
+                await self._discard(source, entry)
+
+    async def _discard(self, source: str, entry: PooledExchange) -> None:
+        if self._entries.get(source) is entry:
+            del self._entries[source]
+        await self._close(source, entry.exchange)
+
+    @staticmethod
+    async def _close(source: str, exchange: ccxt.Exchange) -> None:
+        try:
+            await exchange.close()
+        except Exception as e:
+            logger.warning(f"Failed to close exchange {source}: {e}", exc_info=True)
+
+    async def evict_idle(self) -> None:
+        """Close instances that are not in use and idle for longer than idle_timeout."""
+        now = time.monotonic()
+        for source, entry in list(self._entries.items()):
+            if entry.in_use == 0 and now - entry.last_used > self.idle_timeout:
+                logger.info(f"Closing idle exchange {source}")
+                await self._discard(source, entry)
+
+    async def close_all(self) -> None:
+        """Close all instances."""
+        for source, entry in list(self._entries.items()):
+            await self._discard(source, entry)
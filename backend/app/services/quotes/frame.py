@@ -0,0 +1,131 @@
+"""
+Binary frame format of bar columns.
+
+A frame is one contiguous buffer: a header followed by column data.
+
+    header:  magic (4s) | version (H) | column count (H) | header size (I)
+    columns: name (16s) | dtype (8s) | offset (Q) | count (Q) | size (Q) | encoding (B), per column
+    data:    column data, each column starts at an offset aligned to ALIGNMENT bytes
+
+All numbers are little-endian, offsets are from the frame start. Raw columns
+(encoding 0) are written directly into the frame and read as numpy views of
+it, without copies. Encoded (compressed) columns are described in compression.py.
+"""
+from typing import Dict, List, Tuple, Optional, Union
+import struct
+import numpy as np
+from .compression import CODEC_NONE, encode_column, decode_column
+
+FRAME_MAGIC = b'R2QF'
+FRAME_VERSION = 2
+ALIGNMENT = 64
+
+_HEADER = struct.Struct('<4sHHI')
+_COLUMN = struct.Struct('<16s8sQQQB7x')
+
+Buffer = Union[bytes, bytearray, memoryview, np.ndarray]
+
+
+def _aligned(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _layout(bars: Dict[str, np.ndarray], codec: Optional[str] = None) -> Tuple[int, List[tuple], int]:
+    header_size = _HEADER.size + _COLUMN.size * len(bars)
+    columns = []
+    size = header_size
+    for name, column in bars.items():
+        encoding, payload = encode_column(column, codec) if codec and len(column) else (CODEC_NONE, None)
+        nbytes = len(payload) if payload is not None else column.nbytes
+        offset = _aligned(size)
+        columns.append((name, column, offset, nbytes, encoding, payload))
+        size = offset + nbytes
+    return header_size, columns, size
+
+
+def frame_size(bars: Dict[str, np.ndarray]) -> int:
+    """Return size of the frame of raw bar columns in bytes."""
+    return _layout(bars)[2]
+
+
+def write_frame(bars: Dict[str, np.ndarray], buffer: Optional[Buffer] = None, codec: Optional[str] = None) -> Buffer:
+    """
+    Write bar columns into a frame.
+
+    Args:
+        bars: dict of bar columns (1-D arrays)
+        buffer: Writable buffer of at least frame_size(bars) bytes (e.g. a memory map);
+            a new bytearray is allocated if None. With codec the size is known only
+            after encoding, so pass None.
+        codec: Codec name to compress columns with (see compression.py), None for raw columns
+
+    Returns:
+        The buffer with the frame
+    """
+    header_size, columns, size = _layout(bars, codec)
+    if buffer is None:
+        buffer = bytearray(size)
+    target = np.frombuffer(buffer, dtype=np.uint8, count=size)
+
+    header = bytearray(_HEADER.pack(FRAME_MAGIC, FRAME_VERSION, len(columns), header_size))
+    for name, column, offset, nbytes, encoding, payload in columns:
+        header += _COLUMN.pack(name.encode(), column.dtype.str.encode(), offset, len(column), nbytes, encoding)
+        if payload is not None:
+            target[offset:offset + nbytes] = np.frombuffer(payload, dtype=np.uint8)
+        elif len(column):
+            target[offset:offset + nbytes] = np.ascontiguousarray(column).view(np.uint8)
+    target[:header_size] = np.frombuffer(bytes(header), dtype=np.uint8)
+    return buffer
+
+
+def pack_frame(bars: Dict[str, np.ndarray], codec: Optional[str] = None) -> memoryview:
+    """
+    Write bar columns into a new frame for a Redis value.
+
+    redis-py 5.0 rejects bytearray but sends memoryview values as they are,
+    so the written buffer is returned as a memoryview instead of a copy.
+
+    Args:
+        bars: dict of bar columns (1-D arrays)
+        codec: Codec name to compress columns with (see compression.py), None for raw columns
+
+    Returns:
+        memoryview of the frame
+    """
+    return memoryview(write_frame(bars, codec=codec))
+
+
+def is_frame(data: Buffer) -> bool:
+    """Check whether data starts with a frame header."""
+    return len(data) >= _HEADER.size and bytes(data[:len(FRAME_MAGIC)]) == FRAME_MAGIC
+
+
+def read_frame(buffer: Buffer) -> Dict[str, np.ndarray]:
+    """
+    Read bar columns of a frame.
+
+    Args:
+        buffer: Buffer with the frame
+
+    Returns:
+        dict of bar columns; raw columns are numpy views of the buffer (read-only if the buffer is)
+
+    Raises:
+        ValueError: If buffer is not a frame of a supported version
+    """
+    if not is_frame(buffer):
+        raise ValueError("Not a quotes frame")
+    _, version, column_count, _ = _HEADER.unpack_from(buffer, 0)
+    if version != FRAME_VERSION:
+        raise ValueError(f"Unsupported quotes frame version: {version}")
+
+    bars = {}
+    for index in range(column_count):
+        name, dtype, offset, count, nbytes, encoding = _COLUMN.unpack_from(buffer, _HEADER.size + index * _COLUMN.size)
+        dtype = np.dtype(dtype.rstrip(b'\0').decode())
+        if encoding == CODEC_NONE:
+            column = np.frombuffer(buffer, dtype=dtype, count=count, offset=offset)
+        else:
+            column = decode_column(memoryview(buffer)[offset:offset + nbytes], encoding, dtype, count)
+        bars[name.rstrip(b'\0').decode()] = column
+    return bars
@@ -0,0 +1,120 @@
+"""
+Write-behind ingest of fetched bars for the quotes service.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, List, Tuple, Callable
+import asyncio
+import logging
+import numpy as np
+from .timeframe import Timeframe
+
+logger = logging.getLogger(__name__)
+
+IngestKey = Tuple[str, str, Timeframe]
+
+
+class IngestQueue:
+    """
+    Asynchronous queue of fetched pages which are saved in batches.
+
+    Fetchers put pages and continue fetching while a worker collects pages
+    into batches (up to batch_bars bars or flush_interval seconds) and saves
+    them from a dedicated thread, one insert per key. put() waits when
+    max_pending pages are queued (backpressure) and returns a future that is
+    resolved when the page is saved.
+    """
+
+    def __init__(
+        self,
+        save_func: Callable[[str, str, Timeframe, List[Dict[str, np.ndarray]]], None],
+        batch_bars: int,
+        flush_interval: float,
+        max_pending: int
+    ):
+        """
+        Args:
+            save_func: Blocking function saving pages of one key: save_func(source, symbol, timeframe, pages)
+            batch_bars: Flush when a batch reaches this number of bars
+            flush_interval: Flush a batch at most this many seconds after its first page
+            max_pending: Maximum number of queued pages
+        """
+        self._save_func = save_func
+        self.batch_bars = batch_bars
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_task: Optional[asyncio.Task] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='quotes-ingest')
+
+    async def put(self, source: str, symbol: str, timeframe: Timeframe, bars: Dict[str, np.ndarray]) -> asyncio.Future:
+        """
+        Queue a page of bars for saving.
+
+        Args:
+            source: Exchange name (e.g., 'binance')
+            symbol: Trading pair symbol (e.g., 'BTC/USDT')
+            timeframe: Timeframe object
+            bars: Sorted bar columns
+
+        Returns:
+            Future resolved when the page is saved (or failed to save)
+        """
+        if self._worker_task is None:
+            self._queue = asyncio.Queue(maxsize=self.max_pending)
+            self._worker_task = asyncio.create_task(self._worker())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(((source, symbol, timeframe), bars, future))
+        return future
+
+    async def close(self) -> None:
+        """Save queued pages and stop the worker."""
+        if self._worker_task is not None:
+            await self._queue.put(None)
+            await self._worker_task
+            self._worker_task = None
+        self._executor.shutdown(wait=True)
+
+    async def _worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            batch_bars = len(item[1]['time'])
+            deadline = loop.time() + self.flush_interval
+            while batch_bars < self.batch_bars:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+                batch_bars += len(item[1]['time'])
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[tuple]) -> None:
+        loop = asyncio.get_running_loop()
+        by_key: Dict[IngestKey, List[tuple]] = {}
+        for key, bars, future in batch:
+            by_key.setdefault(key, []).append((bars, future))
+
+        for key, items in by_key.items():
+            source, symbol, timeframe = key
+            try:
+                await loop.run_in_executor(self._executor, self._save_func, source, symbol, timeframe, [bars for bars, _ in items])
+            except Exception as e:
+                logger.error(f"Failed to save {len(items)} pages for {source}/{symbol}/{timeframe}: {e}")
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for _, future in items:
+                    if not future.done():
+                        future.set_result(None)
@@ -0,0 +1,69 @@
+"""
+Interval locks for the quotes service.
+"""
+from contextlib import asynccontextmanager
+from typing import Dict, Hashable, List, AsyncIterator
+import asyncio
+from .coverage import Interval
+
+
+class _HeldIntervals:
+    """Intervals held by one lock owner."""
+
+    def __init__(self, intervals: List[Interval]):
+        self.intervals = intervals
+        self.released = asyncio.Event()
+
+    def overlaps(self, intervals: List[Interval]) -> bool:
+        return any(
+            start <= held_end and held_start <= end
+            for start, end in intervals
+            for held_start, held_end in self.intervals
+        )
+
+
+class IntervalLockManager:
+    """
+    Locks on time intervals of a key.
+
+    Owners of overlapping intervals of the same key are serialized, owners of
+    disjoint intervals run concurrently. Bookkeeping of a key is removed as
+    soon as it has no owners, so idle keys don't take memory.
+
+    Usage:
+        async with locks.lock(('binance', 'BTC/USDT', Timeframe.t1h), gaps):
+            ...
+    """
+
+    def __init__(self):
+        self._held: Dict[Hashable, List[_HeldIntervals]] = {}
+
+    @asynccontextmanager
+    async def lock(self, key: Hashable, intervals: List[Interval]) -> AsyncIterator[None]:
+        """
+        Hold intervals of a key, waiting while they overlap intervals held by others.
+
+        Args:
+            key: Lock key (e.g., (source, symbol, timeframe))
+            intervals: List of (start, end) tuples, both bounds inclusive
+        """
+        while True:
+            conflicts = [held for held in self._held.get(key, []) if held.overlaps(intervals)]
+            if not conflicts:
+                break
+            await asyncio.gather(*(held.released.wait() for held in conflicts))
+
+        entry = _HeldIntervals(intervals)
+        self._held.setdefault(key, []).append(entry)
+        try:
+            yield
+        finally:
+            holders = self._held[key]
+            holders.remove(entry)
+            if not holders:
+                del self._held[key]
+            entry.released.set()
+
+    def __len__(self) -> int:
+        """Return number of keys with held intervals."""
+        return len(self._held)
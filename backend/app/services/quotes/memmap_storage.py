@@ -0,0 +1,323 @@
+"""
+Local storage of the quotes service in memory-mapped column files.
+
+For single-node deployments and CI: no database server, reads are file maps.
+Files of a key (source, symbol, timeframe) are kept in a directory:
+
+    {root}/{source}/{symbol}/{timeframe}/      (names are URL-quoted)
+        {YYYY-MM}/                            segment of bars of a month
+            v{generation}/{column}.bin        sorted unique bars: time as int64 ms,
+                                              prices and volume as float64
+            log.bin                           appended bar records not merged yet
+        coverage.bin                          stored intervals (int64 ms pairs)
+        unavailable.bin                       ranges without bars (UNAVAILABLE_DTYPE)
+        lock
+
+Writes append to the log of a segment; when the log reaches compact_rows
+bars, it is merged into a new generation of column files, which replaces the
+old one. Reads map the column files (np.memmap), so bars of a month without
+pending log records are returned as views of the files, without copying.
+Readers and writers of a key are serialized by flock on the lock file, also
+between processes (e.g. the service and a backfill job).
+"""
+from contextlib import contextmanager
+from datetime import datetime, UTC
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+from urllib.parse import quote
+import fcntl
+import logging
+import os
+import re
+import shutil
+import numpy as np
+from .bars import PRICE_COLUMNS, to_datetime64
+from .constants import TIME_TYPE
+from .coverage import Interval, intervals_from_times, merge_intervals
+from .storage import QuotesStorage
+from .timeframe import Timeframe
+from app.core.config import QUOTES_STORAGE_COMPACT_ROWS
+
+logger = logging.getLogger(__name__)
+
+LOG_DTYPE = np.dtype([('time', '<i8')] + [(name, '<f8') for name in PRICE_COLUMNS])
+UNAVAILABLE_DTYPE = np.dtype([('start', '<i8'), ('end', '<i8'), ('checked_at', '<i8'), ('recheck_interval', '<u4')])
+COLUMN_DTYPES = {name: LOG_DTYPE[name] for name in LOG_DTYPE.names}
+
+_GENERATION = re.compile(r'v(\d+)')
+_TIME_MIN = np.iinfo(np.int64).min
+_TIME_MAX = np.iinfo(np.int64).max
+# Months of segment names (YYYY-MM) compared as strings
+_MONTH_MIN = np.datetime64('0001-01', 'M')
+_MONTH_MAX = np.datetime64('9999-12', 'M')
+
+
+def _to_ms(value: Union[datetime, np.datetime64]) -> int:
+    if isinstance(value, datetime):
+        value = to_datetime64(value)
+    return int(value.astype('datetime64[ms]').astype(np.int64))
+
+
+def _month_name(time_ms: int) -> str:
+    """Return segment name (YYYY-MM) of a time, clamped to four-digit years."""
+    if time_ms == _TIME_MIN:
+        # Is NaT as datetime64
+        return str(_MONTH_MIN)
+    month = np.datetime64(time_ms, 'ms').astype('datetime64[M]')
+    return str(min(max(month, _MONTH_MIN), _MONTH_MAX))
+
+
+def _map(path: Path, dtype: np.dtype) -> np.ndarray:
+    """Map a column file read-only; a missing or empty file is an empty column."""
+    try:
+        size = path.stat().st_size
+    except FileNotFoundError:
+        size = 0
+    if size < dtype.itemsize:
+        return np.empty(0, dtype=dtype)
+    return np.asarray(np.memmap(path, dtype=dtype, mode='r', shape=(size // dtype.itemsize,)))
+
+
+def _read_records(path: Path, dtype: np.dtype) -> np.ndarray:
+    """Read whole records of a file, a partly written last record is ignored."""
+    try:
+        data = path.read_bytes()
+    except FileNotFoundError:
+        return np.empty(0, dtype=dtype)
+    return np.frombuffer(data, dtype=dtype, count=len(data) // dtype.itemsize)
+
+
+def _write_file(path: Path, data: bytes) -> None:
+    """Replace a file atomically."""
+    tmp_path = path.with_name(path.name + '.tmp')
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+
+def merge_rows(parts: Sequence[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    """
+    Merge bar columns of several parts by time.
+
+    Args:
+        parts: Bar columns with the same columns and time as int64 ms; of bars with
+               the same time the bar of the latest part (or latest in a part) is kept
+
+    Returns:
+        Sorted bar columns with unique times
+    """
+    names = list(parts[0])
+    parts = [part for part in parts if len(part['time'])]
+    if not parts:
+        return {name: np.empty(0, dtype=COLUMN_DTYPES[name]) for name in names}
+    if len(parts) == 1 and np.all(np.diff(parts[0]['time']) > 0):
+        return parts[0]
+    merged = {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+    order = np.argsort(merged['time'], kind='stable')
+    times = merged['time'][order]
+    # Keep the last of equal times
+    keep = order[np.append(times[1:] != times[:-1], True)]
+    return {name: column[keep] for name, column in merged.items()}
+
+
+class MemmapStorage(QuotesStorage):
+    """Storage of bars and stored ranges in local memory-mapped column files."""
+
+    def __init__(self, path: Union[str, Path], compact_rows: int = QUOTES_STORAGE_COMPACT_ROWS):
+        """
+        Args:
+            path: Root directory of files
+            compact_rows: Number of log records of a segment that triggers its compaction
+        """
+        self.root = Path(path)
+        self.compact_rows = compact_rows
+
+    def init(self) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        logger.info(f"Quotes storage in files: {self.root}")
+
+    def key_dir(self, source: str, symbol: str, timeframe: Timeframe) -> Path:
+        """Return directory of files of a key."""
+        return self.root / quote(source, safe='') / quote(symbol, safe='') / str(timeframe)
+
+    @contextmanager
+    def _locked(self, key_dir: Path, exclusive: bool) -> Iterator[bool]:
+        """
+        Lock files of a key, yield whether the key has files.
+
+        The exclusive (write) lock creates the directory of the key. The shared
+        (read) lock does not, so reads of unknown keys leave no files; it yields
+        False without locking when the key has not been written.
+        """
+        if exclusive:
+            key_dir.mkdir(parents=True, exist_ok=True)
+        try:
+            lock_file = open(key_dir / 'lock', 'a' if exclusive else 'r')
+        except FileNotFoundError:
+            yield False
+            return
+        with lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _empty_bars(columns: Sequence[str]) -> Dict[str, np.ndarray]:
+        return {name: np.empty(0, dtype=COLUMN_DTYPES[name]) for name in ('time', *columns)}
+
+    @staticmethod
+    def _generation(segment: Path) -> Tuple[int, Optional[Path]]:
+        """Return the current generation of column files of a segment and its directory."""
+        generations = [
+            (int(match.group(1)), child)
+            for child in segment.iterdir()
+            if (match := _GENERATION.fullmatch(child.name)) and child.is_dir()
+        ]
+        return max(generations, default=(0, None))
+
+    def _read_segment(self, segment: Path, start_ms: int, end_ms: int, columns: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Read bars of a segment in [start_ms, end_ms] with time as int64 ms."""
+        _, columns_dir = self._generation(segment)
+        bars = {}
+        if columns_dir is not None:
+            times = _map(columns_dir / 'time.bin', COLUMN_DTYPES['time'])
+            first = int(np.searchsorted(times, start_ms, side='left'))
+            last = int(np.searchsorted(times, end_ms, side='right'))
+            bars['time'] = times[first:last]
+            for name in columns:
+                bars[name] = _map(columns_dir / f'{name}.bin', COLUMN_DTYPES[name])[first:last]
+        else:
+            bars = self._empty_bars(columns)
+
+        log = _read_records(segment / 'log.bin', LOG_DTYPE)
+        if len(log):
+            log = log[(log['time'] >= start_ms) & (log['time'] <= end_ms)]
+        if len(log):
+            bars = merge_rows([bars, {name: log[name] for name in bars}])
+        return bars
+
+    def _read(self, key_dir: Path, start_ms: int, end_ms: int, columns: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Read bars of a key in [start_ms, end_ms] with time as int64 ms."""
+        first_month, last_month = _month_name(start_ms), _month_name(end_ms)
+        parts = []
+        for segment in sorted(key_dir.iterdir()):
+            if segment.is_dir() and first_month <= segment.name <= last_month:
+                part = self._read_segment(segment, start_ms, end_ms, columns)
+                if len(part['time']):
+                    parts.append(part)
+        if not parts:
+            return self._empty_bars(columns)
+        if len(parts) == 1:
+            return parts[0]
+        return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+
+    def read_bars(self, source: str, symbol: str, timeframe: Timeframe, date_start: datetime, date_end: datetime, columns: Optional[Sequence[str]] = None) -> Dict[str, np.ndarray]:
+        price_columns = PRICE_COLUMNS if columns is None else [name for name in PRICE_COLUMNS if name in columns]
+        key_dir = self.key_dir(source, symbol, timeframe)
+        with self._locked(key_dir, exclusive=False) as exists:
+            bars = self._read(key_dir, _to_ms(date_start), _to_ms(date_end), price_columns) if exists else self._empty_bars(price_columns)
+        bars['time'] = bars['time'].view(TIME_TYPE)
+        return bars
+
+    def write_bars(self, source: str, symbol: str, timeframe: Timeframe, bars: Dict[str, np.ndarray]) -> None:
+        """Append bars to the logs of their months, compacting logs that reached compact_rows."""
+        count = len(bars['time'])
+        if not count:
+            return
+        records = np.empty(count, dtype=LOG_DTYPE)
+        records['time'] = bars['time'].astype('datetime64[ms]').astype(np.int64)
+        for name in PRICE_COLUMNS:
+            records[name] = bars[name]
+        months = bars['time'].astype('datetime64[M]')
+        bounds = np.flatnonzero(np.append(True, months[1:] != months[:-1]))
+
+        key_dir = self.key_dir(source, symbol, timeframe)
+        with self._locked(key_dir, exclusive=True):
+            for first, last in zip(bounds, np.append(bounds[1:], count)):
+                segment = key_dir / str(months[first])
+                segment.mkdir(exist_ok=True)
+                log_path = segment / 'log.bin'
+                with open(log_path, 'ab') as log_file:
+                    log_file.write(records[first:last].tobytes())
+                if log_path.stat().st_size // LOG_DTYPE.itemsize >= self.compact_rows:
+                    self._compact(segment)
+
+    def _compact(self, segment: Path) -> None:
+        """Merge the log of a segment into a new generation of column files (under the exclusive lock)."""
+        generation, columns_dir = self._generation(segment)
+        bars = self._read_segment(segment, _TIME_MIN, _TIME_MAX, PRICE_COLUMNS)
+        new_dir = segment / f'v{generation + 1}'
+        tmp_dir = segment / f'v{generation + 1}.tmp'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir()
+        for name, column in bars.items():
+            np.ascontiguousarray(column, dtype=COLUMN_DTYPES[name]).tofile(tmp_dir / f'{name}.bin')
+        os.rename(tmp_dir, new_dir)
+        # Records of the log are in the new generation now; if the process stops
+        # before the log is cleared, they are merged again with the same result
+        open(segment / 'log.bin', 'wb').close()
+        if columns_dir is not None:
+            # Maps of the old files stay valid for readers that hold them
+            shutil.rmtree(columns_dir, ignore_errors=True)
+        logger.debug(f"Compacted {segment}: {len(bars['time'])} bars")
+
+    def compact(self, source: str, symbol: str, timeframe: Timeframe) -> None:
+        """Merge the logs of all segments of a key into their column files."""
+        key_dir = self.key_dir(source, symbol, timeframe)
+        if not key_dir.is_dir():
+            return
+        with self._locked(key_dir, exclusive=True):
+            for segment in sorted(key_dir.iterdir()):
+                if segment.is_dir() and (segment / 'log.bin').is_file() and (segment / 'log.bin').stat().st_size:
+                    self._compact(segment)
+
+    def stored_intervals(self, source: str, symbol: str, timeframe: Timeframe) -> List[Interval]:
+        key_dir = self.key_dir(source, symbol, timeframe)
+        with self._locked(key_dir, exclusive=False) as exists:
+            if not exists:
+                return []
+            times = self._read(key_dir, _TIME_MIN, _TIME_MAX, ())['time']
+        return intervals_from_times(times.view(TIME_TYPE), timeframe.timedelta64())
+
+    def get_coverage(self, source: str, symbol: str, timeframe: Timeframe, date_start: np.datetime64, date_end: np.datetime64, include_unavailable: bool = False) -> List[Interval]:
+        step_ms = _to_ms(np.datetime64(0, 'ms') + timeframe.timedelta64())
+        start_ms, end_ms = _to_ms(date_start) - step_ms, _to_ms(date_end) + step_ms
+        key_dir = self.key_dir(source, symbol, timeframe)
+        with self._locked(key_dir, exclusive=False) as exists:
+            if not exists:
+                return []
+            coverage = _read_records(key_dir / 'coverage.bin', np.dtype('<i8')).reshape(-1, 2)
+            unavailable = _read_records(key_dir / 'unavailable.bin', UNAVAILABLE_DTYPE) if include_unavailable else None
+        rows = [(int(row[0]), int(row[1])) for row in coverage if row[1] >= start_ms and row[0] <= end_ms]
+        if unavailable is not None and len(unavailable):
+            now_ms = _to_ms(datetime.now(UTC))
+            active = (unavailable['recheck_interval'] == 0) | (unavailable['checked_at'] + unavailable['recheck_interval'].astype(np.int64) * 1000 > now_ms)
+            rows += [
+                (int(row['start']), int(row['end']))
+                for row in unavailable[active]
+                if row['end'] >= start_ms and row['start'] <= end_ms
+            ]
+        return [(np.datetime64(start, 'ms'), np.datetime64(end, 'ms')) for start, end in rows]
+
+    def add_coverage(self, source: str, symbol: str, timeframe: Timeframe, time_start: np.datetime64, time_end: np.datetime64) -> None:
+        key_dir = self.key_dir(source, symbol, timeframe)
+        with self._locked(key_dir, exclusive=True):
+            coverage = _read_records(key_dir / 'coverage.bin', np.dtype('<i8')).reshape(-1, 2)
+            intervals = [(np.datetime64(int(start), 'ms'), np.datetime64(int(end), 'ms')) for start, end in coverage]
+            intervals = merge_intervals(intervals + [(time_start.astype(TIME_TYPE), time_end.astype(TIME_TYPE))], timeframe.timedelta64())
+            data = np.array([[_to_ms(start), _to_ms(end)] for start, end in intervals], dtype='<i8')
+            _write_file(key_dir / 'coverage.bin', data.tobytes())
+
+    def add_unavailable(self, source: str, symbol: str, timeframe: Timeframe, ranges: Sequence[Tuple[np.datetime64, np.datetime64, int]], checked_at: np.datetime64) -> None:
+        key_dir = self.key_dir(source, symbol, timeframe)
+        with self._locked(key_dir, exclusive=True):
+            records = _read_records(key_dir / 'unavailable.bin', UNAVAILABLE_DTYPE)
+            added = np.array(
+                [(_to_ms(start), _to_ms(end), _to_ms(checked_at), recheck_interval) for start, end, recheck_interval in ranges],
+                dtype=UNAVAILABLE_DTYPE
+            )
+            # A range replaces a recorded range with the same start
+            records = np.concatenate((records[~np.isin(records['start'], added['start'])], added))
+            records = records[np.argsort(records['start'], kind='stable')]
+            _write_file(key_dir / 'unavailable.bin', records.tobytes())
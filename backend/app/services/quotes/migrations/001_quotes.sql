@@ -1,4 +1,4 @@
--- CCXT2ClickHouse database schema
+-- CCXT2ClickHouse database schema, version 1: bars table
 
 CREATE TABLE IF NOT EXISTS quotes
 (
@@ -24,5 +24,3 @@ CREATE TABLE IF NOT EXISTS db_quotes_version
 ENGINE = ReplacingMergeTree()
 ORDER BY version
 SETTINGS index_granularity = 8192;
-
-INSERT INTO db_quotes_version (version) VALUES (1);
\ No newline at end of file
@@ -0,0 +1,27 @@
+-- Version 2: coverage of stored and unavailable ranges
+
+CREATE TABLE IF NOT EXISTS quotes_coverage
+(
+    source LowCardinality(String) COMMENT 'Exchange name (binance, bybit, etc.)',
+    symbol LowCardinality(String) COMMENT 'Trading pair symbol (BTC/USDT, ETH/USDT, etc.)',
+    timeframe LowCardinality(String) COMMENT 'Timeframe: 1s, 1m, 5m, 1h, 1d, 1w, etc.',
+    time_start DateTime64(3, 'UTC') COMMENT 'First bar of contiguous stored interval',
+    time_end DateTime64(3, 'UTC') COMMENT 'Last bar of contiguous stored interval'
+)
+ENGINE = ReplacingMergeTree(time_end)
+ORDER BY (source, symbol, timeframe, time_start)
+SETTINGS index_granularity = 8192;
+
+CREATE TABLE IF NOT EXISTS quotes_unavailable
+(
+    source LowCardinality(String) COMMENT 'Exchange name (binance, bybit, etc.)',
+    symbol LowCardinality(String) COMMENT 'Trading pair symbol (BTC/USDT, ETH/USDT, etc.)',
+    timeframe LowCardinality(String) COMMENT 'Timeframe: 1s, 1m, 5m, 1h, 1d, 1w, etc.',
+    time_start DateTime64(3, 'UTC') COMMENT 'First bar of range the exchange returned no bars for',
+    time_end DateTime64(3, 'UTC') COMMENT 'Last bar of range the exchange returned no bars for',
+    checked_at DateTime64(3, 'UTC') COMMENT 'Time of the fetch that found the range empty',
+    recheck_interval UInt32 COMMENT 'Seconds after checked_at to fetch the range again, 0 = never'
+)
+ENGINE = ReplacingMergeTree(checked_at)
+ORDER BY (source, symbol, timeframe, time_start)
+SETTINGS index_granularity = 8192;
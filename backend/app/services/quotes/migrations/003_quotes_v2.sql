@@ -0,0 +1,38 @@
+-- Version 3: bars table v2
+--
+-- Column codecs: time is a regular sequence, DoubleDelta stores it in a few
+-- bits per bar; Gorilla suits prices changing slowly from bar to bar.
+-- ReplacingMergeTree keeps one row per bar (the last inserted), so refetched
+-- bars replace stored ones; reads use FINAL. Yearly partitions keep the number
+-- of parts read by a per-symbol scan small, the bars of a symbol are contiguous
+-- inside a partition by the sorting key.
+--
+-- Bars are copied to the new table, which is then exchanged with the old one.
+-- The migration can be rerun if it is interrupted.
+
+DROP TABLE IF EXISTS quotes_v2;
+
+CREATE TABLE quotes_v2
+(
+    source LowCardinality(String) COMMENT 'Exchange name (binance, bybit, etc.)',
+    symbol LowCardinality(String) COMMENT 'Trading pair symbol (BTC/USDT, ETH/USDT, etc.)',
+    timeframe LowCardinality(String) COMMENT 'Timeframe: 1s, 1m, 5m, 1h, 1d, 1w, etc.',
+    time DateTime64(3, 'UTC') CODEC(DoubleDelta, ZSTD(1)) COMMENT 'Timestamp in milliseconds precision',
+    open Float64 CODEC(Gorilla, ZSTD(1)) COMMENT 'Opening price',
+    high Float64 CODEC(Gorilla, ZSTD(1)) COMMENT 'Highest price',
+    low Float64 CODEC(Gorilla, ZSTD(1)) COMMENT 'Lowest price',
+    close Float64 CODEC(Gorilla, ZSTD(1)) COMMENT 'Closing price',
+    volume Float64 CODEC(ZSTD(1)) COMMENT 'Trading volume'
+)
+ENGINE = ReplacingMergeTree()
+PARTITION BY toYear(time)
+ORDER BY (source, symbol, timeframe, time)
+SETTINGS index_granularity = 8192;
+
+INSERT INTO quotes_v2 (source, symbol, timeframe, time, open, high, low, close, volume)
+SELECT source, symbol, timeframe, time, open, high, low, close, volume
+FROM quotes;
+
+EXCHANGE TABLES quotes AND quotes_v2;
+
+DROP TABLE quotes_v2;
@@ -0,0 +1,6 @@
+-- Version 4: drop coverage rows accumulated before subsumed rows were compacted
+-- (see ClickHouseStorage.compact_coverage). Coverage of each key is rebuilt from
+-- stored bars on first access (see ClickHouseStorage.ensure_coverage), one row
+-- per contiguous interval.
+
+TRUNCATE TABLE IF EXISTS quotes_coverage;
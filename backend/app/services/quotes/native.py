@@ -0,0 +1,154 @@
+"""
+Reader and writer of ClickHouse Native format blocks with fixed-width columns.
+
+Native format is columnar: a result is a sequence of blocks, each block holds
+every column as one contiguous little-endian array:
+
+    block:  column count (varint) | row count (varint) | columns
+    column: name (string) | type (string) | row count values
+    string: length (varint) | bytes
+
+Columns of a single-block result are returned as numpy views of the response
+bytes; columns of several blocks are concatenated once. Inserted columns are
+written from the bytes of their arrays, key columns of a block are constants.
+"""
+from typing import Dict, List, Sequence, Tuple, Union
+import re
+import struct
+import numpy as np
+
+# Fixed-width ClickHouse types and their numpy dtypes
+NATIVE_DTYPES = {
+    'Float64': np.dtype('<f8'),
+    'Float32': np.dtype('<f4'),
+    'Int64': np.dtype('<i8'),
+    'UInt64': np.dtype('<u8'),
+    'Int32': np.dtype('<i4'),
+    'UInt32': np.dtype('<u4'),
+    'UInt8': np.dtype('u1'),
+    'DateTime': np.dtype('<u4'),
+}
+
+_DATETIME64 = re.compile(r"DateTime64\((\d)(?:,\s*'[^']*')?\)")
+_DATETIME64_UNITS = {0: 's', 3: 'ms', 6: 'us', 9: 'ns'}
+
+# LowCardinality column: serialization version, then index type UInt8 with a
+# new dictionary (bit 9) and additional keys (bit 10)
+_LOW_CARDINALITY_VERSION = 1
+_LOW_CARDINALITY_FLAGS = (1 << 9) | (1 << 10)
+
+
+def native_dtype(type_name: str) -> np.dtype:
+    """
+    Return numpy dtype of values of a ClickHouse type.
+
+    Raises:
+        ValueError: If the type is not a supported fixed-width type
+    """
+    if type_name in NATIVE_DTYPES:
+        return NATIVE_DTYPES[type_name]
+    match = _DATETIME64.fullmatch(type_name)
+    if match and int(match.group(1)) in _DATETIME64_UNITS:
+        return np.dtype(f"<M8[{_DATETIME64_UNITS[int(match.group(1))]}]")
+    raise ValueError(f"Unsupported ClickHouse type in Native result: {type_name}")
+
+
+def _read_varint(data: memoryview, offset: int) -> Tuple[int, int]:
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def _read_string(data: memoryview, offset: int) -> Tuple[str, int]:
+    size, offset = _read_varint(data, offset)
+    return bytes(data[offset:offset + size]).decode(), offset + size
+
+
+def _write_varint(value: int, dest: bytearray) -> None:
+    while value >= 0x80:
+        dest.append(value & 0x7F | 0x80)
+        value >>= 7
+    dest.append(value)
+
+
+def _write_string(value: str, dest: bytearray) -> None:
+    encoded = value.encode()
+    _write_varint(len(encoded), dest)
+    dest += encoded
+
+
+def write_native(columns: Sequence[Tuple[str, str, Union[np.ndarray, str]]], row_count: int) -> bytearray:
+    """
+    Write columns as one Native format block.
+
+    A string value is a LowCardinality(String) column with the value in every
+    row: a dictionary of one value and a zero UInt8 index per row.
+
+    Args:
+        columns: (name, ClickHouse type, array or constant string) of each column
+        row_count: Number of rows
+
+    Returns:
+        Block (e.g. for client.raw_insert(table, column_names, block, fmt='Native'))
+
+    Raises:
+        ValueError: If a column type is not supported or an array is not row_count long
+    """
+    block = bytearray()
+    _write_varint(len(columns), block)
+    _write_varint(row_count, block)
+    for name, type_name, values in columns:
+        _write_string(name, block)
+        _write_string(type_name, block)
+        if isinstance(values, str):
+            if type_name != 'LowCardinality(String)':
+                raise ValueError(f"Constant column {name} must be LowCardinality(String), not {type_name}")
+            block += struct.pack('<Q', _LOW_CARDINALITY_VERSION)
+            if row_count:
+                block += struct.pack('<QQ', _LOW_CARDINALITY_FLAGS, 1)
+                _write_string(values, block)
+                block += struct.pack('<Q', row_count)
+                block += bytes(row_count)
+        else:
+            if len(values) != row_count:
+                raise ValueError(f"Column {name} has {len(values)} rows instead of {row_count}")
+            array = np.ascontiguousarray(values, dtype=native_dtype(type_name))
+            block += memoryview(array.view(np.uint8))
+    return block
+
+
+def read_native(data: bytes) -> Dict[str, np.ndarray]:
+    """
+    Read columns of a Native format result.
+
+    Args:
+        data: Result bytes (e.g. client.raw_query(query, fmt='Native'))
+
+    Returns:
+        dict of columns by name in result order; empty if the result has no blocks
+
+    Raises:
+        ValueError: If a column type is not supported
+    """
+    view = memoryview(data)
+    blocks: Dict[str, List[np.ndarray]] = {}
+    offset = 0
+    while offset < len(view):
+        column_count, offset = _read_varint(view, offset)
+        row_count, offset = _read_varint(view, offset)
+        for _ in range(column_count):
+            name, offset = _read_string(view, offset)
+            type_name, offset = _read_string(view, offset)
+            dtype = native_dtype(type_name)
+            blocks.setdefault(name, []).append(np.frombuffer(data, dtype=dtype, count=row_count, offset=offset))
+            offset += dtype.itemsize * row_count
+    return {
+        name: parts[0] if len(parts) == 1 else np.concatenate(parts)
+        for name, parts in blocks.items()
+    }
@@ -0,0 +1,143 @@
+"""
+Rate limiting of exchange requests for the quotes service.
+
+Request rate of an exchange is limited by a token bucket kept in Redis
+(SharedTokenBucket), so all worker and backfill processes share one budget
+per exchange; the number of requests in flight is limited per process.
+"""
+import asyncio
+import math
+import time
+from typing import Optional
+
+# Prefix of Redis keys of shared token buckets
+RATE_LIMIT_PREFIX = 'quotes:ratelimit'
+
+# Takes a token from the bucket in KEYS[1] and returns the time to wait for it
+# in seconds. The token is reserved even if the bucket is empty (tokens go
+# negative), so waiters of all processes are served in order of their calls.
+# ARGV: rate (tokens per second), capacity, key TTL in seconds.
+# Writes after TIME need effects replication of scripts, the default since Redis 5.
+_TAKE_TOKEN_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate) - 1
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[3]))
+if tokens >= 0 then
+    return '0'
+end
+return tostring(-tokens / rate)
+"""
+
+
+class TokenBucket:
+    """
+    Asynchronous token bucket.
+
+    Tokens are added at a constant rate up to capacity. Each acquire takes
+    one token, waiting until it is available. Waiters are served in order.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        """
+        Args:
+            rate: Tokens added per second
+            capacity: Maximum number of tokens (burst size)
+        """
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        """Take one token, waiting if the bucket is empty."""
+        async with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+
+class SharedTokenBucket:
+    """
+    Token bucket kept in Redis, shared by all processes using the same key.
+
+    Same interface as TokenBucket; the clock is the Redis server time.
+    """
+
+    def __init__(self, redis_client, key: str, rate: float, capacity: float):
+        """
+        Args:
+            redis_client: Asynchronous Redis client
+            key: Redis key of the bucket
+            rate: Tokens added per second
+            capacity: Maximum number of tokens (burst size)
+        """
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.key = key
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        # A bucket is full again after capacity / rate seconds, then its key is not needed
+        self.ttl = math.ceil(self.capacity / rate) + 60
+        self._script = redis_client.register_script(_TAKE_TOKEN_SCRIPT)
+
+    async def acquire(self) -> None:
+        """Take one token, waiting if the bucket is empty."""
+        wait = float(await self._script(keys=[self.key], args=[self.rate, self.capacity, self.ttl]))
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class ExchangeRateLimiter:
+    """
+    Per-exchange limiter: caps both request rate and number of requests in flight.
+
+    Usage:
+        async with limiter:
+            await exchange.fetch_ohlcv(...)
+    """
+
+    def __init__(self, rate_limit_ms: float, burst: int, max_concurrency: int, redis_client=None, key: Optional[str] = None):
+        """
+        Args:
+            rate_limit_ms: Minimum average interval between requests in milliseconds (ccxt rateLimit)
+            burst: Number of requests that can be sent without waiting
+            max_concurrency: Maximum number of requests in flight
+            redis_client: Asynchronous Redis client; if given, the request rate is
+                shared with other processes through a SharedTokenBucket
+            key: Redis key of the shared bucket (e.g. quotes:ratelimit:binance)
+        """
+        rate = 1000.0 / rate_limit_ms if rate_limit_ms > 0 else float(max_concurrency) * 1000.0
+        if redis_client is not None:
+            self.bucket = SharedTokenBucket(redis_client, key, rate=rate, capacity=burst)
+        else:
+            self.bucket = TokenBucket(rate=rate, capacity=burst)
+        self.semaphore = asyncio.Semaphore(max(max_concurrency, 1))
+
+    async def __aenter__(self):
+        await self.semaphore.acquire()
+        try:
+            await self.bucket.acquire()
+        except BaseException:
+            self.semaphore.release()
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.semaphore.release()
@@ -0,0 +1,83 @@
+"""
+Higher timeframe bars derived from bars of a lower stored timeframe.
+
+A derived timeframe is not fetched from the exchange: its gaps are filled by
+resampling bars of its base timeframe, which are fetched (or derived) as
+usual. This saves exchange requests and makes timeframes the exchange doesn't
+offer (e.g. 10m) available. The policy is configured by
+QUOTES_DERIVED_TIMEFRAMES as comma-separated "timeframe:base" pairs:
+
+    QUOTES_DERIVED_TIMEFRAMES=10m:5m,4h:1h,1w:1d
+"""
+from typing import Dict
+import numpy as np
+from .bars import PRICE_COLUMNS
+from .constants import TIME_TYPE
+from .exceptions import R2D2QuotesException
+from .timeframe import Timeframe
+
+
+def parse_derived_timeframes(value: str) -> Dict[Timeframe, Timeframe]:
+    """
+    Parse the derived timeframes policy.
+
+    Args:
+        value: Comma-separated "timeframe:base" pairs (e.g. '10m:5m,1w:1d')
+
+    Returns:
+        dict of base timeframes by derived timeframe
+
+    Raises:
+        R2D2QuotesException: If a pair is malformed or its base doesn't divide the timeframe
+    """
+    derived = {}
+    for pair in value.split(','):
+        pair = pair.strip()
+        if not pair:
+            continue
+        try:
+            timeframe_str, base_str = pair.split(':')
+            timeframe = Timeframe.cast(timeframe_str.strip())
+            base = Timeframe.cast(base_str.strip())
+        except Exception as e:
+            raise R2D2QuotesException(f"Invalid derived timeframe '{pair}', expected 'timeframe:base'") from e
+        if base >= timeframe or timeframe % base:
+            raise R2D2QuotesException(f"Timeframe {timeframe} can't be derived from {base}")
+        derived[timeframe] = base
+    return derived
+
+
+def resample_bars(bars: Dict[str, np.ndarray], timeframe: Timeframe) -> Dict[str, np.ndarray]:
+    """
+    Aggregate sorted bars of a lower timeframe into bars of timeframe.
+
+    Every period of timeframe with at least one bar gives a bar: open of its
+    first bar, high and low over its bars, close of its last bar and the sum of
+    volumes. Only columns present in bars are aggregated.
+
+    Args:
+        bars: Sorted bar columns of a timeframe dividing timeframe
+        timeframe: Target timeframe
+
+    Returns:
+        Bar columns of timeframe
+    """
+    times = bars['time']
+    if len(times) == 0:
+        return {name: column[:0] for name, column in bars.items()}
+    periods = timeframe.begin_of_tf(times)
+    # Index of the first bar of each period
+    starts = np.flatnonzero(np.concatenate(([True], periods[1:] != periods[:-1])))
+    ends = np.append(starts[1:], len(times)) - 1
+    result = {'time': periods[starts].astype(TIME_TYPE, copy=False)}
+    aggregations = {
+        'open': lambda column: column[starts],
+        'high': lambda column: np.maximum.reduceat(column, starts),
+        'low': lambda column: np.minimum.reduceat(column, starts),
+        'close': lambda column: column[ends],
+        'volume': lambda column: np.add.reduceat(column, starts),
+    }
+    for name in PRICE_COLUMNS:
+        if name in bars:
+            result[name] = aggregations[name](bars[name])
+    return result
@@ -0,0 +1,139 @@
+"""
+Shared cache of quote responses in Redis.
+
+Responses of closed historical ranges are stored as frames (see frame.py) by
+the quotes service, and clients read them directly, without a request to the
+service. Keys are built from ranges snapped to bar times, so requests for the
+same bars share an entry:
+
+    quotes:{source}:{symbol}:{timeframe}:{first bar}:{last bar}
+
+Entries expire after a TTL. The total size is limited: the service tracks
+entries in an index (sorted set by insertion time, sizes in a hash and a
+byte counter) and evicts the oldest entries when the cap is reached. The
+accounting is approximate when several service processes add entries at the
+same time.
+"""
+from datetime import datetime, UTC
+from typing import Iterable, Optional, Tuple
+import logging
+import time
+import numpy as np
+from .bars import to_datetime64
+from .constants import TIME_TYPE_UNIT
+from .timeframe import Timeframe
+
+logger = logging.getLogger(__name__)
+
+CACHE_INDEX = 'quotes:cache:index'
+CACHE_SIZES = 'quotes:cache:sizes'
+CACHE_BYTES = 'quotes:cache:bytes'
+
+# Number of oldest entries evicted at once when the cache is full
+EVICT_BATCH = 16
+
+
+def cache_range(timeframe: Timeframe, history_start: datetime, history_end: Optional[datetime]) -> Optional[Tuple[np.datetime64, np.datetime64]]:
+    """
+    Snap a requested range to its first and last bar, if the range is cacheable.
+
+    Only closed historical ranges are cacheable: the last bar must be older than
+    the last closed bar, so that bars published with a delay are not missed.
+
+    Args:
+        timeframe: Timeframe object
+        history_start: Start of the requested range
+        history_end: End of the requested range (None for open-ended requests)
+
+    Returns:
+        Tuple (first bar time, last bar time) or None if the range is not cacheable
+    """
+    if history_end is None:
+        return None
+    step = timeframe.timedelta64()
+    # First bar at or after the start, last bar at or before the end
+    first_bar = timeframe.begin_of_tf(to_datetime64(history_start) - np.timedelta64(1, TIME_TYPE_UNIT)) + step
+    last_bar = timeframe.begin_of_tf(to_datetime64(history_end))
+    last_closed_bar = timeframe.begin_of_tf(to_datetime64(datetime.now(UTC))) - step
+    if last_bar < first_bar or last_bar >= last_closed_bar:
+        return None
+    return first_bar, last_bar
+
+
+def cache_key(source: str, symbol: str, timeframe: Timeframe, first_bar: np.datetime64, last_bar: np.datetime64) -> str:
+    """Return Redis key of a cached range (see cache_range)."""
+    start_str = np.datetime_as_string(first_bar, unit='s')
+    end_str = np.datetime_as_string(last_bar, unit='s')
+    return f"quotes:{source}:{symbol}:{timeframe}:{start_str}:{end_str}"
+
+
+async def _forget(redis_client, keys: Iterable[bytes], delete: bool) -> int:
+    keys = list(keys)
+    if not keys:
+        return 0
+    sizes = await redis_client.hmget(CACHE_SIZES, keys)
+    freed = sum(int(size) for size in sizes if size is not None)
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.zrem(CACHE_INDEX, *keys)
+        pipe.hdel(CACHE_SIZES, *keys)
+        if freed:
+            pipe.decrby(CACHE_BYTES, freed)
+        if delete:
+            pipe.delete(*keys)
+        await pipe.execute()
+    return freed
+
+
+async def put_response(redis_client, key: str, data: bytes, ttl: int, max_bytes: int, max_entry_bytes: int) -> bool:
+    """
+    Store a response, evicting the oldest entries if the cache is full.
+
+    Args:
+        redis_client: Asynchronous Redis client
+        key: Cache key (see cache_key)
+        data: Response frame
+        ttl: Entry TTL in seconds
+        max_bytes: Maximum total size of entries
+        max_entry_bytes: Maximum size of an entry, larger responses are not cached
+
+    Returns:
+        True if stored
+    """
+    size = len(data)
+    if size > min(max_entry_bytes, max_bytes):
+        return False
+    now = time.time()
+    # Forget entries expired by TTL and the old version of this entry
+    expired = await redis_client.zrangebyscore(CACHE_INDEX, '-inf', now - ttl)
+    await _forget(redis_client, list(expired) + [key.encode()], delete=False)
+
+    total = int(await redis_client.get(CACHE_BYTES) or 0)
+    while total + size > max_bytes:
+        oldest = await redis_client.zrange(CACHE_INDEX, 0, EVICT_BATCH - 1)
+        if not oldest:
+            break
+        freed = await _forget(redis_client, oldest, delete=True)
+        total -= freed
+        logger.debug(f"Evicted {len(oldest)} cached responses ({freed} bytes)")
+
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.set(key, data, ex=ttl)
+        pipe.zadd(CACHE_INDEX, {key: now})
+        pipe.hset(CACHE_SIZES, key, size)
+        pipe.incrby(CACHE_BYTES, size)
+        await pipe.execute()
+    return True
+
+
+def get_response(redis_client, key: str) -> Optional[bytes]:
+    """
+    Get a cached response.
+
+    Args:
+        redis_client: Synchronous Redis client
+        key: Cache key (see cache_key)
+
+    Returns:
+        Response frame or None
+    """
+    return redis_client.get(key)
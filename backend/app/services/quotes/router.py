@@ -0,0 +1,140 @@
+"""
+Routing of quote requests to quotes service worker processes.
+
+Clients push requests to one list. When the service runs several worker
+processes, the router moves each request to the list of the worker owning its
+(source, symbol, timeframe), so locks, in-flight requests and cache of a key
+stay in one process.
+"""
+from typing import Optional, Dict
+import asyncio
+import logging
+import multiprocessing
+import zlib
+import msgpack
+import redis.asyncio as redis
+from .timeframe import Timeframe
+
+logger = logging.getLogger(__name__)
+
+
+def worker_request_list(request_list: str, worker: int) -> str:
+    """Return name of the request list of a worker."""
+    return f"{request_list}:{worker}"
+
+
+def request_shard(request_data: Dict, workers: int) -> int:
+    """
+    Return index of the worker owning the request key.
+
+    Args:
+        request_data: Parsed request data
+        workers: Number of worker processes
+
+    Returns:
+        Worker index in range [0, workers)
+    """
+    timeframe = request_data.get('timeframe')
+    try:
+        timeframe = str(Timeframe.cast(timeframe))
+    except Exception:
+        # Invalid timeframe, the worker will report the error
+        timeframe = str(timeframe)
+    key = f"{request_data.get('source')}|{request_data.get('symbol')}|{timeframe}"
+    return zlib.crc32(key.encode()) % workers
+
+
+async def clean_service_keys(redis_client: redis.Redis, request_list: str, response_prefix: str) -> None:
+    """
+    Delete requests and responses left by a previous run of the service.
+
+    The shared response cache (see response_cache.py) is kept.
+
+    Args:
+        redis_client: Asynchronous Redis client
+        request_list: Redis list name for incoming requests
+        response_prefix: Prefix for response list names
+    """
+    patterns = [
+        request_list,
+        # Request lists of worker processes (see worker_request_list)
+        f"{request_list}:*",
+        f"{response_prefix}:*"
+    ]
+
+    for pattern in patterns:
+        keys = await redis_client.keys(pattern)
+        if keys:
+            await redis_client.delete(*keys)
+            logger.info(f"Cleaned {len(keys)} keys matching pattern: {pattern}")
+
+
+async def run_quotes_router(
+    redis_params: Dict,
+    request_list: str,
+    response_prefix: str,
+    workers: int,
+    timeout: int = 0,
+    stop_event: Optional[multiprocessing.Event] = None,
+    ready_event: Optional[multiprocessing.Event] = None
+):
+    """
+    Move requests from request_list to the lists of worker processes.
+
+    Request bytes are forwarded unchanged, only the key fields are decoded.
+
+    Args:
+        redis_params: Dictionary with Redis connection parameters (host, port, db, password) - REQUIRED
+        request_list: Redis list name for incoming requests
+        response_prefix: Prefix for response list names
+        workers: Number of worker processes
+        timeout: BRPOP timeout in seconds (0 = block indefinitely)
+        stop_event: Multiprocessing event to signal router stop
+        ready_event: Multiprocessing event to signal router is ready
+    """
+    if not redis_params:
+        raise ValueError("redis_params must be provided and cannot be empty")
+
+    redis_client = redis.Redis(
+        host=redis_params['host'],
+        port=redis_params['port'],
+        db=redis_params['db'],
+        password=redis_params.get('password', None),
+        decode_responses=False
+    )
+
+    # Workers don't clean Redis, the router does it once for all of them
+    await clean_service_keys(redis_client, request_list, response_prefix)
+
+    logger.info(f"Quotes router started. Routing {request_list} to {workers} workers")
+    if ready_event:
+        ready_event.set()
+
+    try:
+        while stop_event is None or not stop_event.is_set():
+            try:
+                result = await redis_client.brpop(request_list, timeout=timeout if timeout > 0 else 1)
+                if result is None:
+                    continue
+
+                _, request_bytes = result
+                try:
+                    request_data = msgpack.unpackb(request_bytes, raw=False)
+                    shard = request_shard(request_data, workers)
+                except Exception as e:
+                    logger.error(f"Error parsing request: {e}", exc_info=True)
+                    continue
+
+                await redis_client.lpush(worker_request_list(request_list, shard), request_bytes)
+
+            except asyncio.CancelledError:
+                logger.info("Quotes router cancelled")
+                break
+            except Exception as e:
+                logger.error(f"Error in quotes router main loop: {e}", exc_info=True)
+                await asyncio.sleep(1)
+    finally:
+        await redis_client.aclose()
+        logger.info("Quotes router finished")
+        if ready_event:
+            ready_event.clear()
@@ -0,0 +1,57 @@
+"""
+Database schema migrations of the quotes service.
+
+Migrations are SQL scripts in the migrations directory named
+{version}_{description}.sql, e.g. 003_quotes_v2.sql. The db_quotes_version
+table records applied versions; before worker processes start, scripts with a
+version above the recorded one are applied in version order, once, under a
+Redis lock (see storage.migrate_storage and ClickHouseStorage.migrate).
+"""
+from pathlib import Path
+from typing import Iterator, List, Tuple
+import re
+
+MIGRATIONS_DIR = Path(__file__).parent / 'migrations'
+
+_MIGRATION_NAME = re.compile(r'(\d+)_\w+\.sql')
+
+Migration = Tuple[int, Path]
+
+
+def load_migrations(directory: Path = MIGRATIONS_DIR) -> List[Migration]:
+    """
+    Find migration scripts.
+
+    Args:
+        directory: Directory of migration scripts
+
+    Returns:
+        List of (version, path) sorted by version
+
+    Raises:
+        ValueError: If two scripts have the same version
+    """
+    migrations = {}
+    for path in directory.glob('*.sql'):
+        match = _MIGRATION_NAME.fullmatch(path.name)
+        if not match:
+            continue
+        version = int(match.group(1))
+        if version in migrations:
+            raise ValueError(f"Duplicate migration version {version}: {migrations[version].name}, {path.name}")
+        migrations[version] = path
+    return sorted(migrations.items())
+
+
+def pending_migrations(migrations: List[Migration], version: int) -> List[Migration]:
+    """Return migrations above the applied version (0 for an empty database)."""
+    return [migration for migration in migrations if migration[0] > version]
+
+
+def split_statements(script: str) -> Iterator[str]:
+    """Split an SQL script into statements, skipping comment lines."""
+    lines = (line for line in script.splitlines() if not line.lstrip().startswith('--'))
+    for statement in '\n'.join(lines).split(';'):
+        statement = statement.strip()
+        if statement:
+            yield statement
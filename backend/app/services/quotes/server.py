@@ -1,27 +1,60 @@
 from datetime import datetime, UTC
-from typing import Optional, Dict, List, Tuple, Callable, TypeVar, Any
+from typing import Optional, Dict, List, Tuple, Callable, TypeVar, Any, Union, Iterator, AsyncIterator, Sequence
 import redis.asyncio as redis
+import redis as sync_redis
 import numpy as np
 import msgpack
 import logging
 import multiprocessing
-from pathlib import Path
-import clickhouse_connect
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
 import ccxt.async_support as ccxt
 import asyncio
+import functools
 from .timeframe import Timeframe
-from .exceptions import R2D2QuotesException, R2D2QuotesExceptionDataNotReceived
-from .constants import TIME_TYPE, TIME_TYPE_UNIT, TIME_UNITS_IN_ONE_SECOND
-from app.core.config import QUOTES_FETCH_RETRY_ATTEMPTS, QUOTES_FETCH_RETRY_DELAY
+from .exceptions import R2D2QuotesExceptionDataNotReceived
+from .constants import TIME_TYPE_UNIT, TIME_UNITS_IN_ONE_SECOND
+from .bars import BAR_COLUMNS, PRICE_COLUMNS, select_columns, to_datetime64, from_datetime64, slice_bars, merge_bars, concat_bars, ohlcv_to_bars
+from .coverage import Interval, merge_intervals, subtract_intervals, intersect_intervals, find_empty_intervals
+from .cache import QuotesCache
+from .rate_limiter import ExchangeRateLimiter, RATE_LIMIT_PREFIX
+from .exchange_pool import ExchangePool
+from .ingest import IngestQueue
+from .locks import IntervalLockManager
+from .router import run_quotes_router, worker_request_list, clean_service_keys
+from .shm import write_segment, reap_segments
+from .stream import stream_key, rechunk, publish_stream
+from .frame import pack_frame
+from .compression import choose_codec, available_codecs
+from .response_cache import cache_range, cache_key, put_response
+from .storage import create_storage, migrate_storage
+from .resample import parse_derived_timeframes, resample_bars
+from app.core.config import (
+    QUOTES_FETCH_RETRY_ATTEMPTS, QUOTES_FETCH_RETRY_DELAY,
+    QUOTES_FETCH_CONCURRENCY, QUOTES_FETCH_RATE_BURST,
+    QUOTES_EXCHANGE_IDLE_TIMEOUT, QUOTES_EXCHANGE_HEALTH_CHECK_INTERVAL,
+    QUOTES_INGEST_BATCH_BARS, QUOTES_INGEST_FLUSH_INTERVAL, QUOTES_INGEST_MAX_PENDING,
+    QUOTES_CACHE_MAX_BYTES, QUOTES_SHM_DIR,
+    QUOTES_STREAM_CHUNK_BARS, QUOTES_STREAM_MAX_CHUNKS,
+    QUOTES_CLICKHOUSE_POOL_SIZE, QUOTES_STORAGE, QUOTES_STORAGE_DIR,
+    QUOTES_UNAVAILABLE_RECHECK_INTERVAL, QUOTES_MIN_REFETCH_INTERVAL, QUOTES_DERIVED_TIMEFRAMES,
+    QUOTES_RESPONSE_CACHE, QUOTES_RESPONSE_CACHE_TTL, QUOTES_RESPONSE_CACHE_MAX_BYTES, QUOTES_RESPONSE_CACHE_MAX_ENTRY_BYTES
+)
 
 T = TypeVar('T')
 
 logger = logging.getLogger(__name__)
 
-# Global variables for service management
-_service_process: Optional[multiprocessing.Process] = None
-_stop_event: Optional[multiprocessing.Event] = None
-_ready_event: Optional[multiprocessing.Event] = None
+# Interval between checks for expired shared memory segments (seconds)
+SHM_REAP_INTERVAL = 10
+# Interval between closings of idle pooled exchange instances (seconds)
+EXCHANGE_EVICT_INTERVAL = 10
+
+# Global variables for service management (worker processes and, with several workers, the router)
+_service_processes: List[multiprocessing.Process] = []
+_stop_events: List[multiprocessing.Event] = []
+_ready_events: List[multiprocessing.Event] = []
 
 
 async def retry_async(
@@ -70,6 +103,29 @@ async def retry_async(
     raise last_exception
 
 
+async def gather_or_cancel(*aws) -> List[Any]:
+    """
+    Run awaitables concurrently and return their results in order.
+    
+    Unlike plain asyncio.gather, if one of them fails the others are cancelled
+    before the exception is re-raised, so no fetch outlives its exchange instance.
+    
+    Args:
+        *aws: Coroutines or futures to run
+        
+    Returns:
+        List of results
+    """
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
 class QuotesServer:
     _instance = None
     _initialized = False
@@ -98,345 +154,421 @@ class QuotesServer:
                 decode_responses=False  # Keep binary for numpy arrays
             )
             
-            # Required ClickHouse parameters
-            if not clickhouse_params:
-                raise ValueError("clickhouse_params must be provided and cannot be empty")
-            self.clickhouse_host = clickhouse_params['host']
-            self.clickhouse_port = clickhouse_params['port']
-            self.clickhouse_username = clickhouse_params['username']
-            self.clickhouse_password = clickhouse_params.get('password', '')
-            self.clickhouse_database = clickhouse_params['database']
+            # Storage of bars and stored ranges (ClickHouse parameters are required for ClickHouse storage).
+            # The schema is migrated by prepare_storage before workers start, init only checks it
+            self.storage = create_storage(QUOTES_STORAGE, clickhouse_params=clickhouse_params, path=QUOTES_STORAGE_DIR)
+            self.storage.init()
+            
+            # Storage calls are blocking, they run in their own thread pool, so concurrent
+            # requests use the storage in parallel and don't occupy the default executor
+            self.db_executor = ThreadPoolExecutor(max_workers=QUOTES_CLICKHOUSE_POOL_SIZE, thread_name_prefix='quotes-storage')
+            
+            # Locks on gaps being filled by (source, symbol, timeframe)
+            # Prevents parallel fetching of overlapping ranges of the same symbol and timeframe
+            self.interval_locks = IntervalLockManager()
+            
+            # Requests in flight by (source, symbol, timeframe): list of (start, end, task)
+            self._inflight: Dict[Tuple[str, str, Timeframe], List[tuple]] = {}
+            
+            # Last fetch of the tail (up to the last closed bar) by (source, symbol, timeframe):
+            # (gap start, gap end, time.monotonic() of the fetch), see _skip_fresh_gaps
+            self._tail_fetches: Dict[Tuple[str, str, Timeframe], Tuple[np.datetime64, np.datetime64, float]] = {}
+            
+            # Base timeframes of timeframes derived from stored bars instead of fetched (see resample.py)
+            self.derived_timeframes = parse_derived_timeframes(QUOTES_DERIVED_TIMEFRAMES)
+            
+            # Long-lived exchange instances shared by all requests
+            self.exchange_pool = ExchangePool(
+                idle_timeout=QUOTES_EXCHANGE_IDLE_TIMEOUT,
+                health_check_interval=QUOTES_EXCHANGE_HEALTH_CHECK_INTERVAL
+            )
+            
+            # Write-behind queue saving fetched bars in batches from a worker thread
+            self.ingest = IngestQueue(
+                save_func=self.save_pages,
+                batch_bars=QUOTES_INGEST_BATCH_BARS,
+                flush_interval=QUOTES_INGEST_FLUSH_INTERVAL,
+                max_pending=QUOTES_INGEST_MAX_PENDING
+            )
             
-            self.init_database()
+            # Rate limiters shared by all requests to the same exchange
+            self._rate_limiters: Dict[str, ExchangeRateLimiter] = {}
             
-            # Dictionary of locks for synchronizing requests by (source, symbol, timeframe)
-            # Prevents parallel processing of requests for the same symbol and timeframe
-            # Note: Locks are never removed from this dictionary to avoid race conditions
-            self._request_locks: Dict[Tuple[str, str, str], asyncio.Lock] = {}
-            self._locks_lock = asyncio.Lock()  # For thread-safe access to _request_locks
+            # In-memory cache of bar ranges already served, by (source, symbol, timeframe)
+            self.cache = QuotesCache(max_bytes=QUOTES_CACHE_MAX_BYTES)
             
             QuotesServer._initialized = True
 
-    def connect_database(self, database: Optional[str] = None):
+    def get_quotes_base(self, source: str, symbol: str, timeframe: Timeframe, date_start: datetime, date_end: datetime, columns: Optional[Sequence[str]] = None) -> Dict[str, np.ndarray]:
         """
-        Create ClickHouse client connection.
+        Get stored quotes of a range.
         
         Args:
-            database: Database name (optional). If None, connects without specifying database.
+            source: Exchange name (e.g., 'binance')
+            symbol: Trading pair symbol (e.g., 'BTC/USDT')
+            timeframe: Timeframe object
+            date_start: Start datetime for historical data
+            date_end: End datetime for historical data
+            columns: Price columns to read (e.g., ['close']), None for all; time is always read
         
         Returns:
-            ClickHouse client instance
+            dict with keys: 'time' and the price columns ('open', 'high', 'low', 'close', 'volume' by default)
+            Each value is a numpy array
+            
+        Raises:
+            R2D2Exception: If reading fails
         """
-        params = {
-            'host': self.clickhouse_host,
-            'port': self.clickhouse_port,
-            'username': self.clickhouse_username,
-            'password': self.clickhouse_password
-        }
-        
-        if database is not None:
-            params['database'] = database
-        
-        return clickhouse_connect.get_client(**params, compression=True)
+        return self.storage.read_bars(source, symbol, timeframe, date_start, date_end, columns)
 
-    def init_database(self) -> None:
+    def iter_quotes_base(self, source: str, symbol: str, timeframe: Timeframe, date_start: datetime, date_end: datetime, block_bars: int, columns: Optional[Sequence[str]] = None) -> Iterator[Dict[str, np.ndarray]]:
         """
-        Initialize database connection and schema.
+        Read stored quotes of a range in blocks.
         
-        Raises:
-            R2D2Exception: If database initialization fails
-        """
-        logger.info(f"Connecting to ClickHouse: {self.clickhouse_host}:{self.clickhouse_port}, database: {self.clickhouse_database}")
+        Unlike get_quotes_base, the range is never held in memory as a whole.
         
-        # Try to connect to the target database
-        try:
-            self.clickhouse_client = self.connect_database(database=self.clickhouse_database)
-        except Exception as e:
-            # Database doesn't exist, connect to default and create it
-            logger.info(f"Database '{self.clickhouse_database}' doesn't exist, creating it: {e}")
-            
-            # Connect to default database
-            default_client = self.connect_database()
-            
-            # Create database
-            default_client.command(f"CREATE DATABASE IF NOT EXISTS {self.clickhouse_database}")
-            logger.info(f"Database '{self.clickhouse_database}' created")
-            
-            # Now connect to the created database
-            self.clickhouse_client = self.connect_database(database=self.clickhouse_database)
+        Args:
+            source: Exchange name (e.g., 'binance')
+            symbol: Trading pair symbol (e.g., 'BTC/USDT')
+            timeframe: Timeframe object
+            date_start: Start datetime for historical data
+            date_end: End datetime for historical data
+            block_bars: Maximum number of bars in a block
+            columns: Price columns to read, None for all; time is always read
         
-        # Check if database is already initialized
-        try:
-            result = self.clickhouse_client.query("SELECT version FROM db_quotes_version LIMIT 1")
-            if result.result_rows:
-                version = result.result_rows[0][0]
-                logger.info(f"Database initialized, version: {version}")
-                return
-        except Exception as e:
-            logger.info(f"Initializing database schema: {e}")
+        Yields:
+            dict of bar columns, blocks in time order
+        """
+        return self.storage.iter_bars(source, symbol, timeframe, date_start, date_end, block_bars, columns)
+
+    def count_quotes(self, source: str, symbol: str, timeframe: Timeframe, date_start: datetime, date_end: datetime) -> int:
+        """Return number of stored bars of a range."""
+        return self.storage.count_bars(source, symbol, timeframe, date_start, date_end)
+
+    def get_coverage(self, source: str, symbol: str, timeframe: Timeframe, date_start: np.datetime64, date_end: np.datetime64, include_unavailable: bool = False) -> List[Interval]:
+        """
+        Get stored intervals intersecting or touching [date_start, date_end].
         
-        # Schema file is in the same directory as this script
-        schema_file = Path(__file__).parent / 'schema.sql'
-        if not schema_file.exists():
-            raise R2D2QuotesException(f"Schema file not found: {schema_file}")
+        Args:
+            source: Exchange name (e.g., 'binance')
+            symbol: Trading pair symbol (e.g., 'BTC/USDT')
+            timeframe: Timeframe object
+            date_start: Start of range (inclusive)
+            date_end: End of range (inclusive)
+            include_unavailable: If True, also include ranges the exchange has no bars
+                for which are not due for a recheck (see record_unavailable)
         
-        logger.info(f"Executing schema script: {schema_file}")
-        with open(schema_file, 'r', encoding='utf-8') as f:
-            schema_sql = f.read()
+        Returns:
+            Sorted list of disjoint intervals (time_start, time_end) as np.datetime64
+        """
+        intervals = self.storage.get_coverage(source, symbol, timeframe, date_start, date_end, include_unavailable)
+        return merge_intervals(intervals, timeframe.timedelta64())
+
+    def add_coverage(self, source: str, symbol: str, timeframe: Timeframe, time_start: np.datetime64, time_end: np.datetime64) -> None:
+        """
+        Record that bars from time_start to time_end (inclusive) are stored.
         
-        # Execute schema SQL
-        for statement in schema_sql.split(';'):
-            statement = statement.strip()
-            if statement:
-                self.clickhouse_client.command(statement)
+        The interval is merged with stored intervals it overlaps or touches.
         
-        logger.info("Database schema initialized successfully")
+        Args:
+            source: Exchange name (e.g., 'binance')
+            symbol: Trading pair symbol (e.g., 'BTC/USDT')
+            timeframe: Timeframe object
+            time_start: First stored bar time
+            time_end: Last stored bar time
+        """
+        merged_start, merged_end = time_start, time_end
+        for covered_start, covered_end in self.get_coverage(source, symbol, timeframe, time_start, time_end):
+            merged_start = min(merged_start, covered_start)
+            merged_end = max(merged_end, covered_end)
+        self.storage.add_coverage(source, symbol, timeframe, merged_start, merged_end)
 
-    def get_quotes_base(self, source: str, symbol: str, timeframe: Timeframe, date_start: datetime, date_end: datetime) -> Dict[str, np.ndarray]:
+    def get_stored_intervals(self, source: str, symbol: str, timeframe: Timeframe) -> List[Interval]:
         """
-        Get quotes data from ClickHouse database.
+        Find contiguous intervals of stored bars.
         
         Args:
             source: Exchange name (e.g., 'binance')
             symbol: Trading pair symbol (e.g., 'BTC/USDT')
             timeframe: Timeframe object
-            date_start: Start datetime for historical data
-            date_end: End datetime for historical data
         
         Returns:
-            dict with keys: 'time', 'open', 'high', 'low', 'close', 'volume'
-            Each value is a numpy array
-            
-        Raises:
-            R2D2Exception: If query fails
-        """
-
-        date_start_str = date_start.strftime('%Y-%m-%d %H:%M:%S')
-        date_end_str = date_end.strftime('%Y-%m-%d %H:%M:%S')
-        
-        query = f"""
-        SELECT 
-            time,
-            open,
-            high,
-            low,
-            close,
-            volume
-        FROM quotes
-        WHERE source = '{source}'
-          AND symbol = '{symbol}'
-          AND timeframe = '{str(timeframe)}'
-          AND time >= '{date_start_str}'
-          AND time <= '{date_end_str}'
-        ORDER BY time
-        """
-        
-        # Read data directly as numpy array (more efficient than reading rows)
-        result_array = self.clickhouse_client.query_np(query)
-        # Check if we have any results
-        if result_array.size == 0 or len(result_array) == 0:
-            # Return empty arrays if no data
-            return {
-                'time': np.array([], dtype=TIME_TYPE),
-                'open': np.array([], dtype=np.float64),
-                'high': np.array([], dtype=np.float64),
-                'low': np.array([], dtype=np.float64),
-                'close': np.array([], dtype=np.float64),
-                'volume': np.array([], dtype=np.float64)
-            }
-        
-        # Extract columns directly from numpy array
-        # query_np returns structured array (since we have different types: DateTime64 and Float64)
-        # Access columns by name from the structured array
-        time_array = np.asarray(result_array['time'], dtype=TIME_TYPE)
-        open_array = np.asarray(result_array['open'], dtype=np.float64)
-        high_array = np.asarray(result_array['high'], dtype=np.float64)
-        low_array = np.asarray(result_array['low'], dtype=np.float64)
-        close_array = np.asarray(result_array['close'], dtype=np.float64)
-        volume_array = np.asarray(result_array['volume'], dtype=np.float64)
-        
-        return {
-            'time': time_array,
-            'open': open_array,
-            'high': high_array,
-            'low': low_array,
-            'close': close_array,
-            'volume': volume_array
-        }
-            
-    def find_gaps(self, time_array: np.ndarray, timeframe: Timeframe, history_start: datetime, history_end: datetime) -> List[tuple]:
+            Sorted list of intervals (time_start, time_end) as np.datetime64
         """
-        Find gaps (missing quotes) in the time array.
+        return self.storage.stored_intervals(source, symbol, timeframe)
+
+    def find_gaps(self, source: str, symbol: str, timeframe: Timeframe, history_start: datetime, history_end: datetime) -> List[tuple]:
+        """
+        Find gaps (missing quotes) in the stored data.
         
-        If time_array is empty, returns the entire range as a single gap.
+        Uses the coverage table, so the cost depends on the number of stored
+        intervals, not on the number of bars. Ranges the exchange has no bars
+        for (see record_unavailable) and bars not closed yet are not gaps.
         
         Args:
-            time_array: Array of timestamps as numpy datetime64 (can be empty)
+            source: Exchange name (e.g., 'binance')
+            symbol: Trading pair symbol (e.g., 'BTC/USDT')
             timeframe: Timeframe object
             history_start: Start datetime
             history_end: End datetime
         
         Returns:
-            List of tuples (gap_start, gap_end) representing gaps as datetime objects
-        """
-        gaps = []
-        
-        # If no data at all - entire range is a gap
-        if len(time_array) == 0:
-            return [(history_start, history_end)]
-        
-        # Convert history_start and history_end to numpy datetime64
-        history_start_dt64 = np.datetime64(history_start.replace(tzinfo=None), TIME_TYPE_UNIT)
-        history_end_dt64 = np.datetime64(history_end.replace(tzinfo=None), TIME_TYPE_UNIT)
-        
-        # Get timeframe interval as timedelta64
-        timeframe_delta = timeframe.timedelta64()
-        
-        # Check gap at the beginning
-        first_time = time_array[0]
-        if first_time > history_start_dt64:
-            # Gap from history_start to first_time - timeframe_delta (inclusive on both ends)
-            # Since fetch_bar_async loads inclusively, gap_end should be one timeframe before first_time
-            # to avoid loading the bar that already exists
-            gap_end_dt64 = first_time - timeframe_delta
-            gap_start_dt = datetime.fromtimestamp(history_start_dt64.astype('datetime64[ms]').astype('int64') / 1000, UTC)
-            gap_end_dt = datetime.fromtimestamp(gap_end_dt64.astype('datetime64[ms]').astype('int64') / 1000, UTC)
-            gaps.append((gap_start_dt, gap_end_dt))
-        # Note: If first_time == history_start_dt64, gaps will be detected by the "between bars" check below
-        
-        # Check gaps between bars using vectorized operations
-        if len(time_array) > 1:
-            # Get current times and next times
-            current_times = time_array[:-1]
-            next_times = time_array[1:]
-            
-            # Calculate expected next times (current + timeframe interval)
-            expected_next_times = current_times + timeframe_delta
-            
-            # Find gaps: where next_time > expected_next_time
-            gap_mask = next_times > expected_next_times
-            
-            # Convert gap positions to datetime tuples
-            gap_indices = np.where(gap_mask)[0]
-            for idx in gap_indices:
-                gap_start_dt64 = expected_next_times[idx]
-                # Gap ends one timeframe before next_time (since fetch_bar_async loads inclusively)
-                gap_end_dt64 = next_times[idx] - timeframe_delta
-                # Convert back to datetime
-                gap_start_dt = datetime.fromtimestamp(gap_start_dt64.astype('datetime64[ms]').astype('int64') / 1000, UTC)
-                gap_end_dt = datetime.fromtimestamp(gap_end_dt64.astype('datetime64[ms]').astype('int64') / 1000, UTC)
-                gaps.append((gap_start_dt, gap_end_dt))
-        
-        # Check gap at the end
-        last_time = time_array[-1]
-        expected_next = last_time + timeframe_delta
-        if expected_next <= history_end_dt64:
-            # Gap from expected_next to history_end (inclusive on both ends)
-            gap_start_dt = datetime.fromtimestamp(expected_next.astype('datetime64[ms]').astype('int64') / 1000, UTC)
-            gap_end_dt = datetime.fromtimestamp(history_end_dt64.astype('datetime64[ms]').astype('int64') / 1000, UTC)
-            gaps.append((gap_start_dt, gap_end_dt))
-        
-        return gaps
-
-    async def _get_request_lock(self, source: str, symbol: str, timeframe_str: str) -> asyncio.Lock:
-        """
-        Get or create a lock for a specific (source, symbol, timeframe) combination.
-        This ensures that requests for the same symbol and timeframe are processed sequentially.
+            List of tuples (gap_start, gap_end) representing gaps as datetime objects.
+            Both ends are inclusive, as fetch_bar_async loads inclusively.
+        """
+        range_start = to_datetime64(history_start)
+        # Bars after the last closed bar are not stored yet, they are not gaps
+        range_end = min(to_datetime64(history_end), self.last_closed_bar(timeframe))
+        if range_end < range_start:
+            return []
+        covered = self.get_coverage(source, symbol, timeframe, range_start, range_end, include_unavailable=True)
+        gaps = subtract_intervals(range_start, range_end, covered, timeframe.timedelta64())
+        return [(from_datetime64(gap_start), from_datetime64(gap_end)) for gap_start, gap_end in gaps]
+
+    def record_unavailable(self, source: str, symbol: str, timeframe: Timeframe, requested: List[List[Interval]], pages: List[Dict[str, np.ndarray]]) -> None:
+        """
+        Record parts of fetched gaps the exchange returned no bars for.
+        
+        Such ranges are excluded from gaps, so they are not fetched on every
+        request. Only ranges the exchange was asked for are considered: a bar
+        between requests of a gap was not fetched and stays a gap. A range
+        followed by fetched bars (e.g. before the listing or a maintenance
+        window) is final; other ranges are fetched again after
+        QUOTES_UNAVAILABLE_RECHECK_INTERVAL seconds. Bars not closed yet are
+        not considered, and an empty range up to the last closed bar is not
+        recorded: the exchange may publish the bar with a delay, such tails
+        are fetched again by the freshness policy (see _skip_fresh_gaps).
         
         Args:
-            source: Data source (e.g., 'binance')
-            symbol: Trading symbol (e.g., 'btc/usdt')
-            timeframe_str: Timeframe as string (e.g., '1h')
+            source: Exchange name (e.g., 'binance')
+            symbol: Trading pair symbol (e.g., 'BTC/USDT')
+            timeframe: Timeframe object
+            requested: Ranges requested from the exchange for each gap, both ends inclusive
+            pages: Fetched bars of each gap
+        """
+        step = timeframe.timedelta64()
+        last_closed_bar = self.last_closed_bar(timeframe)
+        ranges = []
+        for gap_requested, bars in zip(requested, pages):
+            for range_start, range_end in merge_intervals(gap_requested, step):
+                # First and last bar times inside the requested range
+                start = timeframe.begin_of_tf(range_start - np.timedelta64(1, TIME_TYPE_UNIT)) + step
+                end = min(timeframe.begin_of_tf(range_end), last_closed_bar)
+                if end < start:
+                    continue
+                for (hole_start, hole_end), final in find_empty_intervals(start, end, bars['time'], step):
+                    if not final and hole_end >= last_closed_bar:
+                        continue
+                    ranges.append((hole_start, hole_end, 0 if final else QUOTES_UNAVAILABLE_RECHECK_INTERVAL))
+        if not ranges:
+            return
         
-        Returns:
-            asyncio.Lock instance for the given key
+        logger.info(f"Recording {len(ranges)} ranges without bars for {source}/{symbol}/{timeframe}")
+        self.storage.add_unavailable(source, symbol, timeframe, ranges, to_datetime64(datetime.now(UTC)))
+
+    def get_rate_limiter(self, exchange_name: str, exchange: ccxt.Exchange) -> ExchangeRateLimiter:
         """
-        key = (source, symbol, timeframe_str)
+        Get or create the rate limiter for an exchange.
+        
+        Request rate follows the ccxt rateLimit of the exchange, concurrency and
+        burst size come from configuration. The rate is shared through Redis by
+        all worker and backfill processes, concurrency is limited per process.
         
-        # Thread-safe access to locks dictionary
-        async with self._locks_lock:
-            if key not in self._request_locks:
-                self._request_locks[key] = asyncio.Lock()
-            return self._request_locks[key]
+        Args:
+            exchange_name: Name of the exchange
+            exchange: CCXT exchange instance
+        
+        Returns:
+            ExchangeRateLimiter shared by all requests to this exchange
+        """
+        key = exchange_name.lower()
+        if key not in self._rate_limiters:
+            self._rate_limiters[key] = ExchangeRateLimiter(
+                rate_limit_ms=exchange.rateLimit,
+                burst=QUOTES_FETCH_RATE_BURST,
+                max_concurrency=QUOTES_FETCH_CONCURRENCY,
+                redis_client=self.redis_client,
+                key=f"{RATE_LIMIT_PREFIX}:{key}"
+            )
+        return self._rate_limiters[key]
 
-    async def get_quotes(self, source: str, symbol: str, timeframe: Timeframe, history_start: datetime, history_end: Optional[datetime] = None) -> Dict[str, np.ndarray]:
+    async def get_quotes(self, source: str, symbol: str, timeframe: Timeframe, history_start: datetime, history_end: Optional[datetime] = None, columns: Optional[Sequence[str]] = None) -> Dict[str, np.ndarray]:
         """
         Get quotes data from database, filling gaps if needed.
         
+        Identical or overlapping requests are coalesced: if a request for the
+        same (source, symbol, timeframe) covering the range is already in flight,
+        its result is awaited and sliced instead of loading the range again.
+        A flight reading all columns also serves requests for some of them.
+        
         Args:
             source: Data source (e.g., 'binance')
             symbol: Trading symbol (e.g., 'btc/usdt')
             timeframe: Timeframe object
             history_start: Start time for historical data
             history_end: End time for historical data (optional)
+            columns: Price columns to return (e.g., ['close']), None for all; time is always returned
         
         Returns:
-            dict with keys: 'time', 'open', 'high', 'low', 'close', 'volume'
+            dict with keys: 'time' and the price columns ('open', 'high', 'low', 'close', 'volume' by default)
             Each value is a numpy array
         """
         if history_end is None:
             history_end = datetime.now(UTC)
 
+        key = (source, symbol, timeframe)
+        price_columns = None if columns is None else frozenset(columns)
+        range_start = to_datetime64(history_start)
+        range_end = to_datetime64(history_end)
+        # Only closed bars are stored, so a range ending after the last closed bar
+        # is covered by any flight reaching that bar
+        needed_end = min(range_end, self.last_closed_bar(timeframe))
+
+        for flight_start, flight_end, flight_columns, flight in self._inflight.get(key, []):
+            if flight_start <= range_start and needed_end <= flight_end and (
+                flight_columns is None or (price_columns is not None and price_columns <= flight_columns)
+            ):
+                logger.info(f"Joined in-flight request for {source}/{symbol}/{timeframe}")
+                quotes_data = await asyncio.shield(flight)
+                return self._project_bars(slice_bars(quotes_data, range_start, range_end), columns)
+
+        # The flight runs as a separate task so that cancelling one of the
+        # waiting requests doesn't cancel the others
+        flight = asyncio.create_task(self._load_quotes(source, symbol, timeframe, history_start, history_end, columns))
+        entry = (range_start, range_end, price_columns, flight)
+        self._inflight.setdefault(key, []).append(entry)
+        flight.add_done_callback(lambda _: self._remove_flight(key, entry))
+        return await asyncio.shield(flight)
+
+    @staticmethod
+    def last_closed_bar(timeframe: Timeframe) -> np.datetime64:
+        """Return time of the last bar of the timeframe which is closed now."""
+        return timeframe.begin_of_tf(to_datetime64(datetime.now(UTC))) - timeframe.timedelta64()
+
+    def _skip_fresh_gaps(self, source: str, symbol: str, timeframe: Timeframe, gaps: List[Tuple[datetime, datetime]]) -> List[Tuple[datetime, datetime]]:
+        """
+        Drop tail gaps fetched less than QUOTES_MIN_REFETCH_INTERVAL seconds ago.
+        
+        A tail gap remains after a fetch if the exchange hasn't published the
+        last closed bar yet. Such a gap is fetched again when a new bar closes
+        (the gap becomes longer) or after the minimum re-fetch interval, not on
+        every request, e.g. on every chart refresh.
+        """
+        fetch = self._tail_fetches.get((source, symbol, timeframe))
+        if fetch is None or not gaps:
+            return gaps
+        fetched_start, fetched_end, fetched_at = fetch
+        if time.monotonic() - fetched_at >= QUOTES_MIN_REFETCH_INTERVAL:
+            return gaps
+        return [
+            (gap_start, gap_end)
+            for gap_start, gap_end in gaps
+            if not (fetched_start <= to_datetime64(gap_start) and to_datetime64(gap_end) <= fetched_end)
+        ]
+
+    @staticmethod
+    def _project_bars(bars: Dict[str, np.ndarray], columns: Optional[Sequence[str]]) -> Dict[str, np.ndarray]:
+        """Select time and the price columns (None for all) of bars."""
+        if columns is None:
+            return bars
+        return select_columns(bars, ['time'] + [name for name in PRICE_COLUMNS if name in columns])
+
+    def _remove_flight(self, key: Tuple[str, str, Timeframe], entry: tuple) -> None:
+        flights = self._inflight.get(key)
+        if flights is None:
+            return
+        if entry in flights:
+            flights.remove(entry)
+        if not flights:
+            del self._inflight[key]
+
+    async def _load_quotes(self, source: str, symbol: str, timeframe: Timeframe, history_start: datetime, history_end: datetime, columns: Optional[Sequence[str]] = None) -> Dict[str, np.ndarray]:
+        """
+        Load quotes of a range: serve from cache or read the database and fill gaps.
+        
+        Stored data is read without locking. Gap filling is serialized only with
+        requests filling overlapping gaps of the same (source, symbol, timeframe).
+        
+        Args:
+            source: Data source (e.g., 'binance')
+            symbol: Trading symbol (e.g., 'btc/usdt')
+            timeframe: Timeframe object
+            history_start: Start time for historical data
+            history_end: End time for historical data
+            columns: Price columns to read, None for all
+        
+        Returns:
+            dict of bar columns
+        """
         overall_start = datetime.now(UTC)
         
-        # Step 1: Get history from database (run blocking ClickHouse query in a thread pool)
+        # Step 0: Serve from memory cache if the whole range is already covered
+        cache_key = (source, symbol, timeframe)
+        range_start = to_datetime64(history_start)
+        range_end = to_datetime64(history_end)
+        # Bars after the last closed bar are not stored yet, a covered range up to it is complete
+        quotes_data = self.cache.get(cache_key, range_start, min(range_end, self.last_closed_bar(timeframe)))
+        if quotes_data is not None:
+            logger.info(
+                "get_quotes served from cache for %s/%s/%s (bars: %d)",
+                source,
+                symbol,
+                timeframe,
+                len(quotes_data['time']),
+            )
+            return self._project_bars(quotes_data, columns)
+        
+        # Step 1: Find gaps from stored coverage (run blocking ClickHouse query in a thread pool)
         loop = asyncio.get_running_loop()
-        quotes_data = await loop.run_in_executor(
-            None,
-            self.get_quotes_base,
+        gaps = await loop.run_in_executor(
+            self.db_executor,
+            self.find_gaps,
             source,
             symbol,
             timeframe,
             history_start,
             history_end,
         )
+        gaps = self._skip_fresh_gaps(source, symbol, timeframe, gaps)
         
-        # Step 2: Find gaps (find_gaps handles empty arrays internally)
-        gaps = self.find_gaps(quotes_data['time'], timeframe, history_start, history_end)
+        # Step 2: Read stored history (run blocking ClickHouse query in a thread pool).
+        # The read doesn't depend on gap filling, so it runs while gaps are fetched.
+        read_future = loop.run_in_executor(
+            self.db_executor,
+            self.get_quotes_base,
+            source,
+            symbol,
+            timeframe,
+            history_start,
+            history_end,
+            columns,
+        )
         
-        # Step 3: Fill gaps by calling fetch_bar_async for each gap
+        # Step 3: Fill gaps, the stored history read runs meanwhile
+        fetched_pages = []
         if gaps:
-            # Create asynchronous exchange instance
-            exchange_class = getattr(ccxt, source.lower())
-            exchange = exchange_class()
             try:
-                # Fill each gap sequentially
-                for gap_start, gap_end in gaps:
-                    logger.info(
-                        "Filling gap for %s/%s/%s from %s to %s",
-                        source,
-                        symbol,
-                        timeframe,
-                        gap_start,
-                        gap_end,
-                    )
-                    await self.fetch_bar_async(
-                        exchange=exchange,
-                        exchange_name=source,
-                        symbol=symbol,
-                        tf=timeframe,
-                        time_start=gap_start,
-                        time_end=gap_end,
-                        max_bars=1000,
-                    )
-            finally:
-                # Properly close asynchronous exchange connection
-                try:
-                    await exchange.close()
-                except Exception as e:
-                    logger.warning(f"Failed to close exchange {source}: {e}", exc_info=True)
+                fetched_pages = await self._fill_gaps(source, symbol, timeframe, history_start, history_end, gaps, read_filled=True)
+            except BaseException:
+                # Don't leave the read result unretrieved
+                await asyncio.gather(read_future, return_exceptions=True)
+                raise
         
-            # Step 4: Re-read history after filling gaps (run blocking ClickHouse query in a thread pool)
-            loop = asyncio.get_running_loop()
-            quotes_data = await loop.run_in_executor(
-                None,
-                self.get_quotes_base,
-                source,
-                symbol,
-                timeframe,
-                history_start,
-                history_end,
-            )
+        # Step 4: Merge fetched bars into stored history instead of reading the range again
+        # (merge_bars keeps only the columns that were read)
+        quotes_data = await read_future
+        for fetched_bars in fetched_pages:
+            if len(fetched_bars['time']):
+                quotes_data = merge_bars(quotes_data, slice_bars(fetched_bars, range_start, range_end))
+
+        # Step 5: Cache the range. Only closed bars are final, the tail after the
+        # last closed bar can still receive new bars and is not cached. Neither is
+        # the tail after the last bar received: the exchange may publish it later.
+        # Ranges read with some of the columns are not cached.
+        covered_end = min(range_end, self.last_closed_bar(timeframe))
+        if len(quotes_data['time']):
+            covered_end = min(covered_end, quotes_data['time'][-1])
+        if columns is None and len(quotes_data['time']) and covered_end >= range_start:
+            self.cache.put(cache_key, range_start, covered_end, slice_bars(quotes_data, range_start, covered_end))
 
         overall_duration = (datetime.now(UTC) - overall_start).total_seconds()
         logger.info(
@@ -449,101 +581,301 @@ class QuotesServer:
         )
         return quotes_data
 
-    def save_bars(self, exchange_name: str, symbol: str, tf: Timeframe, bars: List[list], check_data: bool = True):
+    async def _fill_gaps(self, source: str, symbol: str, timeframe: Timeframe, history_start: datetime, history_end: datetime, gaps: List[Tuple[datetime, datetime]], read_filled: bool) -> List[Dict[str, np.ndarray]]:
         """
-        Save bars to ClickHouse database
+        Fill gaps by calling fetch_bar_async for each gap.
+        
+        Gaps are locked, so requests with overlapping gaps wait for each other.
+        Gaps are checked again under the lock: another request may have filled
+        them while we were waiting.
+        
+        Args:
+            source: Data source (e.g., 'binance')
+            symbol: Trading symbol (e.g., 'btc/usdt')
+            timeframe: Timeframe object
+            history_start: Start time of the requested range
+            history_end: End time of the requested range
+            gaps: Gaps found before locking
+            read_filled: If True, read gaps filled by other requests, so that a
+                stored history read started before locking can be completed
+        
+        Returns:
+            List of bar column dicts: gaps filled by other requests (if read_filled), then fetched bars
+        """
+        loop = asyncio.get_running_loop()
+        fetched_pages = []
+        refresh_futures = []
+        gap_intervals = [(to_datetime64(gap_start), to_datetime64(gap_end)) for gap_start, gap_end in gaps]
+        try:
+            async with self.interval_locks.lock((source, symbol, timeframe), gap_intervals):
+                remaining_gaps = await loop.run_in_executor(
+                    self.db_executor,
+                    self.find_gaps,
+                    source,
+                    symbol,
+                    timeframe,
+                    history_start,
+                    history_end,
+                )
+                # Fetch only locked ranges: a bar closed since the gaps were found
+                # extends the tail gap past the lock, it is left to the next request
+                remaining_gaps = [
+                    (from_datetime64(gap_start), from_datetime64(gap_end))
+                    for gap_start, gap_end in intersect_intervals(
+                        [(to_datetime64(gap_start), to_datetime64(gap_end)) for gap_start, gap_end in remaining_gaps],
+                        gap_intervals,
+                    )
+                ]
+                remaining_gaps = self._skip_fresh_gaps(source, symbol, timeframe, remaining_gaps)
+                if read_filled and remaining_gaps != gaps:
+                    # The stored history read may have missed bars saved by that request
+                    refresh_futures = [
+                        loop.run_in_executor(self.db_executor, self.get_quotes_base, source, symbol, timeframe, gap_start, gap_end)
+                        for gap_start, gap_end in gaps
+                    ]
+                for gap_start, gap_end in remaining_gaps:
+                    logger.info(
+                        "Filling gap for %s/%s/%s from %s to %s",
+                        source,
+                        symbol,
+                        timeframe,
+                        gap_start,
+                        gap_end,
+                    )
+                base_timeframe = self.derived_timeframes.get(timeframe)
+                if remaining_gaps and base_timeframe is not None:
+                    # Derived timeframe: resample stored bars of the base timeframe
+                    results = await gather_or_cancel(*(
+                        self.derive_bars_async(source, symbol, timeframe, base_timeframe, gap_start, gap_end)
+                        for gap_start, gap_end in remaining_gaps
+                    ))
+                elif remaining_gaps:
+                    async with self.exchange_pool.exchange(source) as exchange:
+                        # Gaps are independent, fill them concurrently
+                        results = await gather_or_cancel(*(
+                            self.fetch_bar_async(
+                                exchange=exchange,
+                                exchange_name=source,
+                                symbol=symbol,
+                                tf=timeframe,
+                                time_start=gap_start,
+                                time_end=gap_end,
+                                max_bars=1000,
+                            )
+                            for gap_start, gap_end in remaining_gaps
+                        ))
+                if remaining_gaps:
+                    fetched_pages = [bars for _, _, _, bars, _ in results]
+                    # Remember the tail fetch, see _skip_fresh_gaps
+                    last_closed_bar = self.last_closed_bar(timeframe)
+                    for gap_start, gap_end in remaining_gaps:
+                        if to_datetime64(gap_end) >= last_closed_bar:
+                            self._tail_fetches[(source, symbol, timeframe)] = (to_datetime64(gap_start), to_datetime64(gap_end), time.monotonic())
+                    # Don't fetch ranges without bars again on every request
+                    await loop.run_in_executor(
+                        self.db_executor,
+                        self.record_unavailable,
+                        source,
+                        symbol,
+                        timeframe,
+                        [requested for _, _, _, _, requested in results],
+                        fetched_pages,
+                    )
+                refreshed_pages = await asyncio.gather(*refresh_futures)
+        except BaseException:
+            # Don't leave the read results unretrieved
+            await asyncio.gather(*refresh_futures, return_exceptions=True)
+            raise
+        return list(refreshed_pages) + fetched_pages
+
+    async def fill_quotes(self, source: str, symbol: str, timeframe: Timeframe, history_start: datetime, history_end: datetime) -> int:
+        """
+        Make sure the range is stored in the database, filling gaps if needed.
+        
+        Used when the range is read from the database afterwards, e.g. by
+        iter_quotes_base, so fetched bars are not kept.
+        
+        Args:
+            source: Data source (e.g., 'binance')
+            symbol: Trading symbol (e.g., 'btc/usdt')
+            timeframe: Timeframe object
+            history_start: Start time for historical data
+            history_end: End time for historical data
+        
+        Returns:
+            Number of bars fetched (or derived) to fill gaps
+        """
+        cache_end = min(to_datetime64(history_end), self.last_closed_bar(timeframe))
+        if self.cache.get((source, symbol, timeframe), to_datetime64(history_start), cache_end) is not None:
+            return 0
+        loop = asyncio.get_running_loop()
+        gaps = await loop.run_in_executor(self.db_executor, self.find_gaps, source, symbol, timeframe, history_start, history_end)
+        gaps = self._skip_fresh_gaps(source, symbol, timeframe, gaps)
+        if not gaps:
+            return 0
+        pages = await self._fill_gaps(source, symbol, timeframe, history_start, history_end, gaps, read_filled=False)
+        return sum(len(page['time']) for page in pages)
+
+    async def iter_quotes_chunks(self, source: str, symbol: str, timeframe: Timeframe, history_start: datetime, history_end: datetime, chunk_bars: int, columns: Optional[Sequence[str]] = None) -> AsyncIterator[Dict[str, np.ndarray]]:
+        """
+        Read stored quotes of a range in chunks of chunk_bars bars.
+        
+        The range is served from cache if possible, otherwise it is read from the
+        database block by block (see iter_quotes_base) in a thread pool.
+        
+        Args:
+            source: Data source (e.g., 'binance')
+            symbol: Trading symbol (e.g., 'btc/usdt')
+            timeframe: Timeframe object
+            history_start: Start time for historical data
+            history_end: End time for historical data
+            chunk_bars: Number of bars in a chunk
+            columns: Price columns to read, None for all
+        
+        Yields:
+            dict of bar columns
+        """
+        cached = self.cache.get((source, symbol, timeframe), to_datetime64(history_start), min(to_datetime64(history_end), self.last_closed_bar(timeframe)))
+        if cached is not None:
+            blocks = [self._project_bars(cached, columns)]
+        else:
+            blocks = self.iter_quotes_base(source, symbol, timeframe, history_start, history_end, block_bars=chunk_bars, columns=columns)
+        chunks = rechunk(blocks, chunk_bars)
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                # A stream holds its client between chunks, its reads run on the default
+                # executor so that the database threads stay free for other requests
+                chunk = await loop.run_in_executor(None, next, chunks, None)
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            # Close the database stream if the consumer stopped early
+            await loop.run_in_executor(None, chunks.close)
+
+    def save_pages(self, exchange_name: str, symbol: str, tf: Timeframe, pages: List[Dict[str, np.ndarray]]):
+        """
+        Save several pages of bars of one key with a single insert.
+        
+        Each page is a contiguous fetched interval; pages that don't follow each
+        other are recorded in the coverage table as separate intervals.
+        
+        Args:
+            exchange_name: Exchange name (e.g., 'binance')
+            symbol: Trading symbol (e.g., 'BTC/USDT')
+            tf: Timeframe object
+            pages: List of sorted bar column dicts
+        """
+        pages = sorted((page for page in pages if len(page['time'])), key=lambda page: page['time'][0])
+        if not pages:
+            return
+        bars = pages[0]
+        for page in pages[1:]:
+            bars = merge_bars(bars, page)
+        coverage = merge_intervals(((page['time'][0], page['time'][-1]) for page in pages), tf.timedelta64())
+        self.save_bars(exchange_name, symbol, tf, bars, coverage=coverage)
+
+    def save_bars(self, exchange_name: str, symbol: str, tf: Timeframe, bars: Union[List[list], Dict[str, np.ndarray]], check_data: bool = False, coverage: Optional[List[Interval]] = None):
+        """
+        Save bars to the storage and record them in the coverage.
         
         Args:
             exchange_name: Exchange name (e.g., 'binance')
             symbol: Trading symbol (e.g., 'BTC/USDT')
             tf: Timeframe object
-            bars: List of bars, each bar is [timestamp, open, high, low, close, volume]
-            check_data: If True, check for duplicates and gaps before saving
+            bars: Sorted bars, either dict of bar columns or ccxt OHLCV list
+                  where each bar is [timestamp, open, high, low, close, volume]
+            check_data: If True, skip bars that are already stored. Not needed
+                        for consistency: the storage keeps one row per bar
+                        (see QuotesStorage.write_bars)
+            coverage: Stored intervals to record in the coverage table
+                      (default: one interval from the first to the last bar)
         """
-        if not bars:
+        if isinstance(bars, list):
+            bars = ohlcv_to_bars(bars)
+        if len(bars['time']) == 0:
             return
         
         tf_str = str(tf)
-        temp_table = 'temp_save_bars'
         
         try:
-            # Create temporary table
-            self.clickhouse_client.command(f"""
-                CREATE TABLE IF NOT EXISTS {temp_table}
-                (
-                    source String,
-                    symbol String,
-                    timeframe String,
-                    time DateTime64(3, 'UTC'),
-                    open Float64,
-                    high Float64,
-                    low Float64,
-                    close Float64,
-                    volume Float64
-                )
-                ENGINE = Memory
-            """)
-            
-            self.clickhouse_client.command(f"TRUNCATE TABLE {temp_table}")
-            
-            # Prepare data for insertion
-            data = [
-                [exchange_name, symbol, tf_str, datetime.fromtimestamp(bar[0] / 1000.0, UTC), bar[1], bar[2], bar[3], bar[4], bar[5]]
-                for bar in bars
-            ]
+            first_time, last_time = bars['time'][0], bars['time'][-1]
             
-            self.clickhouse_client.insert(
-                temp_table,
-                data,
-                column_names=['source', 'symbol', 'timeframe', 'time', 'open', 'high', 'low', 'close', 'volume']
-            )
-            
-            # Check for duplicates and gaps if requested
+            # Check for duplicates if requested. Duplicates can only be inside
+            # the time range of the inserted bars, so only this range is read.
             if check_data:
-
-                query = f"""
-                    SELECT 
-                        (SELECT COUNT(*) FROM {temp_table} t
-                         INNER JOIN quotes q ON t.source = q.source 
-                             AND t.symbol = q.symbol 
-                             AND t.timeframe = q.timeframe 
-                             AND t.time = q.time) as duplicate_count,
-                        (SELECT MAX(time) FROM quotes
-                         WHERE source = '{exchange_name.replace("'", "''")}' 
-                           AND symbol = '{symbol.replace("'", "''")}' 
-                           AND timeframe = '{tf_str.replace("'", "''")}') as last_time
-                """
-                result = self.clickhouse_client.query(query)
-                
-                if result.result_rows:
-                    duplicate_count = result.result_rows[0][0] or 0
-                    last_time = result.result_rows[0][1]
-                    
-                    if last_time:
-                        last_time = last_time.replace(tzinfo=UTC)
-                    
-                    if duplicate_count > 0:
-                        raise ValueError(f"Found {duplicate_count} duplicate bars for {exchange_name}/{symbol}/{tf_str}")
+                existing = self.storage.read_bars(exchange_name, symbol, tf, from_datetime64(first_time), from_datetime64(last_time), columns=())['time']
+                if len(existing):
+                    new_mask = ~np.isin(bars['time'], existing)
+                    skipped = len(new_mask) - int(new_mask.sum())
+                    if skipped:
+                        logger.warning(f"Skipping {skipped} duplicate bars for {exchange_name}/{symbol}/{tf_str}")
+                        bars = {name: column[new_mask] for name, column in bars.items()}
             
-            # Insert from temp table to main table
-            # Convert timestamp (milliseconds) to DateTime64 with UTC timezone
-            self.clickhouse_client.command(f"""
-                INSERT INTO quotes
-                SELECT source, symbol, timeframe, time, open, high, low, close, volume
-                FROM {temp_table}
-            """)
+            count = len(bars['time'])
+            if count:
+                self.storage.write_bars(exchange_name, symbol, tf, bars)
             
-            self.clickhouse_client.command(f"TRUNCATE TABLE {temp_table}")
-            logger.info(f"Saved {len(bars)} bars to database ({exchange_name}/{symbol}/{tf_str})")
+            # Record stored intervals in the coverage table
+            for interval_start, interval_end in coverage or [(first_time, last_time)]:
+                self.add_coverage(exchange_name, symbol, tf, interval_start, interval_end)
+            logger.info(f"Saved {count} bars to database ({exchange_name}/{symbol}/{tf_str})")
             
         except Exception as e:
             logger.error(f"Error saving bars to database: {e}", exc_info=True)
             raise
 
+    async def derive_bars_async(self, source: str, symbol: str, tf: Timeframe, base_tf: Timeframe, time_start: datetime, time_end: datetime) -> tuple:
+        """
+        Derive bars of a range from stored bars of a lower timeframe and save them.
+        
+        Bars of base_tf covering the periods of the range are stored first
+        (fetched or derived in turn), then resampled. A bar is derived only when
+        base bars are stored up to the end of its period, so a bar is not saved
+        while the exchange hasn't published its last base bar.
+        
+        Args:
+            source: Exchange name (e.g., 'binance')
+            symbol: Trading pair symbol
+            tf: Derived timeframe
+            base_tf: Timeframe dividing tf (see resample.parse_derived_timeframes)
+            time_start: Start time as datetime
+            time_end: End time as datetime
+        
+        Returns:
+            Tuple (source, symbol, tf, bars, requested) as fetch_bar_async,
+            requested is the whole range: stored base bars of it were resampled
+        """
+        step = tf.timedelta64()
+        base_step = base_tf.timedelta64()
+        base_start = from_datetime64(tf.begin_of_tf(to_datetime64(time_start)))
+        base_end = from_datetime64(tf.begin_of_tf(to_datetime64(time_end)) + step - base_step)
+        await self.fill_quotes(source, symbol, base_tf, base_start, base_end)
+        
+        loop = asyncio.get_running_loop()
+        base_bars = await loop.run_in_executor(self.db_executor, self.get_quotes_base, source, symbol, base_tf, base_start, base_end)
+        bars = resample_bars(base_bars, tf)
+        if len(bars['time']):
+            mask = (
+                (bars['time'] >= to_datetime64(time_start))
+                & (bars['time'] <= to_datetime64(time_end))
+                & (bars['time'] + step <= base_bars['time'][-1] + base_step)
+            )
+            bars = {name: column[mask] for name, column in bars.items()}
+        
+        if len(bars['time']):
+            await (await self.ingest.put(source, symbol, tf, bars))
+        logger.info(f"Derived {len(bars['time'])} bars of {source}/{symbol}/{tf} from {len(base_bars['time'])} bars of {base_tf}")
+        return source, symbol, tf, bars, [(to_datetime64(time_start), to_datetime64(time_end))]
+
     async def fetch_bar_async(self, exchange: ccxt.Exchange, exchange_name: str, symbol: str, tf: Timeframe, time_start: datetime, time_end: Optional[datetime] = None, max_bars: int = 1000, retry_delay: int = 1) -> tuple:
         """
         Asynchronously fetch bars from exchange
         
+        The range is split into pages of max_bars bars which are fetched
+        concurrently, limited by the exchange rate limiter.
+        
         Args:
             exchange: CCXT exchange instance
             exchange_name: Name of the exchange (for logging)
@@ -551,38 +883,78 @@ class QuotesServer:
             tf: Timeframe object
             time_start: Start time as datetime
             time_end: End time as datetime (optional, if None, fetch until no more data)
-            realtime: If True, realtime mode - retry until we get a new bar
             max_bars: Maximum number of bars per request
             retry_delay: Delay in seconds before retry in realtime mode (default: 1)
             
         Returns:
-            Tuple (exchange_name, symbol, tf, bars) where:
-            - In historical mode: bars is empty list (bars are saved during fetch)
+            Tuple (exchange_name, symbol, tf, bars, requested) where:
+            - In historical mode: bars is dict of bar columns with all fetched bars (bars are saved during fetch)
             - In realtime mode: bars contains only the last complete bar [timestamp, open, high, low, close, volume]
+            - requested: ranges the exchange was asked for, see record_unavailable
         """
         tf_str = str(tf)
         realtime = time_end is None
         if realtime:
             raise ValueError(f"Not released realtime mode for {exchange_name}/{symbol}/{tf_str}")
-        current_since = int(time_start.replace(tzinfo=UTC).timestamp() * 1000)
-        time_end_ms = int(time_end.replace(tzinfo=UTC).timestamp() * 1000.0) if time_end else None
-        prev_bars = []
+        time_start_ms = int(time_start.replace(tzinfo=UTC).timestamp() * 1000)
+        time_end_ms = int(time_end.replace(tzinfo=UTC).timestamp() * 1000.0)
         
         # Calculate timeframe duration in milliseconds
-        timeframe_ms = tf.value / TIME_UNITS_IN_ONE_SECOND * 1000
+        timeframe_ms = int(tf.value / TIME_UNITS_IN_ONE_SECOND * 1000)
+        # Start at the first bar at or after time_start: pages of an unaligned
+        # start would end between bars and skip the bar at each page boundary
+        time_start_ms = int(tf.begin_of_tf(np.datetime64(time_start_ms - 1, 'ms')).astype(np.int64)) + timeframe_ms
         
-        while True:
+        # Split range into independent pages
+        page_ms = max_bars * timeframe_ms
+        pages = [
+            (page_start_ms, min(page_start_ms + page_ms - timeframe_ms, time_end_ms))
+            for page_start_ms in range(time_start_ms, time_end_ms + 1, page_ms)
+        ]
         
-            if current_since > time_end_ms:
-                break
-            
-            time_diff_ms = time_end_ms - current_since
-            bars_needed = int(time_diff_ms / timeframe_ms) + 2  # +2 because we need to fetch +1 bars more to be sure that we have the last complete bar
+        limiter = self.get_rate_limiter(exchange_name, exchange)
+        results = await gather_or_cancel(*(
+            self._fetch_page_async(exchange, limiter, exchange_name, symbol, tf, page_start_ms, page_end_ms, max_bars)
+            for page_start_ms, page_end_ms in pages
+        ))
+        
+        # Wait until the ingest queue has saved all fetched bars
+        await asyncio.gather(*(future for _, futures, _ in results for future in futures))
+
+        # Historical mode: all bars are saved, return them for merging with stored history
+        bars = concat_bars([page for pages, _, _ in results for page in pages])
+        return exchange_name, symbol, tf, bars, [interval for _, _, requested in results for interval in requested]
+
+    async def _fetch_page_async(self, exchange: ccxt.Exchange, limiter: ExchangeRateLimiter, exchange_name: str, symbol: str, tf: Timeframe, page_start_ms: int, page_end_ms: int, max_bars: int) -> Tuple[List[Dict[str, np.ndarray]], List[asyncio.Future], List[Interval]]:
+        """
+        Fetch bars of one page (from page_start_ms to page_end_ms inclusive) and queue them for saving.
+        
+        Exchanges may return fewer bars than requested, so the page is read in
+        a loop until its end is reached or the exchange has no more bars.
+        Bars that are not closed yet are not saved.
+        
+        Returns:
+            Tuple (fetched bar column dicts, futures of the ingest queue resolved when they are saved,
+            ranges the exchange was asked for and answered up to their ends)
+        """
+        tf_str = str(tf)
+        timeframe_ms = int(tf.value / TIME_UNITS_IN_ONE_SECOND * 1000)
+        
+        async def fetch_ohlcv_limited(**kwargs):
+            async with limiter:
+                return await exchange.fetch_ohlcv(**kwargs)
+        
+        fetched = []
+        saved_futures = []
+        requested = []
+        current_since = page_start_ms
+        while current_since <= page_end_ms:
+            bars_needed = int((page_end_ms - current_since) / timeframe_ms) + 2  # +1 bar to be sure that we have the last complete bar
             request_limit = min(bars_needed, max_bars)
             
             # Use retry mechanism for fetching bars
             bars = await retry_async(
-                exchange.fetch_ohlcv,
+                fetch_ohlcv_limited,
                 max_attempts=QUOTES_FETCH_RETRY_ATTEMPTS,
                 delay=QUOTES_FETCH_RETRY_DELAY,
                 symbol=symbol,
@@ -591,22 +963,61 @@ class QuotesServer:
                 limit=request_limit
             )
             
-            if not bars or len(bars) == 0:
+            if not bars:
+                # The exchange has no bars from current_since to the end of the page
+                requested.append((np.datetime64(current_since, 'ms'), np.datetime64(page_end_ms, 'ms')))
                 break
             
-            if prev_bars:
-                self.save_bars(exchange_name, symbol, tf, prev_bars)
-
-            prev_bars = bars
-            current_since = int(bars[-1][0] + timeframe_ms)
+            # Keep bars of this page which are already closed
+            page_bars = ohlcv_to_bars(bars)
+            page_time_ms = page_bars['time'].astype(np.int64)
+            last_time_ms = int(page_time_ms[-1])
+            if last_time_ms < current_since:
+                requested.append((np.datetime64(current_since, 'ms'), np.datetime64(page_end_ms, 'ms')))
+                break
+            # Bars after the last returned one may be cut by the exchange limit, they are requested next
+            requested.append((np.datetime64(current_since, 'ms'), np.datetime64(min(last_time_ms, page_end_ms), 'ms')))
+            now_ms = int(datetime.now(UTC).timestamp() * 1000)
+            mask = (page_time_ms >= current_since) & (page_time_ms <= page_end_ms) & (page_time_ms + timeframe_ms <= now_ms)
+            if mask.any():
+                page_bars = {name: column[mask] for name, column in page_bars.items()}
+                fetched.append(page_bars)
+                saved_futures.append(await self.ingest.put(exchange_name, symbol, tf, page_bars))
+            
+            current_since = last_time_ms + timeframe_ms
         
-        if prev_bars:
-            del prev_bars[-1]
-            if prev_bars:
-                self.save_bars(exchange_name, symbol, tf, prev_bars)
+        return fetched, saved_futures, requested
 
-        # Historical mode: all bars are saved, return empty list
-        return exchange_name, symbol, tf, []
+
+def parse_response_columns(request_data: Dict) -> Tuple[Optional[List[str]], Optional[str]]:
+    """
+    Parse column projection and dtype of price columns of a request.
+    
+    Args:
+        request_data: Parsed request data with optional 'columns' (list of column
+            names in response order) and 'dtype' ('float64' or 'float32')
+    
+    Returns:
+        Tuple (columns or None for all, dtype of price columns or None for float64).
+        Time is always returned, it is added first if not requested.
+    
+    Raises:
+        ValueError: If a column or dtype is not supported
+    """
+    columns = request_data.get('columns')
+    if columns is not None:
+        columns = list(columns)
+        unknown = [name for name in columns if name not in BAR_COLUMNS]
+        if unknown or not columns:
+            raise ValueError(f"Invalid columns: {columns}. Available: {', '.join(BAR_COLUMNS)}")
+        if 'time' not in columns:
+            columns.insert(0, 'time')
+    price_dtype = request_data.get('dtype')
+    if price_dtype not in (None, 'float64', 'float32'):
+        raise ValueError(f"Invalid dtype: {price_dtype}. Available: float64, float32")
+    if price_dtype == 'float64':
+        price_dtype = None
+    return columns, price_dtype
 
 
 async def process_request_async(
@@ -640,48 +1051,76 @@ async def process_request_async(
         # Convert timeframe string to Timeframe object
         timeframe = Timeframe.cast(timeframe_str)
         
-        # Get lock for this (source, symbol, timeframe) to prevent parallel processing
-        lock = await server._get_request_lock(source, symbol, timeframe_str)
+        # Optional column projection and dtype of price columns
+        columns, price_dtype = parse_response_columns(request_data)
+        price_columns = None if columns is None else [name for name in columns if name != 'time']
         
-        # Process request with lock - ensures only one request per (source, symbol, timeframe) at a time
-        async with lock:
-            # Get quotes data (async function)
-            quotes_data = await server.get_quotes(source, symbol, timeframe, history_start, history_end)
-            
-            # Prepare response with binary data
-            response_data = {
-                'metadata': {
-                    'request_id': request_id,
-                    'status': 'success',
-                    'array_sizes': {
-                        'time': len(quotes_data['time']),
-                        'open': len(quotes_data['open']),
-                        'high': len(quotes_data['high']),
-                        'low': len(quotes_data['low']),
-                        'close': len(quotes_data['close']),
-                        'volume': len(quotes_data['volume'])
-                    }
-                },
-                'binary_data': {
-                    'time': quotes_data['time'].tobytes(),
-                    'open': quotes_data['open'].tobytes(),
-                    'high': quotes_data['high'].tobytes(),
-                    'low': quotes_data['low'].tobytes(),
-                    'close': quotes_data['close'].tobytes(),
-                    'volume': quotes_data['volume'].tobytes()
-                }
+        # Large ranges are streamed in chunks instead of a single response
+        if request_data.get('stream'):
+            await process_stream_request_async(
+                server, source, symbol, timeframe, history_start, history_end, request_id, response_prefix, response_ttl,
+                codec=choose_codec(request_data.get('compression')),
+                columns=columns,
+                price_dtype=price_dtype
+            )
+            return
+        
+        # Get quotes data (async function), requests for the same range are coalesced.
+        # Only the requested columns are read from the database.
+        quotes_data = await server.get_quotes(source, symbol, timeframe, history_start, history_end, columns=price_columns)
+        quotes_data = select_columns(quotes_data, columns, price_dtype)
+        
+        # Prepare response with binary data
+        response_data = {
+            'metadata': {
+                'request_id': request_id,
+                'status': 'success',
+                'array_sizes': {name: len(column) for name, column in quotes_data.items()},
+                'dtypes': {name: column.dtype.str for name, column in quotes_data.items()}
             }
-            
+        }
+        
+        # Clients on the same host get the data through shared memory, only the handle goes through Redis
+        segment = None
+        if request_data.get('transport') == 'shm' and request_data.get('host') == socket.gethostname():
+            try:
+                segment = await asyncio.get_running_loop().run_in_executor(None, write_segment, QUOTES_SHM_DIR, quotes_data)
+            except OSError as e:
+                logger.warning(f"Shared memory transport failed, sending data inline: {e}")
+        
+        if segment is not None:
+            response_data['metadata']['transport'] = 'shm'
+            response_data['segment'] = segment
             # Serialize with MessagePack (supports binary data)
             response_bytes = msgpack.packb(response_data, use_bin_type=True)
-            
-            # Push response to individual response list for this request (async I/O)
-            individual_response_list = f"{response_prefix}:{request_id}"
-            await server.redis_client.lpush(individual_response_list, response_bytes)
-            
-            # Set TTL for response list (async I/O)
-            await server.redis_client.expire(individual_response_list, response_ttl)
-            logger.info(f"Processed request {request_id} for {source}:{symbol}:{timeframe}")
+        elif request_data.get('format') == 'frame':
+            # Columns are written straight into one buffer, the frame is the whole response
+            # (as a memoryview of the buffer: redis-py rejects bytearray values).
+            # Columns are compressed with the best codec accepted by the client, if any.
+            codec = choose_codec(request_data.get('compression'))
+            if codec is None:
+                response_bytes = pack_frame(quotes_data)
+            else:
+                response_bytes = await asyncio.get_running_loop().run_in_executor(
+                    None, functools.partial(pack_frame, quotes_data, codec=codec)
+                )
+        else:
+            response_data['binary_data'] = {name: column.tobytes() for name, column in quotes_data.items()}
+            # Serialize with MessagePack (supports binary data)
+            response_bytes = msgpack.packb(response_data, use_bin_type=True)
+        
+        # Push response to individual response list for this request (async I/O)
+        individual_response_list = f"{response_prefix}:{request_id}"
+        await server.redis_client.lpush(individual_response_list, response_bytes)
+        
+        # Set TTL for response list (async I/O)
+        await server.redis_client.expire(individual_response_list, response_ttl)
+        logger.info(f"Processed request {request_id} for {source}:{symbol}:{timeframe}")
+        
+        # Closed historical ranges go to the shared response cache, so that other
+        # clients get them without a request. Projected responses are not cached.
+        if QUOTES_RESPONSE_CACHE and columns is None:
+            await cache_response(server, source, symbol, timeframe, history_start, history_end, quotes_data)
         
     except R2D2QuotesExceptionDataNotReceived as e:
         # Send error response
@@ -718,6 +1157,124 @@ async def process_request_async(
         logger.error(f"Error processing request {request_id}: {e}", exc_info=True)
 
 
+async def cache_response(
+    server: QuotesServer,
+    source: str,
+    symbol: str,
+    timeframe: Timeframe,
+    history_start: datetime,
+    history_end: Optional[datetime],
+    quotes_data: Dict[str, np.ndarray]
+):
+    """
+    Store bars of a request in the shared response cache (see response_cache.py) if the range is cacheable.
+    
+    Bars are stored as a frame compressed with the best available codec, with float64 price columns.
+    """
+    snapped = cache_range(timeframe, history_start, history_end)
+    if snapped is None:
+        return
+    key = cache_key(source, symbol, timeframe, *snapped)
+    try:
+        if any(column.dtype != np.float64 for name, column in quotes_data.items() if name != 'time'):
+            return
+        data = await asyncio.get_running_loop().run_in_executor(
+            None, functools.partial(pack_frame, quotes_data, codec=choose_codec(available_codecs()))
+        )
+        await put_response(
+            server.redis_client,
+            key,
+            data,
+            ttl=QUOTES_RESPONSE_CACHE_TTL,
+            max_bytes=QUOTES_RESPONSE_CACHE_MAX_BYTES,
+            max_entry_bytes=QUOTES_RESPONSE_CACHE_MAX_ENTRY_BYTES
+        )
+    except Exception as e:
+        logger.warning(f"Failed to cache response {key}: {e}")
+
+
+async def process_stream_request_async(
+    server: QuotesServer,
+    source: str,
+    symbol: str,
+    timeframe: Timeframe,
+    history_start: datetime,
+    history_end: Optional[datetime],
+    request_id: str,
+    response_prefix: str,
+    response_ttl: int,
+    codec: Optional[str] = None,
+    columns: Optional[List[str]] = None,
+    price_dtype: Optional[str] = None
+):
+    """
+    Process a request in streaming mode (see stream.py).
+    
+    The range is stored first, then read from the database in blocks and
+    published in chunks, so neither side holds more than a few chunks in memory.
+    
+    Args:
+        server: QuotesServer instance
+        source: Data source (e.g., 'binance')
+        symbol: Trading symbol (e.g., 'btc/usdt')
+        timeframe: Timeframe object
+        history_start: Start time for historical data
+        history_end: End time for historical data (optional)
+        request_id: Request ID
+        response_prefix: Prefix for response list names
+        response_ttl: TTL for response lists and streams in seconds
+        codec: Codec name to compress chunks with (see compression.py)
+        columns: Columns of chunks in order, None for all
+        price_dtype: dtype of price columns, None for float64
+    """
+    if history_end is None:
+        history_end = datetime.now(UTC)
+    
+    await server.fill_quotes(source, symbol, timeframe, history_start, history_end)
+    count = await asyncio.get_running_loop().run_in_executor(
+        server.db_executor, server.count_quotes, source, symbol, timeframe, history_start, history_end
+    )
+    
+    # Header goes to the response list as a regular response
+    key = stream_key(response_prefix, request_id)
+    response_data = {
+        'metadata': {
+            'request_id': request_id,
+            'status': 'success',
+            'transport': 'stream',
+            'stream': key,
+            'count': count
+        }
+    }
+    individual_response_list = f"{response_prefix}:{request_id}"
+    await server.redis_client.lpush(individual_response_list, msgpack.packb(response_data, use_bin_type=True))
+    await server.redis_client.expire(individual_response_list, response_ttl)
+    
+    async def select_chunks(chunks: AsyncIterator[Dict[str, np.ndarray]]) -> AsyncIterator[Dict[str, np.ndarray]]:
+        async for chunk in chunks:
+            yield select_columns(chunk, columns, price_dtype)
+    
+    price_columns = None if columns is None else [name for name in columns if name != 'time']
+    chunks = server.iter_quotes_chunks(source, symbol, timeframe, history_start, history_end, QUOTES_STREAM_CHUNK_BARS, columns=price_columns)
+    if columns is not None or price_dtype is not None:
+        chunks = select_chunks(chunks)
+    
+    # Errors after the header are reported through the stream
+    try:
+        count = await publish_stream(
+            server.redis_client,
+            key,
+            chunks,
+            max_chunks=QUOTES_STREAM_MAX_CHUNKS,
+            ttl=response_ttl,
+            codec=codec
+        )
+    except Exception as e:
+        logger.error(f"Streaming of request {request_id} failed: {e}")
+        return
+    logger.info(f"Streamed request {request_id} for {source}:{symbol}:{timeframe} (bars: {count})")
+
+
 async def run_quotes_service(
     redis_params: Dict,
     clickhouse_params: Dict,
@@ -726,7 +1283,8 @@ async def run_quotes_service(
     timeout: int = 0,
     response_ttl: int = 300,
     stop_event: Optional[multiprocessing.Event] = None,
-    ready_event: Optional[multiprocessing.Event] = None
+    ready_event: Optional[multiprocessing.Event] = None,
+    clean_redis: bool = True
 ):
     """
     Run quotes service that processes requests via Redis lists (LPUSH/BRPOP).
@@ -742,7 +1300,11 @@ async def run_quotes_service(
         "symbol": "btc/usdt",
         "timeframe": "1d",
         "history_start": "2024-01-01T00:00:00",
-        "history_end": "2024-01-31T23:59:59"  // optional
+        "history_end": "2024-01-31T23:59:59",  // optional
+        "format": "frame",  // optional, success response is a binary frame (see frame.py)
+        "compression": ["zstd", "lz4", "zlib"],  // optional, accepted codecs of frames (see compression.py)
+        "transport": "shm",  // optional, with "host": data goes through shared memory (see shm.py)
+        "stream": true  // optional, data goes through a Redis stream in chunks (see stream.py)
     }
     
     Response format (MessagePack):
@@ -762,6 +1324,7 @@ async def run_quotes_service(
         response_ttl: TTL for response lists in seconds (default: 300 = 5 minutes)
         stop_event: Multiprocessing event to signal service stop
         ready_event: Multiprocessing event to signal service is ready
+        clean_redis: If True, delete requests and responses left by a previous run
     
     Raises:
         ValueError: If redis_params or clickhouse_params are not provided
@@ -774,17 +1337,8 @@ async def run_quotes_service(
     server = QuotesServer(redis_params=redis_params, clickhouse_params=clickhouse_params)
     
     # Clean Redis database from old test data
-    patterns = [
-        request_list,
-        f"{response_prefix}:*",
-        'quotes:*'
-    ]
-    
-    for pattern in patterns:
-        keys = await server.redis_client.keys(pattern)
-        if keys:
-            await server.redis_client.delete(*keys)
-            logger.info(f"Cleaned {len(keys)} keys matching pattern: {pattern}")
+    if clean_redis:
+        await clean_service_keys(server.redis_client, request_list, response_prefix)
     
     logger.info(f"Quotes service started. Listening on list: {request_list}")
     
@@ -792,9 +1346,22 @@ async def run_quotes_service(
     if ready_event:
         ready_event.set()
     
+    next_reap = 0.0
+    next_evict = time.monotonic() + EXCHANGE_EVICT_INTERVAL
     try:
         while stop_event is None or not stop_event.is_set():
             try:
+                # Remove shared memory segments not taken by clients before the response expired
+                if time.monotonic() >= next_reap:
+                    next_reap = time.monotonic() + SHM_REAP_INTERVAL
+                    reap_segments(QUOTES_SHM_DIR, lease=response_ttl)
+                
+                # Close exchange instances idle for longer than their idle timeout,
+                # also in a worker that never waits for requests
+                if time.monotonic() >= next_evict:
+                    next_evict = time.monotonic() + EXCHANGE_EVICT_INTERVAL
+                    await server.exchange_pool.evict_idle()
+                
                 # Blocking pop from request list (async I/O using asynchronous Redis client)
                 # Use shorter timeout to check stop_event more frequently
                 result = await server.redis_client.brpop(
@@ -845,6 +1412,9 @@ async def run_quotes_service(
         logger.error(f"Quotes service crashed with exception: {e}", exc_info=True)
         raise  # Re-raise to ensure process exits
     finally:
+        await server.ingest.close()
+        await server.exchange_pool.close_all()
+        server.storage.close()
         if stop_event:
             stop_event.clear()
         logger.info("Quotes service finished")
@@ -860,7 +1430,8 @@ def _quotes_service_worker(
     timeout: int,
     response_ttl: int,
     stop_event: multiprocessing.Event,
-    ready_event: multiprocessing.Event
+    ready_event: multiprocessing.Event,
+    clean_redis: bool = True
 ):
     """
     Worker function for quotes service process.
@@ -875,12 +1446,61 @@ def _quotes_service_worker(
             timeout=timeout,
             response_ttl=response_ttl,
             stop_event=stop_event,
-            ready_event=ready_event
+            ready_event=ready_event,
+            clean_redis=clean_redis
         ))
     except Exception as e:
         logger.critical(f"Quotes service process crashed: {e}", exc_info=True)
 
 
+def _quotes_router_worker(
+    redis_params: Dict,
+    request_list: str,
+    response_prefix: str,
+    workers: int,
+    timeout: int,
+    stop_event: multiprocessing.Event,
+    ready_event: multiprocessing.Event
+):
+    """
+    Worker function for quotes router process.
+    This function must be at module level to be picklable by multiprocessing.
+    """
+    try:
+        asyncio.run(run_quotes_router(
+            redis_params=redis_params,
+            request_list=request_list,
+            response_prefix=response_prefix,
+            workers=workers,
+            timeout=timeout,
+            stop_event=stop_event,
+            ready_event=ready_event
+        ))
+    except Exception as e:
+        logger.critical(f"Quotes router process crashed: {e}", exc_info=True)
+
+
+def prepare_storage(redis_params: Dict, clickhouse_params: Dict) -> None:
+    """
+    Create or migrate the schema of the quotes storage (see storage.migrate_storage).
+    
+    Args:
+        redis_params: Dictionary with Redis connection parameters (host, port, db, password)
+        clickhouse_params: Dictionary with ClickHouse connection parameters (host, port, username, password, database)
+    """
+    storage = create_storage(QUOTES_STORAGE, clickhouse_params=clickhouse_params, path=QUOTES_STORAGE_DIR)
+    try:
+        with sync_redis.Redis(
+            host=redis_params['host'],
+            port=redis_params['port'],
+            db=redis_params['db'],
+            password=redis_params.get('password', None)
+        ) as redis_client:
+            migrate_storage(storage, redis_client)
+    finally:
+        storage.close()
+
+
 def start_quotes_service(
     redis_params: Dict,
     clickhouse_params: Dict,
@@ -889,10 +1509,15 @@ def start_quotes_service(
     timeout: int = 0,
     response_ttl: int = 300,
     wait_ready: bool = True,
-    ready_timeout: float = 30.0
+    ready_timeout: float = 30.0,
+    workers: int = 1
 ) -> bool:
     """
-    Start quotes service in a separate process.
+    Start quotes service in separate processes.
+    
+    With one worker, the worker process listens to request_list. With several
+    workers, a router process moves requests from request_list to the list of
+    the worker owning (source, symbol, timeframe) of the request, see router.py.
     
     Args:
         redis_params: Dictionary with Redis connection parameters (host, port, db, password) - REQUIRED
@@ -903,6 +1528,7 @@ def start_quotes_service(
         response_ttl: TTL for response lists in seconds
         wait_ready: If True, wait for service to be ready before returning
         ready_timeout: Maximum time to wait for service to be ready (seconds)
+        workers: Number of worker processes
     
     Returns:
         True if service started successfully, False if already running
@@ -915,35 +1541,71 @@ def start_quotes_service(
     if not clickhouse_params:
         raise ValueError("clickhouse_params must be provided and cannot be empty")
     
-    global _service_process, _stop_event, _ready_event
+    global _service_processes, _stop_events, _ready_events
     
-    if _service_process is not None and _service_process.is_alive():
+    if any(process.is_alive() for process in _service_processes):
         logger.warning("Quotes service is already running")
         return False
     
-    _stop_event = multiprocessing.Event()
-    _ready_event = multiprocessing.Event()
-
-    _service_process = multiprocessing.Process(
-        target=_quotes_service_worker,
-        args=(
-            redis_params,
-            clickhouse_params,
-            request_list,
-            response_prefix,
-            timeout,
-            response_ttl,
-            _stop_event,
-            _ready_event
-        ),
-        daemon=False
-    )
-    _service_process.start()
-    logger.info("Quotes service process started")
+    # Migrate the schema once, before worker processes use it
+    prepare_storage(redis_params, clickhouse_params)
+    
+    workers = max(workers, 1)
+    _service_processes = []
+    _stop_events = []
+    _ready_events = []
+
+    for worker in range(workers):
+        stop_event = multiprocessing.Event()
+        ready_event = multiprocessing.Event()
+        sharded = workers > 1
+        process = multiprocessing.Process(
+            target=_quotes_service_worker,
+            args=(
+                redis_params,
+                clickhouse_params,
+                worker_request_list(request_list, worker) if sharded else request_list,
+                response_prefix,
+                timeout,
+                response_ttl,
+                stop_event,
+                ready_event,
+                not sharded
+            ),
+            daemon=False
+        )
+        _stop_events.append(stop_event)
+        _ready_events.append(ready_event)
+        _service_processes.append(process)
+
+    if workers > 1:
+        stop_event = multiprocessing.Event()
+        ready_event = multiprocessing.Event()
+        process = multiprocessing.Process(
+            target=_quotes_router_worker,
+            args=(
+                redis_params,
+                request_list,
+                response_prefix,
+                workers,
+                timeout,
+                stop_event,
+                ready_event
+            ),
+            daemon=False
+        )
+        _stop_events.append(stop_event)
+        _ready_events.append(ready_event)
+        _service_processes.append(process)
+
+    for process in _service_processes:
+        process.start()
+    logger.info(f"Quotes service processes started (workers: {workers})")
     
     # Wait for service to be ready if requested
     if wait_ready:
-        if _ready_event.wait(timeout=ready_timeout):
+        deadline = time.monotonic() + ready_timeout
+        if all(event.wait(timeout=max(deadline - time.monotonic(), 0)) for event in _ready_events):
             logger.info("Quotes service is ready to process requests")
         else:
             logger.warning(f"Quotes service did not become ready within {ready_timeout} seconds")
@@ -962,30 +1624,32 @@ def stop_quotes_service(timeout: float = 5.0) -> bool:
     Returns:
         True if service stopped successfully, False otherwise
     """
-    global _service_process, _stop_event, _ready_event
+    global _service_processes, _stop_events, _ready_events
     
-    if _service_process is None or not _service_process.is_alive():
+    if not any(process.is_alive() for process in _service_processes):
         logger.warning("Quotes service is not running")
         return False
     
     logger.info("Stopping quotes service...")
-    _stop_event.set()
-    
-    _service_process.join(timeout=timeout)
-    
-    if _service_process.is_alive():
-        logger.error(f"Quotes service did not stop within {timeout} seconds, terminating...")
-        _service_process.terminate()
-        _service_process.join(timeout=2.0)
-        if _service_process.is_alive():
-            logger.error("Quotes service did not terminate, killing...")
-            _service_process.kill()
-            _service_process.join()
-    
-    _service_process = None
-    _stop_event = None
-    _ready_event = None
+    for stop_event in _stop_events:
+        stop_event.set()
+    
+    deadline = time.monotonic() + timeout
+    for process in _service_processes:
+        process.join(timeout=max(deadline - time.monotonic(), 0))
+    
+    for process in _service_processes:
+        if process.is_alive():
+            logger.error(f"Quotes service process {process.pid} did not stop within {timeout} seconds, terminating...")
+            process.terminate()
+            process.join(timeout=2.0)
+            if process.is_alive():
+                logger.error(f"Quotes service process {process.pid} did not terminate, killing...")
+                process.kill()
+                process.join()
+    
+    _service_processes = []
+    _stop_events = []
+    _ready_events = []
     logger.info("Quotes service stopped")
     return True
-
-    
\ No newline at end of file
@@ -0,0 +1,99 @@
+"""
+Shared memory transport of bar columns between the quotes service and clients on the same host.
+
+The server writes columns into a file in a memory-backed directory (tmpfs,
+e.g. /dev/shm) and sends only a small handle through Redis. The client maps
+the file and gets the columns as read-only numpy views without copying.
+
+Lease: a file is owned by the single client of the response. The client
+unlinks it right after mapping (the mapping stays valid until the arrays are
+released). Files not taken by a client (timeout, crash) are removed by the
+server after their lease time.
+"""
+from pathlib import Path
+from typing import Dict
+import logging
+import os
+import time
+import uuid
+import numpy as np
+from .frame import frame_size, write_frame, read_frame
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_SUFFIX = '.bars'
+
+
+def write_segment(directory: str, bars: Dict[str, np.ndarray]) -> Dict:
+    """
+    Write bar columns into a new segment file as a frame (see frame.py).
+
+    Args:
+        directory: Directory for segment files (should be on tmpfs)
+        bars: dict of bar columns
+
+    Returns:
+        Segment handle: {'path': str, 'size': int}
+    """
+    size = frame_size(bars)
+    Path(directory).mkdir(parents=True, exist_ok=True)
+    path = os.path.join(directory, f"{uuid.uuid4().hex}{SEGMENT_SUFFIX}")
+    segment = np.memmap(path, dtype=np.uint8, mode='w+', shape=(size,))
+    write_frame(bars, segment)
+    segment.flush()
+    del segment
+    return {'path': path, 'size': size}
+
+
+def open_segment(handle: Dict) -> Dict[str, np.ndarray]:
+    """
+    Map a segment file and take it over: the file is unlinked after mapping.
+
+    Args:
+        handle: Segment handle returned by write_segment
+
+    Returns:
+        dict of bar columns (read-only views of the mapped file)
+    """
+    path = handle['path']
+    try:
+        segment = np.memmap(path, dtype=np.uint8, mode='r', shape=(handle['size'],))
+    finally:
+        # The mapping stays valid after unlinking, the memory is freed with the last view
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+    return read_frame(segment)
+
+
+def reap_segments(directory: str, lease: float) -> int:
+    """
+    Remove segment files older than lease seconds.
+
+    Args:
+        directory: Directory for segment files
+        lease: Lease time of a segment in seconds
+
+    Returns:
+        Number of removed files
+    """
+    removed = 0
+    deadline = time.time() - lease
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return 0
+    for entry in entries:
+        if not entry.name.endswith(SEGMENT_SUFFIX):
+            continue
+        try:
+            if entry.stat().st_mtime < deadline:
+                os.unlink(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            # Taken by a client meanwhile
+            pass
+    if removed:
+        logger.info(f"Removed {removed} expired shared memory segments")
+    return removed
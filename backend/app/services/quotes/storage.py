@@ -0,0 +1,177 @@
+"""
+Storage interface of the quotes service.
+
+QuotesServer keeps bars and the metadata of stored ranges (coverage and ranges
+the exchange has no bars for) in a QuotesStorage. Implementations:
+
+    clickhouse  ClickHouse server (clickhouse_storage.py), default
+    memmap      local memory-mapped column files (memmap_storage.py), for
+                single-node deployments and CI without a database server
+
+The implementation is selected by QUOTES_STORAGE (see create_storage). The
+schema is migrated once by migrate_storage before processes using the storage
+start; QuotesStorage.init only checks it.
+"""
+from abc import ABC, abstractmethod
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+import numpy as np
+from .coverage import Interval
+from .timeframe import Timeframe
+
+# Redis lock held while the schema is migrated
+SCHEMA_LOCK_KEY = 'quotes:schema:lock'
+# Lock TTL in seconds, renewed before each migration step
+SCHEMA_LOCK_TIMEOUT = 3600
+
+
+class QuotesStorage(ABC):
+    """
+    Storage of bars and stored ranges, keyed by (source, symbol, timeframe).
+
+    Methods are blocking, QuotesServer calls them from its database thread pool.
+    Bars are dicts of columns (see bars.py), ranges are inclusive.
+    """
+
+    def migrate(self, heartbeat: Optional[Callable[[], None]] = None) -> None:
+        """
+        Create or migrate the schema. Not safe to run concurrently, see migrate_storage.
+
+        Args:
+            heartbeat: Called before each migration step (e.g. to extend a lock)
+        """
+
+    def init(self) -> None:
+        """Prepare the storage for use (e.g. check the schema version)."""
+
+    def close(self) -> None:
+        """Release resources of the storage."""
+
+    @abstractmethod
+    def read_bars(self, source: str, symbol: str, timeframe: Timeframe, date_start: datetime, date_end: datetime, columns: Optional[Sequence[str]] = None) -> Dict[str, np.ndarray]:
+        """
+        Read bars of a range ordered by time.
+
+        Args:
+            source: Exchange name (e.g., 'binance')
+            symbol: Trading pair symbol (e.g., 'BTC/USDT')
+            timeframe: Timeframe object
+            date_start: Start of the range
+            date_end: End of the range
+            columns: Price columns to read (e.g., ['close']), None for all; time is always read
+
+        Returns:
+            dict with 'time' (TIME_TYPE) and float64 price columns
+        """
+
+    def iter_bars(self, source: str, symbol: str, timeframe: Timeframe, date_start: datetime, date_end: datetime, block_bars: int, columns: Optional[Sequence[str]] = None) -> Iterator[Dict[str, np.ndarray]]:
+        """
+        Read bars of a range in blocks of at most block_bars bars, in time order.
+
+        The default implementation slices the result of read_bars.
+        """
+        bars = self.read_bars(source, symbol, timeframe, date_start, date_end, columns)
+        for start in range(0, len(bars['time']), block_bars):
+            yield {name: column[start:start + block_bars] for name, column in bars.items()}
+
+    def count_bars(self, source: str, symbol: str, timeframe: Timeframe, date_start: datetime, date_end: datetime) -> int:
+        """Return number of stored bars of a range."""
+        return len(self.read_bars(source, symbol, timeframe, date_start, date_end, columns=())['time'])
+
+    @abstractmethod
+    def write_bars(self, source: str, symbol: str, timeframe: Timeframe, bars: Dict[str, np.ndarray]) -> None:
+        """
+        Store sorted bars with all columns; a bar replaces a stored bar with the same time.
+        """
+
+    @abstractmethod
+    def stored_intervals(self, source: str, symbol: str, timeframe: Timeframe) -> List[Interval]:
+        """Return sorted contiguous intervals of stored bars (see coverage.intervals_from_times)."""
+
+    @abstractmethod
+    def get_coverage(self, source: str, symbol: str, timeframe: Timeframe, date_start: np.datetime64, date_end: np.datetime64, include_unavailable: bool = False) -> List[Interval]:
+        """
+        Get recorded stored intervals intersecting or touching [date_start, date_end].
+
+        Args:
+            source: Exchange name (e.g., 'binance')
+            symbol: Trading pair symbol (e.g., 'BTC/USDT')
+            timeframe: Timeframe object
+            date_start: Start of range (inclusive)
+            date_end: End of range (inclusive)
+            include_unavailable: If True, also include ranges without bars not due for a recheck
+
+        Returns:
+            Intervals (time_start, time_end) as np.datetime64, not necessarily merged
+        """
+
+    @abstractmethod
+    def add_coverage(self, source: str, symbol: str, timeframe: Timeframe, time_start: np.datetime64, time_end: np.datetime64) -> None:
+        """Record a stored interval, merged by the caller with the intervals it overlaps or touches."""
+
+    @abstractmethod
+    def add_unavailable(self, source: str, symbol: str, timeframe: Timeframe, ranges: Sequence[Tuple[np.datetime64, np.datetime64, int]], checked_at: np.datetime64) -> None:
+        """
+        Record ranges the exchange returned no bars for.
+
+        Args:
+            source: Exchange name (e.g., 'binance')
+            symbol: Trading pair symbol (e.g., 'BTC/USDT')
+            timeframe: Timeframe object
+            ranges: List of (first bar, last bar, seconds after checked_at to fetch the range again, 0 = never);
+                    a range replaces a recorded range with the same start
+            checked_at: Time of the fetch that found the ranges empty
+        """
+
+
+def create_storage(kind: str, clickhouse_params: Optional[Dict] = None, path: Optional[Union[str, Path]] = None) -> QuotesStorage:
+    """
+    Create storage of the quotes service.
+
+    Args:
+        kind: 'clickhouse' or 'memmap'
+        clickhouse_params: ClickHouse connection parameters (host, port, username, password, database), for 'clickhouse'
+        path: Root directory of files, for 'memmap'
+
+    Returns:
+        QuotesStorage object (not initialized, see QuotesStorage.init)
+
+    Raises:
+        ValueError: If the kind is unknown or its parameters are missing
+    """
+    if kind == 'clickhouse':
+        if not clickhouse_params:
+            raise ValueError("clickhouse_params must be provided and cannot be empty")
+        from .clickhouse_storage import ClickHouseStorage
+        return ClickHouseStorage(clickhouse_params)
+    if kind == 'memmap':
+        if not path:
+            raise ValueError("path of memmap storage must be provided")
+        from .memmap_storage import MemmapStorage
+        return MemmapStorage(path)
+    raise ValueError(f"Unknown quotes storage: {kind}")
+
+
+def migrate_storage(storage: QuotesStorage, redis_client) -> None:
+    """
+    Migrate the schema of a storage under a Redis lock.
+
+    Processes starting at the same time (service workers, backfill jobs) must not
+    run migrations concurrently. The lock serializes them, and the storage reads
+    the applied version under the lock, so each migration runs once.
+
+    Args:
+        storage: QuotesStorage object
+        redis_client: Synchronous Redis client
+
+    Raises:
+        TimeoutError: If the lock is not acquired within SCHEMA_LOCK_TIMEOUT
+    """
+    lock = redis_client.lock(SCHEMA_LOCK_KEY, timeout=SCHEMA_LOCK_TIMEOUT, blocking_timeout=SCHEMA_LOCK_TIMEOUT)
+    if not lock.acquire():
+        raise TimeoutError(f"Schema lock {SCHEMA_LOCK_KEY} is not released within {SCHEMA_LOCK_TIMEOUT} seconds")
+    try:
+        storage.migrate(heartbeat=lock.reacquire)
+    finally:
+        lock.release()
@@ -0,0 +1,160 @@
+"""
+Streaming of large quote ranges through Redis streams.
+
+Protocol:
+    1. The service pushes a header to the response list of the request:
+       metadata with 'transport': 'stream', 'stream' (Redis stream key) and
+       'count' (number of bars).
+    2. The service adds chunks of at most chunk_bars bars to the stream:
+       {'data': frame of bar columns}. At most max_chunks chunks are unread,
+       the service waits while the client is behind.
+    3. The last entry is {'end': count} or {'error': message}.
+
+The client reads entries in order, deletes each one after reading and pushes
+an acknowledgement to the ack list of the stream (see ack_key). The service
+waits for acknowledgements with BLPOP, so a slow client costs no polling.
+"""
+from typing import Dict, Iterable, Iterator, AsyncIterator, Optional
+import logging
+import numpy as np
+from .bars import concat_bars
+from .frame import pack_frame, read_frame
+
+logger = logging.getLogger(__name__)
+
+
+def stream_key(response_prefix: str, request_id: str) -> str:
+    """Return name of the Redis stream of a request."""
+    return f"{response_prefix}:{request_id}:stream"
+
+
+def ack_key(key: str) -> str:
+    """Return name of the Redis list of acknowledgements of read chunks of a stream."""
+    return f"{key}:ack"
+
+
+def pack_chunk(bars: Dict[str, np.ndarray], codec: Optional[str] = None) -> memoryview:
+    """Pack bar columns of a chunk into a frame (see frame.py), compressed with codec if given."""
+    return pack_frame(bars, codec=codec)
+
+
+def unpack_chunk(data: bytes) -> Dict[str, np.ndarray]:
+    """Unpack bar columns packed with pack_chunk."""
+    return read_frame(data)
+
+
+def rechunk(blocks: Iterable[Dict[str, np.ndarray]], chunk_bars: int) -> Iterator[Dict[str, np.ndarray]]:
+    """
+    Split and join blocks of bars into chunks of chunk_bars bars (the last chunk may be smaller).
+
+    Args:
+        blocks: Sorted, non-overlapping blocks of bar columns in time order
+        chunk_bars: Number of bars in a chunk
+
+    Yields:
+        dict of bar columns
+    """
+    pending = []
+    pending_bars = 0
+    for block in blocks:
+        offset = 0
+        size = len(block['time'])
+        while offset < size:
+            take = min(chunk_bars - pending_bars, size - offset)
+            pending.append({name: column[offset:offset + take] for name, column in block.items()})
+            pending_bars += take
+            offset += take
+            if pending_bars == chunk_bars:
+                yield concat_bars(pending)
+                pending = []
+                pending_bars = 0
+    if pending:
+        yield concat_bars(pending)
+
+
+async def publish_stream(
+    redis_client,
+    key: str,
+    chunks: AsyncIterator[Dict[str, np.ndarray]],
+    max_chunks: int,
+    ttl: int,
+    codec: Optional[str] = None
+) -> int:
+    """
+    Add chunks to a Redis stream, waiting while max_chunks chunks are unread.
+
+    Args:
+        redis_client: Asynchronous Redis client
+        key: Redis stream key
+        chunks: Chunks of bar columns
+        max_chunks: Maximum number of unread chunks in the stream
+        ttl: Stream TTL in seconds; also the time to wait for the client to read a chunk
+        codec: Codec name to compress chunks with (see compression.py)
+
+    Returns:
+        Number of published bars
+
+    Raises:
+        TimeoutError: If the client doesn't read chunks within ttl seconds
+    """
+    count = 0
+    unread = 0
+    try:
+        async for chunk in chunks:
+            if unread >= max_chunks:
+                # Block until the client acknowledges a chunk
+                if await redis_client.blpop([ack_key(key)], timeout=ttl) is None:
+                    raise TimeoutError(f"Client didn't read stream {key} within {ttl} seconds")
+                unread -= 1
+            await redis_client.xadd(key, {'data': pack_chunk(chunk, codec)})
+            unread += 1
+            await redis_client.expire(key, ttl)
+            count += len(chunk['time'])
+    except Exception as e:
+        await redis_client.xadd(key, {'error': str(e)})
+        await redis_client.expire(key, ttl)
+        raise
+    await redis_client.xadd(key, {'end': count})
+    await redis_client.expire(key, ttl)
+    return count
+
+
+def read_stream(redis_client, key: str, timeout: int) -> Iterator[Dict[str, np.ndarray]]:
+    """
+    Read chunks of a Redis stream published by publish_stream.
+
+    Args:
+        redis_client: Synchronous Redis client
+        key: Redis stream key
+        timeout: Maximum time to wait for the next chunk in seconds
+
+    Yields:
+        dict of bar columns
+
+    Raises:
+        TimeoutError: If no chunk arrives within timeout
+        RuntimeError: If the service reports an error
+    """
+    last_id: Optional[bytes] = b'0-0'
+    try:
+        while True:
+            result = redis_client.xread({key: last_id}, count=16, block=int(timeout * 1000))
+            if not result:
+                raise TimeoutError(f"No data in stream {key} within {timeout} seconds")
+            _, entries = result[0]
+            for entry_id, fields in entries:
+                last_id = entry_id
+                if b'error' in fields:
+                    raise RuntimeError(fields[b'error'].decode())
+                if b'end' in fields:
+                    return
+                chunk = unpack_chunk(fields[b'data'])
+                # Free the place of the chunk for the service (see publish_stream)
+                pipe = redis_client.pipeline(transaction=False)
+                pipe.xdel(key, entry_id)
+                pipe.rpush(ack_key(key), 1)
+                pipe.expire(ack_key(key), max(int(timeout), 1))
+                pipe.execute()
+                yield chunk
+    finally:
+        redis_client.delete(key, ack_key(key))
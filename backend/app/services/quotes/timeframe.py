@@ -31,7 +31,11 @@ class Timeframe(IntEnum):
     def begin_of_tf(self, time):
         assert time is not None
         offset = 3 * TIME_UNITS_IN_ONE_DAY if self.value == self.t1w.value else 0
-        return ((np.datetime64(time, TIME_TYPE_UNIT).astype(np.int64) + offset) // self.value * self.value - offset).astype(TIME_TYPE)
+        if isinstance(time, np.ndarray):
+            time_units = time.astype(TIME_TYPE).astype(np.int64)
+        else:
+            time_units = np.datetime64(time, TIME_TYPE_UNIT).astype(np.int64)
+        return ((time_units + offset) // self.value * self.value - offset).astype(TIME_TYPE)
 
     def timedelta(self):
         return dt.timedelta(**{TIME_UNITS_NAME_FOR_TIMEDELTA: self.value})
@@ -4,6 +4,8 @@ Pytest configuration and shared fixtures.
 - Controls test ordering (test_quotes.py first).
 - Provides quotes_service fixture for tests requiring quotes server with test database.
 - Provides quotes_service_production fixture for performance tests with production database.
+- Provides make_bars fixture creating bar columns for unit tests.
+- Provides local_quotes_server fixture: QuotesServer with local storage, without Redis and ClickHouse.
 """
 import os
 import time
@@ -12,6 +14,7 @@ from pathlib import Path
 from typing import Dict
 
 import clickhouse_connect
+import numpy as np
 import pytest
 import redis
 from dotenv import load_dotenv
@@ -27,7 +30,10 @@ from app.core.config import (
     DEFAULT_REDIS_PORT,
 )
 from app.core.logger import setup_logging
+from app.services.quotes import server as quotes_server_module
 from app.services.quotes.client import QuotesClient
+from app.services.quotes.constants import TIME_TYPE
+from app.services.quotes.timeframe import Timeframe
 from app.services.quotes.server import start_quotes_service, stop_quotes_service, QuotesServer
 
 
@@ -251,3 +257,60 @@ def quotes_service_production():
     yield
     
     _teardown_quotes_service()
+
+
+@pytest.fixture
+def make_bars():
+    """
+    Factory of regular bars for tests that don't need the quotes service.
+    
+    The factory takes:
+        count: Number of bars
+        start: Time of the bar with index 0 (default: 2024-01-01 00:00)
+        timeframe: Step between bars (default: 1h)
+        offset: Index of the first bar, so that blocks of one series can be made separately
+        close: Close prices: None for the bar indexes, a number for constant prices or a sequence
+    
+    Open is close - 0.5, high and low are close +/- 1, volume is 1.
+    """
+    def make(count: int, start: str = '2024-01-01T00:00', timeframe: Timeframe = Timeframe.t1h, offset: int = 0, close=None):
+        index = offset + np.arange(count)
+        if close is None:
+            close = index.astype(np.float64)
+        elif np.isscalar(close):
+            close = np.full(count, close, dtype=np.float64)
+        else:
+            close = np.asarray(close, dtype=np.float64)
+        return {
+            'time': (np.datetime64(start, 'ms') + index * timeframe.timedelta64()).astype(TIME_TYPE),
+            'open': close - 0.5,
+            'high': close + 1.0,
+            'low': close - 1.0,
+            'close': close.copy(),
+            'volume': np.ones(count, dtype=np.float64),
+        }
+    
+    return make
+
+
+@pytest.fixture
+def local_quotes_server(tmp_path, monkeypatch):
+    """
+    QuotesServer storing bars in memory-mapped files in a temporary directory.
+    
+    Rate limiters are local to the process instead of shared through Redis,
+    so requests served by the server don't need Redis. Exchanges are created
+    by the exchange pool from ccxt, tests register stub exchange classes there.
+    """
+    monkeypatch.setattr(quotes_server_module, 'QUOTES_STORAGE', 'memmap')
+    monkeypatch.setattr(quotes_server_module, 'QUOTES_STORAGE_DIR', tmp_path / 'quotes')
+    QuotesServer._instance = None
+    QuotesServer._initialized = False
+    server = QuotesServer(redis_params={'host': 'localhost', 'port': DEFAULT_REDIS_PORT, 'db': 3}, clickhouse_params={})
+    server.redis_client = None
+    
+    yield server
+    
+    server.db_executor.shutdown(wait=True)
+    QuotesServer._instance = None
+    QuotesServer._initialized = False
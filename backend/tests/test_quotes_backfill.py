@@ -0,0 +1,80 @@
+"""
+Tests for planning of backfill jobs of quotes service and detection of interrupted jobs.
+"""
+from datetime import datetime, UTC
+
+import pytest
+
+from app.services.quotes.backfill import get_backfill_job, job_key, lock_key, parse_item, plan_chunks
+from app.services.quotes.exceptions import R2D2QuotesException
+from app.services.quotes.timeframe import Timeframe
+
+
+def test_plan_chunks_splits_gaps():
+    gaps = [
+        (datetime(2024, 1, 1, 0, 0, tzinfo=UTC), datetime(2024, 1, 1, 0, 9, tzinfo=UTC)),
+        (datetime(2024, 1, 2, 0, 0, tzinfo=UTC), datetime(2024, 1, 2, 0, 0, tzinfo=UTC)),
+    ]
+
+    chunks = plan_chunks(gaps, Timeframe.t1m, chunk_bars=4)
+
+    assert [(start.strftime('%d %H:%M'), end.strftime('%d %H:%M')) for start, end in chunks] == [
+        ('01 00:00', '01 00:03'),
+        ('01 00:04', '01 00:07'),
+        ('01 00:08', '01 00:09'),
+        ('02 00:00', '02 00:00'),
+    ]
+
+
+def test_parse_item_normalizes_dates():
+    item = parse_item({'source': 'binance', 'symbol': 'BTC/USDT', 'timeframe': '1h',
+                       'start': '2024-01-01', 'end': '2024-02-01T03:00:00+03:00'})
+
+    assert item == {
+        'source': 'binance',
+        'symbol': 'BTC/USDT',
+        'timeframe': '1h',
+        'start': '2024-01-01T00:00:00+00:00',
+        'end': '2024-02-01T00:00:00+00:00',
+    }
+
+
+@pytest.mark.parametrize('changes', [
+    {'symbol': ''},
+    {'timeframe': '7m'},
+    {'start': 'yesterday'},
+    {'start': '2024-03-01'},
+])
+def test_parse_item_rejects_invalid_items(changes):
+    item = {'source': 'binance', 'symbol': 'BTC/USDT', 'timeframe': '1h', 'start': '2024-01-01', 'end': '2024-02-01'}
+
+    with pytest.raises(R2D2QuotesException):
+        parse_item({**item, **changes})
+
+
+class JobRedis:
+    """Synchronous Redis client with the state of one job."""
+
+    def __init__(self, state, keys=()):
+        self.state = state
+        self.keys = set(keys)
+
+    def hgetall(self, key):
+        return self.state if key == job_key('job') else {}
+
+    def scard(self, key):
+        return 0
+
+    def exists(self, key):
+        return int(key in self.keys)
+
+
+@pytest.mark.parametrize('locked, status', [(True, 'running'), (False, 'interrupted')])
+def test_running_job_without_lock_is_interrupted(locked, status):
+    state = {b'items': b'[]', b'status': b'running', b'chunks_done': b'3'}
+    redis_client = JobRedis(state, keys=[lock_key('job')] if locked else [])
+
+    job = get_backfill_job(redis_client, 'job')
+
+    assert job['status'] == status
+    assert job['chunks_done'] == 3
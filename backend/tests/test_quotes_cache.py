@@ -0,0 +1,116 @@
+"""
+Tests for in-process bar cache of quotes service and the bar column helpers it uses.
+"""
+import numpy as np
+
+from app.services.quotes.bars import merge_bars, concat_bars, slice_bars, select_columns, bars_nbytes
+from app.services.quotes.cache import QuotesCache
+from app.services.quotes.constants import TIME_TYPE
+from app.services.quotes.timeframe import Timeframe
+
+
+def test_merge_bars_deduplicates_and_sorts(make_bars):
+    first = make_bars(5, '2024-01-01T00:00', close=1.0)
+    second = make_bars(5, '2024-01-01T03:00', close=2.0)
+
+    merged = merge_bars(first, second)
+
+    assert len(merged['time']) == 8
+    assert np.all(np.diff(merged['time']) > np.timedelta64(0, 'ms'))
+    # Overlapping bars are taken from second set
+    assert np.all(merged['close'][3:] == 2.0)
+    assert np.all(merged['close'][:3] == 1.0)
+
+
+def test_merge_bars_disjoint(make_bars):
+    first = make_bars(3, '2024-01-02T00:00')
+    second = make_bars(3, '2024-01-01T00:00')
+
+    merged = merge_bars(first, second)
+
+    assert len(merged['time']) == 6
+    assert merged['time'][0] == np.datetime64('2024-01-01T00:00', 'ms')
+
+
+def test_concat_bars_orders_pages(make_bars):
+    pages = [
+        make_bars(2, '2024-01-01T10:00', close=3.0),
+        make_bars(3, '2024-01-01T00:00', close=1.0),
+        make_bars(0, '2024-01-01T05:00'),
+        make_bars(2, '2024-01-01T05:00', close=2.0),
+    ]
+
+    bars = concat_bars(pages)
+
+    assert len(bars['time']) == 7
+    assert np.all(np.diff(bars['time']) > np.timedelta64(0, 'ms'))
+    assert list(bars['close']) == [1.0, 1.0, 1.0, 2.0, 2.0, 3.0, 3.0]
+    assert len(concat_bars([])['time']) == 0
+
+
+def test_select_columns_projects_and_converts(make_bars):
+    bars = make_bars(4, '2024-01-01T00:00', close=1.5)
+
+    selected = select_columns(bars, ['time', 'close'], 'float32')
+
+    assert list(selected) == ['time', 'close']
+    assert selected['time'].dtype == TIME_TYPE
+    assert selected['close'].dtype == np.float32
+    assert np.all(selected['close'] == 1.5)
+    # Merging a projection keeps only the common columns
+    assert list(merge_bars(select_columns(bars, ['time', 'close']), bars)) == ['time', 'close']
+
+
+def test_cache_hit_inside_covered_range(make_bars):
+    cache = QuotesCache(max_bytes=10 * 1024 * 1024)
+    key = ('binance', 'BTC/USDT', Timeframe.t1h)
+    bars = make_bars(24, '2024-01-01T00:00')
+
+    cache.put(key, bars['time'][0], bars['time'][-1], bars)
+
+    result = cache.get(key, np.datetime64('2024-01-01T05:00', 'ms'), np.datetime64('2024-01-01T10:00', 'ms'))
+    assert result is not None
+    assert len(result['time']) == 6
+    assert cache.get(key, np.datetime64('2024-01-01T05:00', 'ms'), np.datetime64('2024-01-02T10:00', 'ms')) is None
+
+
+def test_cache_merges_adjacent_ranges(make_bars):
+    cache = QuotesCache(max_bytes=10 * 1024 * 1024)
+    key = ('binance', 'BTC/USDT', Timeframe.t1h)
+    first = make_bars(10, '2024-01-01T00:00')
+    second = make_bars(10, '2024-01-01T10:00')
+
+    cache.put(key, first['time'][0], first['time'][-1], first)
+    cache.put(key, second['time'][0], second['time'][-1], second)
+
+    result = cache.get(key, first['time'][0], second['time'][-1])
+    assert result is not None
+    assert len(result['time']) == 20
+    assert cache.total_bytes == bars_nbytes(result)
+
+
+def test_cache_evicts_least_recently_used(make_bars):
+    bars = make_bars(100, '2024-01-01T00:00')
+    size = bars_nbytes(bars)
+    cache = QuotesCache(max_bytes=size * 2)
+    keys = [('binance', symbol, Timeframe.t1h) for symbol in ('A/USDT', 'B/USDT', 'C/USDT')]
+
+    cache.put(keys[0], bars['time'][0], bars['time'][-1], bars)
+    cache.put(keys[1], bars['time'][0], bars['time'][-1], bars)
+    # Touch first key so the second becomes least recently used
+    assert cache.get(keys[0], bars['time'][0], bars['time'][-1]) is not None
+    cache.put(keys[2], bars['time'][0], bars['time'][-1], bars)
+
+    assert cache.total_bytes <= cache.max_bytes
+    assert cache.get(keys[0], bars['time'][0], bars['time'][-1]) is not None
+    assert cache.get(keys[1], bars['time'][0], bars['time'][-1]) is None
+    assert cache.get(keys[2], bars['time'][0], bars['time'][-1]) is not None
+
+
+def test_slice_bars_returns_views(make_bars):
+    bars = make_bars(10, '2024-01-01T00:00')
+
+    result = slice_bars(bars, np.datetime64('2024-01-01T02:00', 'ms'), np.datetime64('2024-01-01T04:30', 'ms'))
+
+    assert len(result['time']) == 3
+    assert np.shares_memory(result['close'], bars['close'])
@@ -0,0 +1,84 @@
+"""
+Tests for the ClickHouse clients pool of quotes service.
+"""
+import threading
+
+import pytest
+
+from app.services.quotes.clickhouse_pool import ClickHousePool, with_connection
+
+
+class FakeClient:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_connection_is_reentrant_in_thread():
+    pool = ClickHousePool(FakeClient, size=1, timeout=0.1)
+
+    with pool.connection() as outer:
+        with pool.connection() as inner:
+            assert inner is outer
+            assert pool.current() is outer
+    assert pool.current() is None
+
+
+def test_concurrent_threads_get_separate_clients():
+    pool = ClickHousePool(FakeClient, size=2, timeout=1)
+    barrier = threading.Barrier(2)
+    clients = []
+
+    def work():
+        with pool.connection() as client:
+            clients.append(client)
+            barrier.wait()
+
+    threads = [threading.Thread(target=work) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert clients[0] is not clients[1]
+    # Released clients are reused
+    with pool.connection() as client:
+        assert client in clients
+
+
+def test_pool_is_bounded():
+    pool = ClickHousePool(FakeClient, size=1, timeout=0.05)
+
+    with pool.borrow():
+        with pytest.raises(TimeoutError):
+            with pool.borrow():
+                pass
+    with pool.borrow():
+        pass
+
+
+def test_close_closes_idle_clients():
+    pool = ClickHousePool(FakeClient, size=2)
+    with pool.borrow() as client:
+        pass
+
+    pool.close()
+
+    assert client.closed
+
+
+def test_with_connection_holds_client_during_call():
+    class Store:
+        def __init__(self):
+            self.clickhouse_pool = ClickHousePool(FakeClient, size=1)
+
+        @with_connection
+        def read(self):
+            return self.clickhouse_pool.current()
+
+    store = Store()
+
+    assert isinstance(store.read(), FakeClient)
+    assert store.clickhouse_pool.current() is None
@@ -0,0 +1,183 @@
+"""
+Tests for queries of ClickHouse storage of quotes service.
+
+Queries go to a recording client instead of a server.
+"""
+from datetime import datetime, UTC
+
+import numpy as np
+import pytest
+
+from app.services.quotes import clickhouse_storage
+from app.services.quotes.bars import PRICE_COLUMNS
+from app.services.quotes.clickhouse_storage import ClickHouseStorage
+from app.services.quotes.timeframe import Timeframe
+
+
+class Result:
+    def __init__(self, rows):
+        self.result_rows = rows
+
+
+class RecordingClient:
+    """Client recording calls; queries return rows, or the next of responses while there are any."""
+
+    def __init__(self, rows=(), responses=()):
+        self.rows = list(rows)
+        self.responses = list(responses)
+        self.calls = []
+
+    def query(self, query):
+        self.calls.append(('query', ' '.join(query.split())))
+        return Result(self.responses.pop(0) if self.responses else self.rows)
+
+    def insert(self, table, data, column_names):
+        self.calls.append(('insert', table, data))
+
+    def raw_insert(self, table, column_names, insert_block, fmt):
+        self.calls.append(('raw_insert', table, column_names, insert_block, fmt))
+
+    def command(self, command):
+        self.calls.append(('command', ' '.join(command.split())))
+
+    def query_np_stream(self, query, settings):
+        return Stream()
+
+
+class Stream:
+    """Result stream of one block of one bar."""
+
+    def __enter__(self):
+        block = np.zeros(1, dtype=[('time', 'datetime64[ms]')] + [(name, 'f8') for name in PRICE_COLUMNS])
+        return iter([block])
+
+    def __exit__(self, *exc):
+        return False
+
+
+def make_storage(client):
+    storage = ClickHouseStorage({'host': 'localhost', 'port': 8123, 'username': 'default', 'database': 'test'})
+    storage.connect_database = lambda database=None: client
+    return storage
+
+
+def ms(value: str) -> int:
+    return int(np.datetime64(value, 'ms').astype(np.int64))
+
+
+def test_write_bars_inserts_one_native_block(make_bars):
+    client = RecordingClient()
+    storage = make_storage(client)
+    bars = make_bars(3)
+
+    storage.write_bars('binance', 'BTC/USDT', Timeframe.t1h, bars)
+
+    [(method, table, column_names, block, fmt)] = client.calls
+    assert (method, table, fmt) == ('raw_insert', 'quotes', 'Native')
+    assert column_names == ['source', 'symbol', 'timeframe', 'time'] + list(PRICE_COLUMNS)
+    # Columns are the bytes of the arrays, the key is a constant column
+    block = bytes(block)
+    assert block.count(b'BTC/USDT') == 1
+    for name in ['time'] + list(PRICE_COLUMNS):
+        assert bars[name].tobytes() in block
+
+
+def test_add_coverage_only_inserts():
+    client = RecordingClient()
+    storage = make_storage(client)
+
+    storage.add_coverage('binance', 'BTC/USDT', Timeframe.t1h,
+                         np.datetime64('2024-01-01T00:00', 'ms'), np.datetime64('2024-01-02T00:00', 'ms'))
+
+    assert [call[0] for call in client.calls] == ['insert']
+    assert client.calls[0][2] == [['binance', 'BTC/USDT', '1h', 1704067200000, 1704153600000]]
+
+
+def test_coverage_is_compacted_every_compact_rows_inserts(monkeypatch):
+    monkeypatch.setattr(clickhouse_storage, 'QUOTES_COVERAGE_COMPACT_ROWS', 3)
+    # Rows of an interval that grew at its start and of a touching interval, and a separate interval
+    client = RecordingClient(rows=[
+        (ms('2024-01-01T05:00'), ms('2024-01-01T10:00')),
+        (ms('2024-01-01T00:00'), ms('2024-01-01T10:00')),
+        (ms('2024-01-01T11:00'), ms('2024-01-01T12:00')),
+        (ms('2024-01-02T00:00'), ms('2024-01-02T05:00')),
+    ])
+    storage = make_storage(client)
+
+    for _ in range(3):
+        storage.add_coverage('binance', 'BTC/USDT', Timeframe.t1h,
+                             np.datetime64('2024-01-02T00:00', 'ms'), np.datetime64('2024-01-02T05:00', 'ms'))
+
+    assert [call[0] for call in client.calls] == ['insert', 'insert', 'insert', 'query', 'insert', 'command']
+    assert client.calls[4][2] == [['binance', 'BTC/USDT', '1h', ms('2024-01-01T00:00'), ms('2024-01-01T12:00')]]
+    assert client.calls[5][1] == (
+        "ALTER TABLE quotes_coverage DELETE WHERE source = 'binance' AND symbol = 'BTC/USDT' AND timeframe = '1h' "
+        "AND (toUnixTimestamp64Milli(time_start), toUnixTimestamp64Milli(time_end)) IN "
+        f"(({ms('2024-01-01T00:00')}, {ms('2024-01-01T10:00')}), ({ms('2024-01-01T05:00')}, {ms('2024-01-01T10:00')}), "
+        f"({ms('2024-01-01T11:00')}, {ms('2024-01-01T12:00')}))"
+    )
+
+    # The counter starts again after compaction
+    storage.add_coverage('binance', 'BTC/USDT', Timeframe.t1h,
+                         np.datetime64('2024-01-02T00:00', 'ms'), np.datetime64('2024-01-02T05:00', 'ms'))
+    assert [call[0] for call in client.calls[6:]] == ['insert']
+
+
+def test_compaction_without_subsumed_rows_writes_nothing():
+    client = RecordingClient(rows=[
+        (ms('2024-01-01T00:00'), ms('2024-01-01T10:00')),
+        (ms('2024-01-02T00:00'), ms('2024-01-02T05:00')),
+    ])
+    storage = make_storage(client)
+
+    storage.compact_coverage('binance', 'BTC/USDT', Timeframe.t1h)
+
+    assert [call[0] for call in client.calls] == ['query']
+
+
+def test_ensure_coverage_compacts_keys_with_many_rows(monkeypatch):
+    monkeypatch.setattr(clickhouse_storage, 'QUOTES_COVERAGE_COMPACT_ROWS', 1)
+    client = RecordingClient(responses=[
+        [(2, 10)],
+        [(ms('2024-01-01T00:00'), ms('2024-01-01T10:00')), (ms('2024-01-01T05:00'), ms('2024-01-01T10:00'))],
+    ])
+    storage = make_storage(client)
+
+    storage.ensure_coverage('binance', 'BTC/USDT', Timeframe.t1h)
+
+    # The merged interval is a stored row already, only the subsumed row is deleted
+    assert [call[0] for call in client.calls] == ['query', 'query', 'command']
+    assert client.calls[2][1].endswith(f"IN (({ms('2024-01-01T05:00')}, {ms('2024-01-01T10:00')}))")
+
+
+def test_get_coverage_reads_final_rows():
+    client = RecordingClient(rows=[(1704067200000, 1704153600000)])
+    storage = make_storage(client)
+    storage._coverage_checked.add(('binance', 'BTC/USDT', Timeframe.t1h))
+
+    coverage = storage.get_coverage('binance', 'BTC/USDT', Timeframe.t1h,
+                                    np.datetime64('2024-01-01T00:00', 'ms'), np.datetime64('2024-01-01T05:00', 'ms'))
+
+    assert coverage == [(np.datetime64('2024-01-01T00:00', 'ms'), np.datetime64('2024-01-02T00:00', 'ms'))]
+    assert 'FROM quotes_coverage FINAL' in client.calls[0][1]
+
+
+def test_streams_dont_take_clients_of_calls():
+    storage = make_storage(RecordingClient())
+    storage.stream_pool.timeout = 0.01
+    start, end = datetime(2024, 1, 1, tzinfo=UTC), datetime(2024, 1, 2, tzinfo=UTC)
+
+    # Started streams hold their clients until they are read or closed
+    streams = [storage.iter_bars('binance', 'BTC/USDT', Timeframe.t1h, start, end, 100) for _ in range(storage.stream_pool.size + 1)]
+    for stream in streams[:-1]:
+        assert len(next(stream)['time']) == 1
+    with pytest.raises(TimeoutError):
+        next(streams[-1])
+
+    # Ordinary calls still get clients
+    storage.clickhouse_pool.timeout = 0.01
+    storage.add_coverage('binance', 'BTC/USDT', Timeframe.t1h, np.datetime64('2024-01-01T00:00', 'ms'), np.datetime64('2024-01-01T01:00', 'ms'))
+
+    for stream in streams[:-1]:
+        stream.close()
+    assert len(next(storage.iter_bars('binance', 'BTC/USDT', Timeframe.t1h, start, end, 100))['time']) == 1
@@ -0,0 +1,144 @@
+"""
+Tests for coalescing of identical and overlapping requests in QuotesServer.get_quotes.
+
+Bars come from a stub exchange and are stored in memory-mapped files.
+"""
+import asyncio
+from datetime import datetime, timedelta, UTC
+
+import ccxt.async_support as ccxt
+import numpy as np
+import pytest
+
+from app.services.quotes import exchange_pool, server as quotes_server_module
+from app.services.quotes.bars import to_datetime64
+from app.services.quotes.timeframe import Timeframe
+
+SOURCE = 'stubexchange'
+SYMBOL = 'BTC/USDT'
+TF = Timeframe.t1h
+START = datetime(2024, 1, 1, tzinfo=UTC)
+# 1500 bars: two pages of fetch_bar_async
+END = START + timedelta(hours=1499)
+
+
+class StubExchange:
+    """ccxt exchange returning hourly bars with close equal to the bar index since 2024-01-01."""
+
+    rateLimit = 1
+    calls = []
+    error = None
+
+    def __init__(self, config):
+        self.markets = {}
+
+    async def load_markets(self, reload=False):
+        return self.markets
+
+    async def close(self):
+        pass
+
+    async def fetch_ohlcv(self, symbol, timeframe, since, limit):
+        StubExchange.calls.append(since)
+        # Let other requests start while this one is in flight
+        await asyncio.sleep(0.05)
+        if StubExchange.error is not None:
+            raise StubExchange.error
+        step_ms = 3600 * 1000
+        first_ms = int(START.timestamp() * 1000)
+        return [
+            [time_ms, 0.0, 0.0, 0.0, float((time_ms - first_ms) // step_ms), 1.0]
+            for time_ms in range(since, since + limit * step_ms, step_ms)
+        ]
+
+
+@pytest.fixture
+def server(local_quotes_server, monkeypatch):
+    StubExchange.calls = []
+    StubExchange.error = None
+    monkeypatch.setattr(exchange_pool.ccxt, SOURCE, StubExchange, raising=False)
+    monkeypatch.setattr(quotes_server_module, 'QUOTES_FETCH_RETRY_ATTEMPTS', 1)
+    # Count flights: requests joining a flight don't load the range themselves
+    local_quotes_server.loads = 0
+    load_quotes = local_quotes_server._load_quotes
+
+    async def counting_load_quotes(*args, **kwargs):
+        local_quotes_server.loads += 1
+        return await load_quotes(*args, **kwargs)
+
+    monkeypatch.setattr(local_quotes_server, '_load_quotes', counting_load_quotes)
+    return local_quotes_server
+
+
+def expected_close(date_start: datetime, date_end: datetime) -> list:
+    hours = int((date_end - START) / timedelta(hours=1))
+    return [float(index) for index in range(int((date_start - START) / timedelta(hours=1)), hours + 1)]
+
+
+def test_identical_and_contained_requests_share_one_fetch(server):
+    sub_start, sub_end = START + timedelta(hours=100), START + timedelta(hours=200)
+
+    async def run():
+        results = await asyncio.gather(
+            *(server.get_quotes(SOURCE, SYMBOL, TF, START, END) for _ in range(5)),
+            server.get_quotes(SOURCE, SYMBOL, TF, sub_start, sub_end),
+        )
+        await server.ingest.close()
+        return results
+
+    results = asyncio.run(run())
+
+    assert server.loads == 1
+    # One call per page of the range
+    assert sorted(StubExchange.calls) == [int(START.timestamp() * 1000), int((START + timedelta(hours=1000)).timestamp() * 1000)]
+    for bars in results[:5]:
+        assert bars['close'].tolist() == expected_close(START, END)
+        assert np.array_equal(bars['time'], results[0]['time'])
+    assert results[5]['close'].tolist() == expected_close(sub_start, sub_end)
+    assert results[5]['time'][0] == to_datetime64(sub_start)
+    assert server._inflight == {}
+
+
+def test_overlapping_request_fetches_only_missing_bars(server):
+    early_start, early_end = START - timedelta(hours=100), START + timedelta(hours=100)
+
+    async def run():
+        results = await asyncio.gather(
+            server.get_quotes(SOURCE, SYMBOL, TF, START, END),
+            server.get_quotes(SOURCE, SYMBOL, TF, early_start, early_end),
+        )
+        await server.ingest.close()
+        return results
+
+    full, early = asyncio.run(run())
+
+    # Whichever request locks its gap first, the other one fetches only the rest:
+    # 1600 bars in two pages of the first and one page of the second
+    assert len(StubExchange.calls) == 3
+    assert full['close'].tolist() == expected_close(START, END)
+    assert early['close'].tolist() == expected_close(early_start, early_end)
+    assert server._inflight == {}
+
+
+def test_failed_request_fails_all_callers_and_is_forgotten(server):
+    StubExchange.error = ccxt.ExchangeError('exchange is down')
+
+    async def run():
+        results = await asyncio.gather(
+            *(server.get_quotes(SOURCE, SYMBOL, TF, START, END) for _ in range(3)),
+            return_exceptions=True,
+        )
+        inflight_after_error = dict(server._inflight)
+        # The next request starts a new flight and fetches the range again
+        StubExchange.error = None
+        bars = await server.get_quotes(SOURCE, SYMBOL, TF, START, END)
+        await server.ingest.close()
+        return results, inflight_after_error, bars
+
+    results, inflight_after_error, bars = asyncio.run(run())
+
+    assert all(isinstance(result, ccxt.ExchangeError) for result in results)
+    assert server.loads == 2
+    assert inflight_after_error == {}
+    assert bars['close'].tolist() == expected_close(START, END)
+    assert server._inflight == {}
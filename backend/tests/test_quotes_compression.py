@@ -0,0 +1,70 @@
+"""
+Tests for compressed column encodings of quote frames.
+"""
+import numpy as np
+import pytest
+
+from app.services.quotes.compression import (
+    available_codecs, choose_codec, encode_column, decode_column, TIME_DELTA, DECIMAL
+)
+from app.services.quotes.frame import write_frame, read_frame
+from app.services.quotes.timeframe import Timeframe
+
+
+def irregular_bars(make_bars, count: int):
+    """Minute bars of a random walk with three missing bars."""
+    rng = np.random.default_rng(1)
+    close = np.round(100.0 + np.cumsum(rng.normal(0, 0.1, count)), 2)
+    bars = make_bars(count, timeframe=Timeframe.t1m, close=close)
+    return {name: np.delete(column, [3, 4, count // 2]) for name, column in bars.items()}
+
+
+@pytest.mark.parametrize('codec', available_codecs())
+def test_compressed_frame_round_trip(codec, make_bars):
+    bars = irregular_bars(make_bars, 10000)
+
+    frame = write_frame(bars, codec=codec)
+    received = read_frame(bytes(frame))
+
+    assert len(frame) < len(write_frame(bars)) / 2
+    for name in bars:
+        assert received[name].dtype == bars[name].dtype
+        assert np.array_equal(received[name], bars[name])
+
+
+def test_time_column_is_delta_encoded(make_bars):
+    time_array = irregular_bars(make_bars, 100000)['time']
+
+    encoding, payload = encode_column(time_array, 'zlib')
+
+    assert encoding & TIME_DELTA
+    # Three missing bars are the only exceptions of the regular grid
+    assert len(payload) < 200
+    assert np.array_equal(decode_column(payload, encoding, time_array.dtype, len(time_array)), time_array)
+
+
+def test_decimal_encoding_is_lossless():
+    prices = np.array([0.1, 0.2, 0.30000000000000004, 1e-8, 123456.78], dtype=np.float64)
+    ticks = np.array([0.12, -3.5, 7.25, 0.0], dtype=np.float64)
+
+    encoding, payload = encode_column(prices, 'zlib')
+    assert not encoding & DECIMAL
+    assert np.array_equal(decode_column(payload, encoding, prices.dtype, len(prices)), prices)
+
+    encoding, payload = encode_column(ticks, 'zlib')
+    assert encoding & DECIMAL
+    assert np.array_equal(decode_column(payload, encoding, ticks.dtype, len(ticks)), ticks)
+
+
+def test_nan_values_survive():
+    values = np.array([1.5, np.nan, 2.5], dtype=np.float64)
+
+    encoding, payload = encode_column(values, 'zlib')
+
+    assert np.array_equal(decode_column(payload, encoding, values.dtype, 3), values, equal_nan=True)
+
+
+def test_choose_codec():
+    assert choose_codec(['unknown', 'zlib']) == 'zlib'
+    assert choose_codec(['unknown']) is None
+    assert choose_codec(None) is None
@@ -0,0 +1,105 @@
+"""
+Tests for coverage interval arithmetic used by gap detection.
+"""
+import numpy as np
+
+from app.services.quotes.coverage import merge_intervals, subtract_intervals, intersect_intervals, intervals_from_times, find_empty_intervals
+from app.services.quotes.timeframe import Timeframe
+
+
+def t(value: str) -> np.datetime64:
+    return np.datetime64(value, 'ms')
+
+
+STEP = Timeframe.t1h.timedelta64()
+
+
+def test_merge_intervals_joins_contiguous():
+    intervals = [
+        (t('2024-01-01T05:00'), t('2024-01-01T08:00')),
+        (t('2024-01-01T00:00'), t('2024-01-01T04:00')),
+        (t('2024-01-01T10:00'), t('2024-01-01T12:00')),
+    ]
+
+    assert merge_intervals(intervals, STEP) == [
+        (t('2024-01-01T00:00'), t('2024-01-01T08:00')),
+        (t('2024-01-01T10:00'), t('2024-01-01T12:00')),
+    ]
+
+
+def test_subtract_intervals_without_coverage():
+    gaps = subtract_intervals(t('2024-01-01T00:00'), t('2024-01-01T22:00'), [], STEP)
+
+    assert gaps == [(t('2024-01-01T00:00'), t('2024-01-01T22:00'))]
+
+
+def test_subtract_intervals_finds_all_gaps():
+    covered = [
+        (t('2024-01-01T02:00'), t('2024-01-01T04:00')),
+        (t('2024-01-01T08:00'), t('2024-01-01T10:00')),
+    ]
+
+    gaps = subtract_intervals(t('2024-01-01T00:00'), t('2024-01-01T22:00'), covered, STEP)
+
+    assert gaps == [
+        (t('2024-01-01T00:00'), t('2024-01-01T01:00')),
+        (t('2024-01-01T05:00'), t('2024-01-01T07:00')),
+        (t('2024-01-01T11:00'), t('2024-01-01T22:00')),
+    ]
+
+
+def test_subtract_intervals_fully_covered():
+    covered = [(t('2024-01-01T00:00'), t('2024-01-02T00:00'))]
+
+    assert subtract_intervals(t('2024-01-01T03:00'), t('2024-01-01T05:00'), covered, STEP) == []
+
+
+def test_subtract_intervals_unaligned_bounds():
+    covered = [(t('2024-01-01T01:00'), t('2024-01-01T05:00'))]
+
+    # Range starts inside the bar before the first covered bar and ends inside the last covered bar
+    gaps = subtract_intervals(t('2024-01-01T00:30'), t('2024-01-01T05:59'), covered, STEP)
+
+    assert gaps == []
+
+
+def test_intervals_from_times():
+    time_array = np.array([
+        t('2024-01-01T00:00'), t('2024-01-01T01:00'), t('2024-01-01T02:00'),
+        t('2024-01-01T05:00'), t('2024-01-01T06:00'),
+        t('2024-01-01T09:00'),
+    ])
+
+    assert intervals_from_times(time_array, STEP) == [
+        (t('2024-01-01T00:00'), t('2024-01-01T02:00')),
+        (t('2024-01-01T05:00'), t('2024-01-01T06:00')),
+        (t('2024-01-01T09:00'), t('2024-01-01T09:00')),
+    ]
+    assert intervals_from_times(time_array[:0], STEP) == []
+
+
+def test_find_empty_intervals_before_listing_and_at_tail():
+    # Listing at 03:00, maintenance at 06:00, no bars after 08:00 yet
+    times = np.array([t('2024-01-01T03:00') + i * STEP for i in (0, 1, 2, 4, 5)])
+
+    empty = find_empty_intervals(t('2024-01-01T00:00'), t('2024-01-01T10:00'), times, STEP)
+
+    assert empty == [
+        ((t('2024-01-01T00:00'), t('2024-01-01T02:00')), True),
+        ((t('2024-01-01T06:00'), t('2024-01-01T06:00')), True),
+        ((t('2024-01-01T09:00'), t('2024-01-01T10:00')), False),
+    ]
+
+
+def test_find_empty_intervals_without_bars():
+    empty = find_empty_intervals(t('2024-01-01T00:00'), t('2024-01-01T02:00'), np.array([], dtype='datetime64[ms]'), STEP)
+
+    assert empty == [((t('2024-01-01T00:00'), t('2024-01-01T02:00')), False)]
+
+
+def test_intersect_intervals():
+    bounds = [(t('2024-01-01T00:00'), t('2024-01-01T05:00')), (t('2024-01-01T08:00'), t('2024-01-01T10:00'))]
+
+    parts = intersect_intervals([(t('2024-01-01T03:00'), t('2024-01-01T12:00')), (t('2024-01-01T06:00'), t('2024-01-01T07:00'))], bounds)
+
+    assert parts == [(t('2024-01-01T03:00'), t('2024-01-01T05:00')), (t('2024-01-01T08:00'), t('2024-01-01T10:00'))]
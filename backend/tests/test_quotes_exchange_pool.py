@@ -0,0 +1,190 @@
+"""
+Tests for the pool of long-lived exchange instances: reuse, idle eviction, health checks and closing.
+"""
+import asyncio
+import threading
+
+import ccxt.async_support as ccxt
+import msgpack
+import pytest
+
+from app.services.quotes import exchange_pool, server as quotes_server_module
+from app.services.quotes.exchange_pool import ExchangePool
+
+
+class StubExchange:
+    """ccxt exchange recording its instances and calls."""
+
+    instances = []
+    fail_reload = False
+
+    def __init__(self, config):
+        self.config = config
+        self.markets = None
+        self.loads = 0
+        self.closed = False
+        StubExchange.instances.append(self)
+
+    async def load_markets(self, reload=False):
+        if reload and StubExchange.fail_reload:
+            raise ccxt.NetworkError('connection reset')
+        self.loads += 1
+        self.markets = {'BTC/USDT': {}}
+        return self.markets
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.fixture(autouse=True)
+def stub_exchanges(monkeypatch):
+    StubExchange.instances = []
+    StubExchange.fail_reload = False
+    for name in ('stubone', 'stubtwo'):
+        monkeypatch.setattr(exchange_pool.ccxt, name, StubExchange, raising=False)
+
+
+async def borrow(pool, source):
+    async with pool.exchange(source) as exchange:
+        return exchange
+
+
+def test_instance_is_reused_per_source():
+    pool = ExchangePool(idle_timeout=60, health_check_interval=60)
+
+    async def run():
+        first = await borrow(pool, 'stubone')
+        # Concurrent requests share the instance
+        concurrent = await asyncio.gather(*(borrow(pool, 'StubOne') for _ in range(5)))
+        other = await borrow(pool, 'stubtwo')
+        return first, concurrent, other
+
+    first, concurrent, other = asyncio.run(run())
+
+    assert all(exchange is first for exchange in concurrent)
+    assert other is not first
+    assert len(StubExchange.instances) == 2
+    # Markets are loaded once, the built-in throttling is disabled
+    assert first.loads == 1
+    assert first.config == {'enableRateLimit': False}
+
+
+def test_idle_instances_are_evicted():
+    pool = ExchangePool(idle_timeout=0.05, health_check_interval=60)
+
+    async def run():
+        idle = await borrow(pool, 'stubone')
+        async with pool.exchange('stubtwo') as busy:
+            await asyncio.sleep(0.1)
+            await pool.evict_idle()
+        replacement = await borrow(pool, 'stubone')
+        return idle, busy, replacement
+
+    idle, busy, replacement = asyncio.run(run())
+
+    assert idle.closed
+    # Instances in use are not evicted
+    assert not busy.closed
+    assert replacement is not idle
+
+
+def test_failed_health_check_replaces_instance():
+    pool = ExchangePool(idle_timeout=60, health_check_interval=0)
+
+    async def run():
+        first = await borrow(pool, 'stubone')
+        StubExchange.fail_reload = True
+        second = await borrow(pool, 'stubone')
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert first.closed
+    assert second is not first and not second.closed
+
+
+def test_network_error_discards_instance():
+    pool = ExchangePool(idle_timeout=60, health_check_interval=60)
+
+    async def run():
+        with pytest.raises(ccxt.NetworkError):
+            async with pool.exchange('stubone') as exchange:
+                raise ccxt.NetworkError('timeout')
+        return exchange, await borrow(pool, 'stubone')
+
+    failed, replacement = asyncio.run(run())
+
+    assert failed.closed
+    assert replacement is not failed
+
+
+def test_close_all_closes_instances():
+    pool = ExchangePool(idle_timeout=60, health_check_interval=60)
+
+    async def run():
+        exchanges = [await borrow(pool, 'stubone'), await borrow(pool, 'stubtwo')]
+        await pool.close_all()
+        return exchanges
+
+    exchanges = asyncio.run(run())
+
+    assert all(exchange.closed for exchange in exchanges)
+    assert pool._entries == {}
+
+
+class BusyRedis:
+    """Redis client that always has a request (without request_id, so it is skipped)."""
+
+    async def brpop(self, key, timeout):
+        await asyncio.sleep(0.001)
+        return key, msgpack.packb({})
+
+
+class CountingPool:
+    """Exchange pool counting evictions, stops the service after the second one."""
+
+    def __init__(self, stop_event):
+        self.evictions = 0
+        self.stop_event = stop_event
+
+    async def evict_idle(self):
+        self.evictions += 1
+        if self.evictions == 2:
+            self.stop_event.set()
+
+    async def close_all(self):
+        pass
+
+
+class StubIngest:
+    async def close(self):
+        pass
+
+
+class StubStorage:
+    def close(self):
+        pass
+
+
+def test_busy_service_evicts_idle_instances(monkeypatch):
+    stop_event = threading.Event()
+    pool = CountingPool(stop_event)
+
+    class BusyServer:
+        def __init__(self, redis_params, clickhouse_params):
+            self.redis_client = BusyRedis()
+            self.exchange_pool = pool
+            self.ingest = StubIngest()
+            self.storage = StubStorage()
+
+    monkeypatch.setattr(quotes_server_module, 'QuotesServer', BusyServer)
+    monkeypatch.setattr(quotes_server_module, 'EXCHANGE_EVICT_INTERVAL', 0.02)
+    monkeypatch.setattr(quotes_server_module, 'reap_segments', lambda *args, **kwargs: None)
+
+    asyncio.run(asyncio.wait_for(
+        quotes_server_module.run_quotes_service({'host': 'localhost'}, {'host': 'localhost'}, stop_event=stop_event, clean_redis=False),
+        timeout=2,
+    ))
+
+    # Requests never stop coming, idle instances are still closed
+    assert pool.evictions == 2
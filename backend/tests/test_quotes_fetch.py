@@ -0,0 +1,104 @@
+"""
+Tests for fetching gaps from an exchange in pages (QuotesServer.fetch_bar_async).
+
+Bars come from a stub exchange and are stored in memory-mapped files.
+"""
+import asyncio
+from datetime import datetime, timedelta, UTC
+
+import numpy as np
+import pytest
+
+from app.services.quotes import exchange_pool, server as quotes_server_module
+from app.services.quotes.bars import to_datetime64
+from app.services.quotes.timeframe import Timeframe
+
+SOURCE = 'stubexchange'
+SYMBOL = 'BTC/USDT'
+TF = Timeframe.t1h
+START = datetime(2024, 1, 1, tzinfo=UTC)
+HOUR_MS = 3600 * 1000
+START_MS = int(START.timestamp() * 1000)
+
+
+class StubExchange:
+    """ccxt exchange returning hourly bars with close equal to the bar index since 2024-01-01."""
+
+    rateLimit = 1
+    calls = []
+
+    def __init__(self, config):
+        self.markets = {}
+
+    async def load_markets(self, reload=False):
+        return self.markets
+
+    async def close(self):
+        pass
+
+    async def fetch_ohlcv(self, symbol, timeframe, since, limit):
+        StubExchange.calls.append(since)
+        # Times of bars starting at since, as an exchange aligns them
+        first_ms = -(-since // HOUR_MS) * HOUR_MS
+        return [
+            [time_ms, 0.0, 0.0, 0.0, float((time_ms - START_MS) // HOUR_MS), 1.0]
+            for time_ms in range(first_ms, first_ms + limit * HOUR_MS, HOUR_MS)
+        ]
+
+
+@pytest.fixture
+def server(local_quotes_server, monkeypatch):
+    StubExchange.calls = []
+    monkeypatch.setattr(exchange_pool.ccxt, SOURCE, StubExchange, raising=False)
+    monkeypatch.setattr(quotes_server_module, 'QUOTES_FETCH_RETRY_ATTEMPTS', 1)
+    return local_quotes_server
+
+
+def get_quotes(server, history_start, history_end):
+    async def run():
+        bars = await server.get_quotes(SOURCE, SYMBOL, TF, history_start, history_end)
+        await server.ingest.close()
+        return bars
+
+    return asyncio.run(run())
+
+
+def test_unaligned_start_fetches_every_bar_of_all_pages(server):
+    # 2500 bars in three pages, the request starts inside the first hour
+    bars = get_quotes(server, START + timedelta(minutes=30), START + timedelta(hours=2500))
+
+    assert bars['close'].tolist() == [float(index) for index in range(1, 2501)]
+    # Pages start at bar boundaries
+    assert sorted(StubExchange.calls) == [START_MS + index * HOUR_MS for index in (1, 1001, 2001)]
+    assert server.find_gaps(SOURCE, SYMBOL, TF, START + timedelta(minutes=30), START + timedelta(hours=2500)) == []
+
+
+def test_only_requested_ranges_are_recorded_unavailable(server, make_bars, monkeypatch):
+    recorded = []
+    monkeypatch.setattr(server.storage, 'add_unavailable', lambda source, symbol, timeframe, ranges, checked_at: recorded.extend(ranges))
+    bars = make_bars(11, timeframe=TF)
+    bars = {name: np.delete(column, [2, 5]) for name, column in bars.items()}
+    hour = TF.timedelta64()
+    start = to_datetime64(START)
+
+    # Bar 5 is between the requests of the gap, the exchange was not asked for it
+    server.record_unavailable(SOURCE, SYMBOL, TF, [[(start, start + 4 * hour), (start + 6 * hour, start + 10 * hour)]], [bars])
+
+    assert recorded == [(start + 2 * hour, start + 2 * hour, 0)]
+
+
+def test_gap_grown_after_locking_is_fetched_only_inside_the_lock(server, make_bars, monkeypatch):
+    gap = (START, START + timedelta(hours=10))
+    # A bar closed while the gap was being locked
+    monkeypatch.setattr(server, 'find_gaps', lambda *args: [(START, START + timedelta(hours=11))])
+    fetched = []
+
+    async def fetch_bar_async(exchange, exchange_name, symbol, tf, time_start, time_end, max_bars):
+        fetched.append((time_start, time_end))
+        return exchange_name, symbol, tf, make_bars(0), []
+
+    monkeypatch.setattr(server, 'fetch_bar_async', fetch_bar_async)
+
+    asyncio.run(server._fill_gaps(SOURCE, SYMBOL, TF, START, START + timedelta(hours=11), [gap], read_filled=False))
+
+    assert fetched == [gap]
@@ -0,0 +1,61 @@
+"""
+Tests for the binary frame format of bar columns.
+"""
+import numpy as np
+import pytest
+from redis._parsers.encoders import Encoder
+
+from app.services.quotes.frame import write_frame, pack_frame, read_frame, is_frame, frame_size, ALIGNMENT
+
+
+def test_frame_round_trip(make_bars):
+    bars = make_bars(1000)
+
+    frame = write_frame(bars)
+    received = read_frame(bytes(frame))
+
+    assert is_frame(frame)
+    assert len(frame) == frame_size(bars)
+    assert list(received) == list(bars)
+    for name in bars:
+        assert received[name].dtype == bars[name].dtype
+        assert np.array_equal(received[name], bars[name])
+
+
+def test_pack_frame_is_a_redis_value(make_bars):
+    bars = make_bars(10)
+    encoder = Encoder('utf-8', 'strict', False)
+
+    # Redis clients (redis-py 5.0) reject bytearray values, memoryview is sent without a copy
+    for codec in (None, 'zlib'):
+        frame = pack_frame(bars, codec=codec)
+        assert type(frame) is memoryview
+        assert encoder.encode(frame) is frame
+        assert np.array_equal(read_frame(frame)['close'], bars['close'])
+
+
+def test_frame_columns_are_aligned_views(make_bars):
+    frame = write_frame(make_bars(10))
+
+    received = read_frame(frame)
+
+    base = np.frombuffer(frame, dtype=np.uint8).ctypes.data
+    for column in received.values():
+        assert (column.ctypes.data - base) % ALIGNMENT == 0
+    # Views, not copies
+    received['close'][0] = 42.0
+    assert read_frame(frame)['close'][0] == 42.0
+
+
+def test_frame_of_strided_and_empty_columns(make_bars):
+    bars = make_bars(20)
+    strided = {name: column[::2] for name, column in bars.items()}
+
+    assert np.array_equal(read_frame(write_frame(strided))['high'], bars['high'][::2])
+    assert len(read_frame(write_frame(make_bars(0)))['time']) == 0
+
+
+def test_not_a_frame():
+    with pytest.raises(ValueError):
+        read_frame(b'\x81\xa8metadata')
+    assert not is_frame(b'')
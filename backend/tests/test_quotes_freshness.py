@@ -0,0 +1,58 @@
+"""
+Tests for the freshness policy skipping tail gaps fetched a moment ago (QuotesServer._skip_fresh_gaps).
+"""
+import time
+from datetime import datetime, timedelta, UTC
+
+import pytest
+
+from app.services.quotes import server as quotes_server_module
+from app.services.quotes.bars import to_datetime64
+from app.services.quotes.timeframe import Timeframe
+
+SOURCE = 'binance'
+SYMBOL = 'BTC/USDT'
+TF = Timeframe.t1h
+TAIL_START = datetime(2024, 3, 1, 10, tzinfo=UTC)
+TAIL_END = datetime(2024, 3, 1, 12, tzinfo=UTC)
+# A gap inside the history, not fetched recently
+OLD_GAP = (datetime(2024, 2, 1, tzinfo=UTC), datetime(2024, 2, 1, 5, tzinfo=UTC))
+
+
+@pytest.fixture
+def server(local_quotes_server, monkeypatch):
+    monkeypatch.setattr(quotes_server_module, 'QUOTES_MIN_REFETCH_INTERVAL', 10)
+    return local_quotes_server
+
+
+def record_tail_fetch(server, seconds_ago: float):
+    server._tail_fetches[(SOURCE, SYMBOL, TF)] = (to_datetime64(TAIL_START), to_datetime64(TAIL_END), time.monotonic() - seconds_ago)
+
+
+def test_gaps_are_kept_without_tail_fetch(server):
+    gaps = [OLD_GAP, (TAIL_START, TAIL_END)]
+
+    assert server._skip_fresh_gaps(SOURCE, SYMBOL, TF, gaps) == gaps
+
+
+def test_tail_gap_is_skipped_inside_refetch_interval(server):
+    record_tail_fetch(server, seconds_ago=5)
+
+    gaps = server._skip_fresh_gaps(SOURCE, SYMBOL, TF, [OLD_GAP, (TAIL_START, TAIL_END), (TAIL_START + timedelta(hours=1), TAIL_END)])
+
+    assert gaps == [OLD_GAP]
+    # Other keys are not affected
+    assert server._skip_fresh_gaps(SOURCE, 'ETH/USDT', TF, [(TAIL_START, TAIL_END)]) == [(TAIL_START, TAIL_END)]
+
+
+def test_tail_gap_is_fetched_after_refetch_interval(server):
+    record_tail_fetch(server, seconds_ago=11)
+
+    assert server._skip_fresh_gaps(SOURCE, SYMBOL, TF, [(TAIL_START, TAIL_END)]) == [(TAIL_START, TAIL_END)]
+
+
+def test_tail_gap_is_fetched_when_a_new_bar_closes(server):
+    record_tail_fetch(server, seconds_ago=1)
+    longer_gap = (TAIL_START, TAIL_END + timedelta(hours=1))
+
+    assert server._skip_fresh_gaps(SOURCE, SYMBOL, TF, [longer_gap]) == [longer_gap]
@@ -0,0 +1,139 @@
+"""
+Tests for the write-behind ingest queue of fetched bars: batching, backpressure and errors.
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.services.quotes.ingest import IngestQueue
+from app.services.quotes.timeframe import Timeframe
+
+TF = Timeframe.t1h
+
+
+class RecordingSave:
+    """save_func recording saved batches as (symbol, bar counts of pages)."""
+
+    def __init__(self, fail_symbols=(), gate=None):
+        self.batches = []
+        self.fail_symbols = fail_symbols
+        self.gate = gate
+
+    def __call__(self, source, symbol, timeframe, pages):
+        if self.gate is not None:
+            self.gate.wait(timeout=5)
+        if symbol in self.fail_symbols:
+            raise OSError('disk is full')
+        self.batches.append((symbol, [len(page['time']) for page in pages]))
+
+
+def test_batches_are_flushed_at_batch_bars(make_bars):
+    save = RecordingSave()
+    queue = IngestQueue(save, batch_bars=10, flush_interval=10, max_pending=10)
+
+    async def run():
+        futures = [await queue.put('binance', 'BTC/USDT', TF, make_bars(5)) for _ in range(4)]
+        await asyncio.wait_for(asyncio.gather(*futures), timeout=1)
+        await queue.close()
+
+    asyncio.run(run())
+
+    assert save.batches == [('BTC/USDT', [5, 5]), ('BTC/USDT', [5, 5])]
+
+
+def test_batch_is_flushed_after_flush_interval(make_bars):
+    save = RecordingSave()
+    queue = IngestQueue(save, batch_bars=1000, flush_interval=0.05, max_pending=10)
+
+    async def run():
+        start = time.monotonic()
+        future = await queue.put('binance', 'BTC/USDT', TF, make_bars(5))
+        await asyncio.sleep(0.01)
+        saved_early = future.done()
+        await asyncio.wait_for(future, timeout=1)
+        elapsed = time.monotonic() - start
+        await queue.close()
+        return saved_early, elapsed
+
+    saved_early, elapsed = asyncio.run(run())
+
+    assert not saved_early
+    assert elapsed >= 0.05
+    assert save.batches == [('BTC/USDT', [5])]
+
+
+def test_pages_are_saved_with_one_call_per_key(make_bars):
+    save = RecordingSave()
+    queue = IngestQueue(save, batch_bars=1000, flush_interval=10, max_pending=10)
+
+    async def run():
+        futures = [
+            await queue.put('binance', symbol, TF, make_bars(count))
+            for symbol, count in (('BTC/USDT', 1), ('ETH/USDT', 2), ('BTC/USDT', 3))
+        ]
+        await queue.close()
+        return futures
+
+    futures = asyncio.run(run())
+
+    assert all(future.done() and future.exception() is None for future in futures)
+    assert sorted(save.batches) == [('BTC/USDT', [1, 3]), ('ETH/USDT', [2])]
+
+
+def test_put_waits_when_max_pending_pages_are_queued(make_bars):
+    gate = threading.Event()
+    save = RecordingSave(gate=gate)
+    queue = IngestQueue(save, batch_bars=1, flush_interval=10, max_pending=2)
+
+    async def run():
+        # The worker takes the first page and blocks in save_func, two more pages fill the queue
+        await queue.put('binance', 'BTC/USDT', TF, make_bars(1))
+        await asyncio.sleep(0.01)
+        for _ in range(2):
+            await asyncio.wait_for(queue.put('binance', 'BTC/USDT', TF, make_bars(1)), timeout=0.1)
+        blocked = asyncio.create_task(queue.put('binance', 'BTC/USDT', TF, make_bars(1)))
+        await asyncio.sleep(0.05)
+        was_blocked = not blocked.done()
+        gate.set()
+        future = await asyncio.wait_for(blocked, timeout=1)
+        await asyncio.wait_for(future, timeout=1)
+        await queue.close()
+        return was_blocked
+
+    assert asyncio.run(run())
+    assert len(save.batches) == 4
+
+
+def test_close_saves_queued_pages(make_bars):
+    save = RecordingSave()
+    queue = IngestQueue(save, batch_bars=1000, flush_interval=10, max_pending=10)
+
+    async def run():
+        futures = [await queue.put('binance', 'BTC/USDT', TF, make_bars(count)) for count in (2, 3)]
+        await asyncio.wait_for(queue.close(), timeout=1)
+        return futures
+
+    futures = asyncio.run(run())
+
+    assert all(future.done() for future in futures)
+    assert save.batches == [('BTC/USDT', [2, 3])]
+
+
+def test_failed_save_fails_every_page_of_the_key(make_bars):
+    save = RecordingSave(fail_symbols=('BTC/USDT',))
+    queue = IngestQueue(save, batch_bars=1000, flush_interval=10, max_pending=10)
+
+    async def run():
+        failed = [await queue.put('binance', 'BTC/USDT', TF, make_bars(count)) for count in (1, 2)]
+        saved = await queue.put('binance', 'ETH/USDT', TF, make_bars(3))
+        await queue.close()
+        for future in failed:
+            with pytest.raises(OSError):
+                await future
+        await saved
+
+    asyncio.run(run())
+
+    assert save.batches == [('ETH/USDT', [3])]
@@ -0,0 +1,54 @@
+"""
+Tests for interval locks used when filling gaps.
+"""
+import asyncio
+
+from app.services.quotes.locks import IntervalLockManager
+
+KEY = ('binance', 'BTC/USDT', '1h')
+
+
+async def hold(locks, intervals, events, name, delay=0.05):
+    async with locks.lock(KEY, intervals):
+        events.append(f'{name} start')
+        await asyncio.sleep(delay)
+        events.append(f'{name} end')
+
+
+def test_overlapping_intervals_are_serialized():
+    async def run():
+        locks = IntervalLockManager()
+        events = []
+        await asyncio.gather(
+            hold(locks, [(0, 10)], events, 'a'),
+            hold(locks, [(5, 20)], events, 'b'),
+        )
+        return events
+
+    assert asyncio.run(run()) == ['a start', 'a end', 'b start', 'b end']
+
+
+def test_disjoint_intervals_run_concurrently():
+    async def run():
+        locks = IntervalLockManager()
+        events = []
+        await asyncio.gather(
+            hold(locks, [(0, 10)], events, 'a'),
+            hold(locks, [(11, 20), (30, 40)], events, 'b'),
+        )
+        return events
+
+    assert asyncio.run(run()) == ['a start', 'b start', 'a end', 'b end']
+
+
+def test_idle_keys_are_removed():
+    async def run():
+        locks = IntervalLockManager()
+        events = []
+        await asyncio.gather(
+            hold(locks, [(0, 10)], events, 'a'),
+            hold(locks, [(0, 10)], events, 'b'),
+        )
+        return len(locks)
+
+    assert asyncio.run(run()) == 0
@@ -0,0 +1,139 @@
+"""
+Tests for memory-mapped local storage of quotes service.
+"""
+from datetime import datetime, UTC
+
+import numpy as np
+import pytest
+
+from app.services.quotes.constants import TIME_TYPE
+from app.services.quotes.memmap_storage import MemmapStorage
+from app.services.quotes.storage import create_storage
+from app.services.quotes.timeframe import Timeframe
+
+SOURCE = 'binance'
+SYMBOL = 'BTC/USDT'
+TF = Timeframe.t1h
+
+
+def read_all(storage, columns=None):
+    return storage.read_bars(SOURCE, SYMBOL, TF, datetime(2000, 1, 1, tzinfo=UTC), datetime(2100, 1, 1, tzinfo=UTC), columns)
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = MemmapStorage(tmp_path / 'quotes', compact_rows=1000)
+    storage.init()
+    return storage
+
+
+def test_write_and_read_across_months(storage, make_bars):
+    bars = make_bars(10, '2024-01-31T20:00', TF)
+    storage.write_bars(SOURCE, SYMBOL, TF, bars)
+
+    result = storage.read_bars(SOURCE, SYMBOL, TF, datetime(2024, 1, 31, 22, tzinfo=UTC), datetime(2024, 2, 1, 2, tzinfo=UTC))
+
+    assert result['time'].dtype == np.dtype(TIME_TYPE)
+    assert result['time'].tolist() == bars['time'][2:7].tolist()
+    assert result['close'].tolist() == [2.0, 3.0, 4.0, 5.0, 6.0]
+    assert sorted(p.name for p in storage.key_dir(SOURCE, SYMBOL, TF).iterdir() if p.is_dir()) == ['2024-01', '2024-02']
+
+
+def test_later_write_replaces_bars_with_same_time(storage, make_bars):
+    storage.write_bars(SOURCE, SYMBOL, TF, make_bars(5, timeframe=TF))
+    storage.write_bars(SOURCE, SYMBOL, TF, make_bars(4, timeframe=TF, offset=3, close=100.0))
+
+    result = read_all(storage, columns=['close'])
+
+    assert list(result) == ['time', 'close']
+    assert result['close'].tolist() == [0.0, 1.0, 2.0, 100.0, 100.0, 100.0, 100.0]
+
+
+def test_compaction_keeps_bars_and_reads_views(storage, make_bars):
+    storage.write_bars(SOURCE, SYMBOL, TF, make_bars(5, timeframe=TF))
+    storage.write_bars(SOURCE, SYMBOL, TF, make_bars(1, timeframe=TF, offset=2, close=50.0))
+    storage.compact(SOURCE, SYMBOL, TF)
+
+    segment = storage.key_dir(SOURCE, SYMBOL, TF) / '2024-01'
+    assert (segment / 'log.bin').stat().st_size == 0
+    assert sorted(p.name for p in segment.iterdir() if p.is_dir()) == ['v1']
+
+    result = read_all(storage)
+    assert result['close'].tolist() == [0.0, 1.0, 50.0, 3.0, 4.0]
+    # Bars without pending log records are views of the mapped files
+    assert not result['time'].flags.owndata
+    assert not result['close'].flags.owndata
+
+    storage.write_bars(SOURCE, SYMBOL, TF, make_bars(2, timeframe=TF, offset=5))
+    storage.compact(SOURCE, SYMBOL, TF)
+    assert sorted(p.name for p in segment.iterdir() if p.is_dir()) == ['v2']
+    assert read_all(storage)['close'].tolist() == [0.0, 1.0, 50.0, 3.0, 4.0, 5.0, 6.0]
+
+
+def test_write_compacts_when_log_is_full(tmp_path, make_bars):
+    storage = MemmapStorage(tmp_path, compact_rows=8)
+    storage.write_bars(SOURCE, SYMBOL, TF, make_bars(5, timeframe=TF))
+    storage.write_bars(SOURCE, SYMBOL, TF, make_bars(5, timeframe=TF, offset=5))
+
+    segment = storage.key_dir(SOURCE, SYMBOL, TF) / '2024-01'
+    assert (segment / 'log.bin').stat().st_size == 0
+    assert storage.count_bars(SOURCE, SYMBOL, TF, datetime(2024, 1, 1, tzinfo=UTC), datetime(2024, 2, 1, tzinfo=UTC)) == 10
+
+
+def test_stored_intervals(storage, make_bars):
+    storage.write_bars(SOURCE, SYMBOL, TF, make_bars(4, '2024-01-31T22:00', TF))
+    storage.write_bars(SOURCE, SYMBOL, TF, make_bars(2, '2024-02-01T05:00', TF))
+
+    intervals = storage.stored_intervals(SOURCE, SYMBOL, TF)
+
+    assert [(str(start), str(end)) for start, end in intervals] == [
+        ('2024-01-31T22:00:00.000', '2024-02-01T01:00:00.000'),
+        ('2024-02-01T05:00:00.000', '2024-02-01T06:00:00.000'),
+    ]
+
+
+def test_coverage_and_unavailable(storage):
+    hour = TF.timedelta64()
+    start = np.datetime64('2024-01-01T00:00', 'ms')
+    storage.add_coverage(SOURCE, SYMBOL, TF, start, start + 4 * hour)
+    storage.add_coverage(SOURCE, SYMBOL, TF, start + 5 * hour, start + 9 * hour)
+    storage.add_coverage(SOURCE, SYMBOL, TF, start + 20 * hour, start + 21 * hour)
+
+    coverage = storage.get_coverage(SOURCE, SYMBOL, TF, start + 2 * hour, start + 10 * hour)
+    assert coverage == [(start, start + 9 * hour)]
+
+    now = np.datetime64(datetime.now(UTC).replace(tzinfo=None), 'ms')
+    storage.add_unavailable(SOURCE, SYMBOL, TF, [(start + 10 * hour, start + 12 * hour, 0)], now)
+    storage.add_unavailable(SOURCE, SYMBOL, TF, [(start + 13 * hour, start + 14 * hour, 60)], now - np.timedelta64(2, 'h'))
+
+    assert storage.get_coverage(SOURCE, SYMBOL, TF, start + 10 * hour, start + 14 * hour) == [(start, start + 9 * hour)]
+    with_unavailable = storage.get_coverage(SOURCE, SYMBOL, TF, start + 10 * hour, start + 14 * hour, include_unavailable=True)
+    assert sorted(with_unavailable) == [(start, start + 9 * hour), (start + 10 * hour, start + 12 * hour)]
+
+    # A recheck replaces the range with the same start
+    storage.add_unavailable(SOURCE, SYMBOL, TF, [(start + 13 * hour, start + 14 * hour, 60)], now)
+    with_unavailable = storage.get_coverage(SOURCE, SYMBOL, TF, start + 13 * hour, start + 14 * hour, include_unavailable=True)
+    assert sorted(with_unavailable) == [(start + 10 * hour, start + 12 * hour), (start + 13 * hour, start + 14 * hour)]
+
+
+def test_reads_of_unknown_key_leave_no_files(storage):
+    start = np.datetime64('2024-01-01T00:00', 'ms')
+
+    bars = read_all(storage, columns=['close'])
+    assert list(bars) == ['time', 'close'] and len(bars['time']) == 0
+    assert bars['time'].dtype == np.dtype(TIME_TYPE)
+    assert storage.stored_intervals(SOURCE, SYMBOL, TF) == []
+    assert storage.get_coverage(SOURCE, SYMBOL, TF, start, start + TF.timedelta64(), include_unavailable=True) == []
+    storage.compact(SOURCE, SYMBOL, TF)
+
+    assert list(storage.root.iterdir()) == []
+
+
+def test_create_storage(tmp_path):
+    assert isinstance(create_storage('memmap', path=tmp_path), MemmapStorage)
+    with pytest.raises(ValueError):
+        create_storage('memmap')
+    with pytest.raises(ValueError):
+        create_storage('clickhouse')
+    with pytest.raises(ValueError):
+        create_storage('sqlite', path=tmp_path)
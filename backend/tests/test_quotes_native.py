@@ -0,0 +1,101 @@
+"""
+Tests for reading and writing ClickHouse Native format blocks.
+"""
+import numpy as np
+import pytest
+
+from app.services.quotes.native import read_native, write_native
+
+
+def varint(value: int) -> bytes:
+    result = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            result.append(byte | 0x80)
+        else:
+            result.append(byte)
+            return bytes(result)
+
+
+def string(value: str) -> bytes:
+    return varint(len(value)) + value.encode()
+
+
+def native_block(columns) -> bytes:
+    """Encode a Native block from a list of (name, type, array)."""
+    rows = len(columns[0][2])
+    data = varint(len(columns)) + varint(rows)
+    for name, type_name, values in columns:
+        data += string(name) + string(type_name) + np.ascontiguousarray(values).tobytes()
+    return data
+
+
+def test_single_block_columns_are_views():
+    times = np.arange(200, dtype='<i8') * 3600000
+    closes = np.linspace(1.0, 2.0, 200)
+    data = native_block([('time', "DateTime64(3, 'UTC')", times), ('close', 'Float64', closes)])
+
+    result = read_native(data)
+
+    assert list(result) == ['time', 'close']
+    assert result['time'].dtype == np.dtype('datetime64[ms]')
+    assert np.array_equal(result['time'].view(np.int64), times)
+    assert np.array_equal(result['close'], closes)
+    assert result['close'].base is not None
+    assert result['close'].flags['C_CONTIGUOUS']
+
+
+def test_blocks_are_concatenated():
+    first = native_block([('close', 'Float64', np.array([1.0, 2.0]))])
+    second = native_block([('close', 'Float64', np.array([3.0]))])
+
+    result = read_native(first + second)
+
+    assert np.array_equal(result['close'], [1.0, 2.0, 3.0])
+
+
+def test_empty_result():
+    assert read_native(b'') == {}
+    header = native_block([('close', 'Float64', np.array([], dtype=np.float64))])
+    assert len(read_native(header)['close']) == 0
+
+
+def test_unsupported_type():
+    data = varint(1) + varint(1) + string('symbol') + string('String') + string('BTC/USDT')
+
+    with pytest.raises(ValueError):
+        read_native(data)
+
+
+def test_written_columns_are_read_back():
+    times = (np.arange(5, dtype='<i8') * 3600000).astype('datetime64[ms]')
+    closes = np.linspace(1.0, 2.0, 10)[::2]
+
+    result = read_native(write_native([('time', "DateTime64(3, 'UTC')", times), ('close', 'Float64', closes)], 5))
+
+    assert np.array_equal(result['time'], times)
+    assert np.array_equal(result['close'], closes)
+
+
+def test_constant_low_cardinality_column():
+    block = write_native([('symbol', 'LowCardinality(String)', 'BTC/USDT')], 3)
+
+    # Version, index type UInt8 with a new dictionary, one key, three zero indexes
+    expected = (
+        varint(1) + varint(3) + string('symbol') + string('LowCardinality(String)')
+        + np.array([1, (1 << 9) | (1 << 10), 1], dtype='<u8').tobytes() + string('BTC/USDT')
+        + np.array([3], dtype='<u8').tobytes() + bytes(3)
+    )
+    assert bytes(block) == expected
+
+
+@pytest.mark.parametrize('columns', [
+    [('symbol', 'String', 'BTC/USDT')],
+    [('close', 'Float64', np.zeros(2))],
+    [('symbol', 'String', np.zeros(3))],
+])
+def test_write_rejects_invalid_columns(columns):
+    with pytest.raises(ValueError):
+        write_native(columns, 3)
@@ -0,0 +1,142 @@
+"""
+Tests for column projection and dtype of price columns in quote requests.
+"""
+import asyncio
+
+import msgpack
+import numpy as np
+import pytest
+
+from app.services.quotes import server as quotes_server_module
+from app.services.quotes.bars import select_columns
+from app.services.quotes.constants import TIME_TYPE
+from app.services.quotes.server import parse_response_columns, process_request_async
+
+REQUEST = {
+    'source': 'binance',
+    'symbol': 'BTC/USDT',
+    'timeframe': '1h',
+    'history_start': '2024-01-01T00:00:00',
+    'history_end': '2024-01-01T09:00:00',
+}
+
+
+class RecordingRedis:
+    def __init__(self):
+        self.responses = []
+
+    async def lpush(self, key, value):
+        self.responses.append(msgpack.unpackb(value, raw=False))
+
+    async def expire(self, key, ttl):
+        pass
+
+
+class StubServer:
+    """Server returning bars of the requested price columns."""
+
+    def __init__(self, bars):
+        self.bars = bars
+        self.redis_client = RecordingRedis()
+        self.requested_columns = []
+
+    async def get_quotes(self, source, symbol, timeframe, history_start, history_end=None, columns=None):
+        self.requested_columns.append(columns)
+        return self.bars if columns is None else select_columns(self.bars, ['time'] + list(columns))
+
+
+@pytest.fixture
+def cached(monkeypatch):
+    """Keys of responses put to the shared response cache."""
+    keys = []
+
+    async def put_response(redis_client, key, data, **kwargs):
+        keys.append(key)
+
+    monkeypatch.setattr(quotes_server_module, 'QUOTES_RESPONSE_CACHE', True)
+    monkeypatch.setattr(quotes_server_module, 'put_response', put_response)
+    return keys
+
+
+def process(server, **options):
+    asyncio.run(process_request_async(server, {**REQUEST, **options}, 'request-1', 'quotes:responses', 60))
+    return server.redis_client.responses[-1]['metadata']
+
+
+def test_parse_response_columns():
+    assert parse_response_columns({}) == (None, None)
+    assert parse_response_columns({'columns': ['close', 'volume']}) == (['time', 'close', 'volume'], None)
+    assert parse_response_columns({'columns': ['close', 'time'], 'dtype': 'float32'}) == (['close', 'time'], 'float32')
+    assert parse_response_columns({'dtype': 'float64'}) == (None, None)
+
+
+@pytest.mark.parametrize('request_data', [
+    {'columns': ['close', 'vwap']},
+    {'columns': []},
+    {'dtype': 'float16'},
+    {'dtype': 'int64'},
+])
+def test_parse_response_columns_rejects_invalid_values(request_data):
+    with pytest.raises(ValueError):
+        parse_response_columns(request_data)
+
+
+def test_select_columns_converts_only_price_columns(make_bars):
+    bars = make_bars(3)
+
+    selected = select_columns(bars, ['close', 'time', 'volume'], 'float32')
+
+    assert list(selected) == ['close', 'time', 'volume']
+    assert selected['time'].dtype == np.dtype(TIME_TYPE)
+    assert np.array_equal(selected['time'], bars['time'])
+    assert selected['close'].dtype == np.float32
+    assert selected['volume'].dtype == np.float32
+    assert np.array_equal(selected['close'], bars['close'])
+    # Float64 columns are not copied
+    assert select_columns(bars, ['close'])['close'] is bars['close']
+
+
+def test_projected_response_always_has_time(make_bars, cached):
+    server = StubServer(make_bars(10))
+
+    metadata = process(server, columns=['close'])
+
+    assert metadata['status'] == 'success'
+    assert list(metadata['array_sizes']) == ['time', 'close']
+    assert server.requested_columns == [['close']]
+    assert server.redis_client.responses[-1]['binary_data']['time'] == server.bars['time'].tobytes()
+    # Projected responses are not put to the shared response cache
+    assert cached == []
+
+
+def test_float32_response_is_not_cached(make_bars, cached):
+    server = StubServer(make_bars(10))
+
+    metadata = process(server, dtype='float32')
+
+    assert metadata['status'] == 'success'
+    assert metadata['dtypes']['close'] == np.dtype(np.float32).str
+    assert metadata['dtypes']['time'] == np.dtype(TIME_TYPE).str
+    assert cached == []
+
+
+def test_full_float64_response_is_cached(make_bars, cached):
+    server = StubServer(make_bars(10))
+
+    metadata = process(server)
+
+    assert metadata['status'] == 'success'
+    assert len(cached) == 1
+
+
+@pytest.mark.parametrize('options', [{'columns': ['close', 'vwap']}, {'dtype': 'float16'}])
+def test_invalid_projection_gets_error_response(make_bars, cached, options):
+    server = StubServer(make_bars(10))
+
+    metadata = process(server, **options)
+
+    assert metadata['status'] == 'error'
+    assert metadata['request_id'] == 'request-1'
+    assert 'Invalid' in metadata['error']
+    assert server.requested_columns == []
+    assert cached == []
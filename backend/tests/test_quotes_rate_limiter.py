@@ -0,0 +1,126 @@
+"""
+Tests for rate limiting of exchange requests: token buckets and the per-exchange limiter.
+
+The shared bucket runs its Lua script on fakeredis, it is skipped if fakeredis is not installed.
+"""
+import asyncio
+import time
+
+import pytest
+
+from app.services.quotes.rate_limiter import TokenBucket, SharedTokenBucket, ExchangeRateLimiter
+
+
+async def acquire_times(bucket, count):
+    """Acquire count tokens one after another, return times of acquiring since the start."""
+    start = time.monotonic()
+    times = []
+    for _ in range(count):
+        await bucket.acquire()
+        times.append(time.monotonic() - start)
+    return times
+
+
+def test_tokens_are_added_at_rate():
+    bucket = TokenBucket(rate=50, capacity=1)
+
+    times = asyncio.run(acquire_times(bucket, 11))
+
+    # The first token is in the bucket, the next ten come every 20 ms
+    assert times[0] < 0.01
+    assert 0.19 <= times[-1] < 0.3
+
+
+def test_burst_is_limited_by_capacity():
+    bucket = TokenBucket(rate=10, capacity=3)
+
+    times = asyncio.run(acquire_times(bucket, 4))
+
+    assert times[2] < 0.01
+    assert 0.09 <= times[3] < 0.15
+
+
+def test_waiters_are_served_in_call_order():
+    bucket = TokenBucket(rate=100, capacity=1)
+    order = []
+
+    async def take(index):
+        await bucket.acquire()
+        order.append(index)
+
+    async def run():
+        await asyncio.gather(*(take(index) for index in range(10)))
+
+    asyncio.run(run())
+
+    assert order == list(range(10))
+
+
+def test_semaphore_caps_requests_in_flight():
+    limiter = ExchangeRateLimiter(rate_limit_ms=0, burst=100, max_concurrency=2)
+    in_flight = 0
+    max_in_flight = 0
+
+    async def request():
+        nonlocal in_flight, max_in_flight
+        async with limiter:
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+
+    async def run():
+        await asyncio.gather(*(request() for _ in range(8)))
+
+    asyncio.run(run())
+
+    assert max_in_flight == 2
+
+
+def test_semaphore_is_released_when_bucket_fails():
+    class FailingBucket:
+        async def acquire(self):
+            raise ConnectionError('Redis is down')
+
+    limiter = ExchangeRateLimiter(rate_limit_ms=0, burst=1, max_concurrency=1)
+    bucket = limiter.bucket
+    limiter.bucket = FailingBucket()
+
+    async def run():
+        with pytest.raises(ConnectionError):
+            async with limiter:
+                pass
+        # The only slot is free again
+        limiter.bucket = bucket
+        async with limiter:
+            pass
+
+    asyncio.run(asyncio.wait_for(run(), timeout=1))
+    assert not limiter.semaphore.locked()
+
+
+def test_shared_bucket_is_shared_by_instances():
+    fakeredis = pytest.importorskip('fakeredis')
+    pytest.importorskip('lupa')
+
+    async def run():
+        redis_client = fakeredis.aioredis.FakeRedis()
+        # The first script call starts the Lua runtime, keep it out of the timings
+        await SharedTokenBucket(redis_client, 'quotes:ratelimit:warmup', rate=10, capacity=1).acquire()
+        # Buckets of two processes with the same key
+        first = SharedTokenBucket(redis_client, 'quotes:ratelimit:test', rate=10, capacity=2)
+        second = SharedTokenBucket(redis_client, 'quotes:ratelimit:test', rate=10, capacity=2)
+        start = time.monotonic()
+        await first.acquire()
+        await second.acquire()
+        burst = time.monotonic() - start
+        await first.acquire()
+        waited = time.monotonic() - start
+        ttl = await redis_client.ttl('quotes:ratelimit:test')
+        return burst, waited, ttl
+
+    burst, waited, ttl = asyncio.run(run())
+
+    assert burst < 0.05
+    assert 0.08 <= waited < 0.2
+    assert 0 < ttl <= 61
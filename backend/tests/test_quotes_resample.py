@@ -0,0 +1,53 @@
+"""
+Tests for higher timeframe bars derived from lower timeframe bars.
+"""
+import numpy as np
+import pytest
+
+from app.services.quotes.exceptions import R2D2QuotesException
+from app.services.quotes.resample import parse_derived_timeframes, resample_bars
+from app.services.quotes.timeframe import Timeframe
+
+
+def test_resample_aggregates_periods(make_bars):
+    bars = make_bars(12, timeframe=Timeframe.t5m)
+    # A missing bar inside the second period
+    bars = {name: np.delete(column, 3) for name, column in bars.items()}
+
+    result = resample_bars(bars, Timeframe.t30m)
+
+    assert list(result['time']) == [np.datetime64('2024-01-01T00:00', 'ms'), np.datetime64('2024-01-01T00:30', 'ms')]
+    assert list(result['open']) == [-0.5, 5.5]
+    assert list(result['high']) == [6.0, 12.0]
+    assert list(result['low']) == [-1.0, 5.0]
+    assert list(result['close']) == [5.0, 11.0]
+    assert list(result['volume']) == [5.0, 6.0]
+
+
+def test_resample_weeks_start_on_monday(make_bars):
+    # 2024-01-01 is a Monday
+    bars = make_bars(4, '2023-12-30', timeframe=Timeframe.t1d, close=[1, 2, 3, 4])
+
+    result = resample_bars(bars, Timeframe.t1w)
+
+    assert list(result['time']) == [np.datetime64('2023-12-25', 'ms'), np.datetime64('2024-01-01', 'ms')]
+    assert list(result['close']) == [2.0, 4.0]
+
+
+def test_resample_keeps_only_present_columns():
+    times = np.datetime64('2024-01-01T00:00', 'ms') + np.arange(4) * np.timedelta64(1, 'm')
+    bars = {'time': times, 'close': np.arange(4, dtype=np.float64)}
+
+    result = resample_bars(bars, Timeframe.t3m)
+
+    assert list(result) == ['time', 'close']
+    assert list(result['close']) == [2.0, 3.0]
+    assert len(resample_bars({'time': times[:0], 'close': bars['close'][:0]}, Timeframe.t3m)['time']) == 0
+
+
+def test_parse_derived_timeframes():
+    assert parse_derived_timeframes('10m:5m, 1w:1d,') == {Timeframe.t10m: Timeframe.t5m, Timeframe.t1w: Timeframe.t1d}
+    assert parse_derived_timeframes('') == {}
+    for value in ('10m', '10m:3m', '1h:4h', 'x:1m'):
+        with pytest.raises(R2D2QuotesException):
+            parse_derived_timeframes(value)
@@ -0,0 +1,32 @@
+"""
+Tests for keys of the shared response cache of quotes.
+"""
+from datetime import datetime, timedelta, UTC
+
+import numpy as np
+
+from app.services.quotes.response_cache import cache_range, cache_key
+from app.services.quotes.timeframe import Timeframe
+
+
+def test_cache_range_snaps_to_bars():
+    first, last = cache_range(Timeframe.t1h, datetime(2024, 1, 1, 0, 30, tzinfo=UTC), datetime(2024, 1, 2, 5, 59, tzinfo=UTC))
+
+    assert first == np.datetime64('2024-01-01T01:00', 'ms')
+    assert last == np.datetime64('2024-01-02T05:00', 'ms')
+    # Requests for the same bars share a key
+    assert cache_range(Timeframe.t1h, datetime(2024, 1, 1, 1, 0), datetime(2024, 1, 2, 5, 0)) == (first, last)
+
+
+def test_cache_range_rejects_open_and_recent_ranges():
+    now = datetime.now(UTC)
+
+    assert cache_range(Timeframe.t1h, datetime(2024, 1, 1, tzinfo=UTC), None) is None
+    assert cache_range(Timeframe.t1h, now - timedelta(days=1), now) is None
+    assert cache_range(Timeframe.t1h, datetime(2024, 1, 1, 0, 10, tzinfo=UTC), datetime(2024, 1, 1, 0, 50, tzinfo=UTC)) is None
+
+
+def test_cache_key_is_readable():
+    first, last = np.datetime64('2024-01-01T00:00', 'ms'), np.datetime64('2024-01-31T00:00', 'ms')
+
+    assert cache_key('binance', 'BTC/USDT', Timeframe.t1d, first, last) == 'quotes:binance:BTC/USDT:1d:2024-01-01T00:00:00:2024-01-31T00:00:00'
@@ -0,0 +1,29 @@
+"""
+Tests for routing requests to quotes service workers.
+"""
+from app.services.quotes.router import request_shard, worker_request_list
+
+
+def test_request_shard_depends_only_on_key():
+    request = {'request_id': '1', 'source': 'binance', 'symbol': 'BTC/USDT', 'timeframe': '1h',
+               'history_start': '2024-01-01T00:00:00'}
+    other_range = dict(request, request_id='2', history_start='2023-01-01T00:00:00')
+
+    shard = request_shard(request, 8)
+
+    assert 0 <= shard < 8
+    assert request_shard(other_range, 8) == shard
+    assert request_shard(request, 1) == 0
+
+
+def test_request_shard_spreads_keys():
+    shards = {
+        request_shard({'source': 'binance', 'symbol': f'S{index}/USDT', 'timeframe': '1h'}, 4)
+        for index in range(100)
+    }
+
+    assert shards == {0, 1, 2, 3}
+
+
+def test_worker_request_list():
+    assert worker_request_list('quotes:requests', 2) == 'quotes:requests:2'
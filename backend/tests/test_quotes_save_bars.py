@@ -0,0 +1,94 @@
+"""
+Tests for conversion of ccxt OHLCV rows to bar columns and for saving fetched pages.
+"""
+import logging
+from datetime import datetime, UTC
+
+import numpy as np
+
+from app.services.quotes.bars import ohlcv_to_bars, PRICE_COLUMNS
+from app.services.quotes.constants import TIME_TYPE
+from app.services.quotes.timeframe import Timeframe
+
+SOURCE = 'binance'
+SYMBOL = 'BTC/USDT'
+TF = Timeframe.t1h
+HOUR_MS = 3600 * 1000
+START_MS = 1704067200000  # 2024-01-01 00:00
+
+
+def row(index: int, close: float) -> list:
+    return [START_MS + index * HOUR_MS, close - 0.5, close + 1.0, close - 1.0, close, 1.0]
+
+
+def stored(server):
+    return server.get_quotes_base(SOURCE, SYMBOL, TF, datetime(2000, 1, 1, tzinfo=UTC), datetime(2100, 1, 1, tzinfo=UTC))
+
+
+def test_ohlcv_to_bars_converts_columns():
+    bars = ohlcv_to_bars([row(0, 10.0), row(1, 11.0), [START_MS + 2 * HOUR_MS, None, None, None, None, None]])
+
+    assert list(bars) == ['time'] + list(PRICE_COLUMNS)
+    assert bars['time'].dtype == np.dtype(TIME_TYPE)
+    assert bars['time'].astype(np.int64).tolist() == [START_MS, START_MS + HOUR_MS, START_MS + 2 * HOUR_MS]
+    assert bars['open'].tolist()[:2] == [9.5, 10.5]
+    assert bars['close'].flags.c_contiguous
+    # Missing values become nan
+    assert np.isnan(bars['close'][2])
+
+
+def test_ohlcv_to_bars_sorts_and_drops_duplicate_rows():
+    bars = ohlcv_to_bars([row(2, 12.0), row(0, 10.0), row(1, 11.0), row(2, 12.5), row(0, 10.5)])
+
+    assert bars['time'].astype(np.int64).tolist() == [START_MS, START_MS + HOUR_MS, START_MS + 2 * HOUR_MS]
+    # The last of repeated rows wins
+    assert bars['close'].tolist() == [10.5, 11.0, 12.5]
+    assert bars['high'].tolist() == [11.5, 12.0, 13.5]
+
+
+def test_ohlcv_to_bars_of_empty_page():
+    bars = ohlcv_to_bars([])
+
+    assert list(bars) == ['time'] + list(PRICE_COLUMNS)
+    assert all(len(column) == 0 for column in bars.values())
+    assert bars['time'].dtype == np.dtype(TIME_TYPE)
+
+
+def test_save_pages_merges_pages_and_records_intervals(local_quotes_server, make_bars):
+    pages = [
+        make_bars(3, timeframe=TF, offset=10),
+        make_bars(0, timeframe=TF),
+        # Overlapping pages, the later page wins
+        make_bars(5, timeframe=TF, close=1.0),
+        make_bars(3, timeframe=TF, offset=3, close=2.0),
+    ]
+
+    local_quotes_server.save_pages(SOURCE, SYMBOL, TF, pages)
+
+    bars = stored(local_quotes_server)
+    assert bars['close'].tolist() == [1.0, 1.0, 1.0, 2.0, 2.0, 2.0, 10.0, 11.0, 12.0]
+    coverage = local_quotes_server.get_coverage(SOURCE, SYMBOL, TF, bars['time'][0], bars['time'][-1])
+    assert coverage == [(bars['time'][0], bars['time'][5]), (bars['time'][6], bars['time'][8])]
+
+
+def test_save_pages_of_empty_pages_saves_nothing(local_quotes_server, make_bars):
+    local_quotes_server.save_pages(SOURCE, SYMBOL, TF, [make_bars(0)])
+
+    assert len(stored(local_quotes_server)['time']) == 0
+    # Reads do not create files of the key
+    assert not local_quotes_server.storage.key_dir(SOURCE, SYMBOL, TF).exists()
+
+
+def test_duplicate_bars_are_skipped_with_a_warning(local_quotes_server, make_bars, caplog):
+    local_quotes_server.save_bars(SOURCE, SYMBOL, TF, make_bars(5, timeframe=TF))
+
+    with caplog.at_level(logging.WARNING):
+        local_quotes_server.save_bars(SOURCE, SYMBOL, TF, make_bars(5, timeframe=TF, offset=5), check_data=True)
+    assert not [record for record in caplog.records if 'duplicate' in record.getMessage()]
+
+    with caplog.at_level(logging.WARNING):
+        local_quotes_server.save_bars(SOURCE, SYMBOL, TF, make_bars(4, timeframe=TF, offset=8, close=100.0), check_data=True)
+    warnings = [record.getMessage() for record in caplog.records if 'duplicate' in record.getMessage()]
+    assert warnings == [f'Skipping 2 duplicate bars for {SOURCE}/{SYMBOL}/{TF}']
+    # Stored bars are kept, only the new bars are saved
+    assert stored(local_quotes_server)['close'].tolist() == [float(index) for index in range(10)] + [100.0, 100.0]
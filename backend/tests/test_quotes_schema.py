@@ -0,0 +1,102 @@
+"""
+Tests for database schema migrations of quotes service and the lock they run under.
+"""
+import pytest
+
+from app.services.quotes.schema import load_migrations, pending_migrations, split_statements
+from app.services.quotes.storage import SCHEMA_LOCK_KEY, migrate_storage
+
+
+def test_shipped_migrations_are_numbered_in_order():
+    versions = [version for version, _ in load_migrations()]
+
+    assert versions == list(range(1, len(versions) + 1))
+    for _, path in load_migrations():
+        assert list(split_statements(path.read_text(encoding='utf-8')))
+
+
+def test_migrations_are_sorted_by_version(tmp_path):
+    for name in ('010_late.sql', '002_second.sql', '001_first.sql', 'notes.sql', 'README.md'):
+        (tmp_path / name).write_text('SELECT 1')
+
+    migrations = load_migrations(tmp_path)
+
+    assert [(version, path.name) for version, path in migrations] == [
+        (1, '001_first.sql'), (2, '002_second.sql'), (10, '010_late.sql')
+    ]
+    assert [version for version, _ in pending_migrations(migrations, 2)] == [10]
+    assert pending_migrations(migrations, 10) == []
+
+
+def test_duplicate_versions_are_rejected(tmp_path):
+    (tmp_path / '001_first.sql').write_text('SELECT 1')
+    (tmp_path / '1_other.sql').write_text('SELECT 2')
+
+    with pytest.raises(ValueError):
+        load_migrations(tmp_path)
+
+
+def test_split_statements_skips_comments():
+    script = """
+    -- header; with a semicolon
+    CREATE TABLE t (x UInt8) ENGINE = Memory;
+
+    -- comment only
+    INSERT INTO t VALUES (1);
+    """
+
+    assert list(split_statements(script)) == [
+        'CREATE TABLE t (x UInt8) ENGINE = Memory',
+        'INSERT INTO t VALUES (1)',
+    ]
+
+
+class RecordingLock:
+    def __init__(self, events, acquired=True):
+        self.events = events
+        self.acquired = acquired
+
+    def acquire(self):
+        self.events.append('acquire')
+        return self.acquired
+
+    def reacquire(self):
+        self.events.append('reacquire')
+
+    def release(self):
+        self.events.append('release')
+
+
+class RecordingRedis:
+    def __init__(self, events, acquired=True):
+        self.events = events
+        self.acquired = acquired
+
+    def lock(self, name, timeout, blocking_timeout):
+        self.events.append(name)
+        return RecordingLock(self.events, self.acquired)
+
+
+class RecordingStorage:
+    def __init__(self, events):
+        self.events = events
+
+    def migrate(self, heartbeat=None):
+        self.events.append('migrate')
+        heartbeat()
+
+
+def test_migrate_storage_holds_schema_lock():
+    events = []
+
+    migrate_storage(RecordingStorage(events), RecordingRedis(events))
+
+    assert events == [SCHEMA_LOCK_KEY, 'acquire', 'migrate', 'reacquire', 'release']
+
+
+def test_migrate_storage_fails_without_lock():
+    events = []
+
+    with pytest.raises(TimeoutError):
+        migrate_storage(RecordingStorage(events), RecordingRedis(events, acquired=False))
+    assert 'migrate' not in events
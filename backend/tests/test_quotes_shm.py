@@ -0,0 +1,45 @@
+"""
+Tests for shared memory transport of bar columns.
+"""
+import os
+import time
+
+import numpy as np
+
+from app.services.quotes.shm import write_segment, open_segment, reap_segments
+
+
+def test_segment_round_trip(tmp_path, make_bars):
+    bars = make_bars(100)
+
+    handle = write_segment(str(tmp_path), bars)
+    received = open_segment(handle)
+
+    # The client takes the segment over
+    assert not os.path.exists(handle['path'])
+    assert received.keys() == bars.keys()
+    for name in bars:
+        assert received[name].dtype == bars[name].dtype
+        assert np.array_equal(received[name], bars[name])
+        assert not received[name].flags.writeable
+
+
+def test_empty_segment(tmp_path, make_bars):
+    handle = write_segment(str(tmp_path), make_bars(0))
+
+    received = open_segment(handle)
+
+    assert len(received['time']) == 0
+    assert received['close'].dtype == np.float64
+
+
+def test_reap_expired_segments(tmp_path, make_bars):
+    old = write_segment(str(tmp_path), make_bars(10))
+    fresh = write_segment(str(tmp_path), make_bars(10))
+    expired = time.time() - 600
+    os.utime(old['path'], (expired, expired))
+
+    assert reap_segments(str(tmp_path), lease=300) == 1
+    assert not os.path.exists(old['path'])
+    assert os.path.exists(fresh['path'])
+    assert reap_segments(str(tmp_path / 'missing'), lease=300) == 0
@@ -0,0 +1,145 @@
+"""
+Tests for chunking, publishing and reading of streamed quotes.
+"""
+import asyncio
+
+import numpy as np
+import pytest
+from redis._parsers.encoders import Encoder
+
+from app.services.quotes.stream import rechunk, pack_chunk, unpack_chunk, publish_stream, read_stream
+from app.services.quotes.client import QuotesClient
+from app.services.quotes.constants import TIME_TYPE
+
+
+def test_rechunk_makes_fixed_size_chunks(make_bars):
+    blocks = [make_bars(7), make_bars(2, offset=7), make_bars(12, offset=9)]
+
+    chunks = list(rechunk(blocks, 5))
+
+    assert [len(chunk['time']) for chunk in chunks] == [5, 5, 5, 5, 1]
+    assert np.array_equal(np.concatenate([chunk['close'] for chunk in chunks]), np.arange(21, dtype=np.float64))
+
+
+def test_chunk_round_trip(make_bars):
+    bars = make_bars(10)
+
+    received = unpack_chunk(pack_chunk(bars))
+
+    for name in bars:
+        assert received[name].dtype == bars[name].dtype
+        assert np.array_equal(received[name], bars[name])
+
+
+def test_assemble_stream(make_bars):
+    chunks = list(rechunk([make_bars(23)], 10))
+
+    # Announced count may differ from the number of bars received
+    for count in (23, 5, 40):
+        bars = QuotesClient._assemble_stream(count, iter(chunks))
+        assert len(bars['time']) == 23
+        assert np.array_equal(bars['close'], np.arange(23, dtype=np.float64))
+        assert bars['time'].dtype == TIME_TYPE
+
+
+class RecordingRedis:
+    """Asynchronous Redis client that records stream entries; the reader acknowledges acks chunks."""
+
+    def __init__(self, acks=0):
+        self.entries = []
+        self.acks = acks
+        self.waits = 0
+
+    async def blpop(self, keys, timeout):
+        self.waits += 1
+        if not self.acks:
+            return None
+        self.acks -= 1
+        return keys[0], b'1'
+
+    async def xadd(self, key, fields):
+        self.entries.append(fields)
+
+    async def expire(self, key, ttl):
+        pass
+
+
+async def stream_chunks(bars, chunk_bars):
+    for chunk in rechunk([bars], chunk_bars):
+        yield chunk
+
+
+def test_publish_stream_sends_redis_values(make_bars):
+    redis_client = RecordingRedis()
+    count = asyncio.run(publish_stream(redis_client, 'stream', stream_chunks(make_bars(23), 10), max_chunks=4, ttl=10))
+
+    assert count == 23
+    data = [fields['data'] for fields in redis_client.entries if 'data' in fields]
+    # Redis clients (redis-py 5.0) reject bytearray values, memoryview is sent without a copy
+    encoder = Encoder('utf-8', 'strict', False)
+    assert [encoder.encode(value) is value for value in data] == [True, True, True]
+    assert redis_client.entries[-1] == {'end': 23}
+    assert redis_client.waits == 0
+
+
+def test_publish_stream_waits_for_acknowledgements(make_bars):
+    redis_client = RecordingRedis(acks=3)
+
+    count = asyncio.run(publish_stream(redis_client, 'stream', stream_chunks(make_bars(50), 10), max_chunks=2, ttl=10))
+
+    assert count == 50
+    assert redis_client.waits == 3
+
+
+def test_publish_stream_times_out_without_acknowledgements(make_bars):
+    redis_client = RecordingRedis(acks=1)
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(publish_stream(redis_client, 'stream', stream_chunks(make_bars(50), 10), max_chunks=2, ttl=10))
+    assert len([fields for fields in redis_client.entries if 'data' in fields]) == 3
+    assert 'error' in redis_client.entries[-1]
+
+
+class StreamRedis:
+    """Synchronous Redis client with stream entries to read."""
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.commands = []
+
+    def xread(self, streams, count, block):
+        entries, self.entries = self.entries, []
+        return [(b'stream', entries)] if entries else []
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def xdel(self, key, entry_id):
+        self.commands.append(('xdel', entry_id))
+
+    def rpush(self, key, value):
+        self.commands.append(('rpush', key))
+
+    def expire(self, key, ttl):
+        pass
+
+    def execute(self):
+        pass
+
+    def delete(self, *keys):
+        self.commands.append(('delete',) + keys)
+
+
+def test_read_stream_acknowledges_chunks(make_bars):
+    chunks = list(rechunk([make_bars(15)], 10))
+    entries = [(b'1-0', {b'data': pack_chunk(chunks[0])}), (b'2-0', {b'data': pack_chunk(chunks[1])}), (b'3-0', {b'end': b'15'})]
+    redis_client = StreamRedis(entries)
+
+    received = list(read_stream(redis_client, 'stream', timeout=5))
+
+    assert [len(chunk['time']) for chunk in received] == [10, 5]
+    assert redis_client.commands == [
+        ('xdel', b'1-0'), ('rpush', 'stream:ack'),
+        ('xdel', b'2-0'), ('rpush', 'stream:ack'),
+        ('delete', 'stream', 'stream:ack'),
+    ]